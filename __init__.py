@@ -19,6 +19,8 @@ from . import properties
 from . import ui 
 from . import operators
 from . import i18n
+from . import scene_snapshot
+from . import image_index
 
 
 
@@ -69,6 +71,8 @@ bl_info = {
 modules = [
     i18n,
     properties,
+    scene_snapshot,     # 需先于 live_lod 注册 depsgraph 回调
+    image_index,
     ui.lists,
     ui.main_panels,
     operators.analyzer,
@@ -76,6 +80,8 @@ modules = [
     operators.viewport,
     operators.geometry,
     operators.shader_lod,
+    operators.schedule,
+    operators.live_lod,
 ]
 
 def register():
@@ -0,0 +1,108 @@
+# File Path: .\fast_copy.py
+
+import os
+import sys
+import shutil
+
+# 注意：本模块不依赖 bpy，主线程 (Blender) 与 worker.py 子进程都会导入它
+
+COPY_CHUNK = 8 * 1024 * 1024
+
+# Linux: ioctl(dst, FICLONE, src) 在 Btrfs / XFS 等写时复制文件系统上共享数据块
+FICLONE = 0x40049409
+
+
+def _reflink(src_path, tmp_path):
+    """写时复制克隆 (Linux FICLONE / macOS clonefile)，不支持时返回 False"""
+    if sys.platform == "darwin":
+        try:
+            import ctypes
+            libc = ctypes.CDLL(None, use_errno=True)
+            return libc.clonefile(os.fsencode(src_path), os.fsencode(tmp_path), 0) == 0
+        except (OSError, AttributeError):
+            return False
+    if not sys.platform.startswith("linux"):
+        return False
+    try:
+        import fcntl
+        with open(src_path, 'rb') as fsrc, open(tmp_path, 'wb') as fdst:
+            fcntl.ioctl(fdst.fileno(), FICLONE, fsrc.fileno())
+        return True
+    except (OSError, ImportError):
+        _remove(tmp_path)
+        return False
+
+
+def _copy_range(src_path, tmp_path):
+    """copy_file_range: 内核内复制 (部分文件系统 / NFS 会在服务端克隆)，不经过用户态缓冲"""
+    if not hasattr(os, "copy_file_range"):
+        return False
+    try:
+        with open(src_path, 'rb') as fsrc, open(tmp_path, 'wb') as fdst:
+            remaining = os.fstat(fsrc.fileno()).st_size
+            while remaining > 0:
+                sent = os.copy_file_range(fsrc.fileno(), fdst.fileno(), min(remaining, 1 << 30))
+                if sent == 0:
+                    break
+                remaining -= sent
+        return remaining <= 0
+    except OSError:
+        _remove(tmp_path)
+        return False
+
+
+def _chunked_copy(src_path, tmp_path):
+    with open(src_path, 'rb') as fsrc, open(tmp_path, 'wb') as fdst:
+        shutil.copyfileobj(fsrc, fdst, COPY_CHUNK)
+
+
+def _remove(path):
+    try:
+        os.remove(path)
+    except OSError:
+        pass
+
+
+def clone_file(src_path, dst_path):
+    """
+    把 src_path 复制到 dst_path，按开销从低到高尝试:
+    - 'reflink': 写时复制克隆 (零额外磁盘，修改任一方互不影响)
+    - 'range':   copy_file_range 内核内复制
+    - 'copy':    分块复制
+    不使用硬链接：输出会被切换为 Blender 图片路径，之后的保存 / 外部编辑会连带改写原图。
+    先写到同目录的临时文件再原子替换，已存在的 dst_path (可能是旧版本留下的硬链接) 不会被原地改写。
+    返回使用的方式。
+    """
+    tmp_path = f"{dst_path}.{os.getpid()}.lodtmp"
+    _remove(tmp_path)
+    if _reflink(src_path, tmp_path):
+        method = "reflink"
+    elif _copy_range(src_path, tmp_path):
+        method = "range"
+    else:
+        _chunked_copy(src_path, tmp_path)
+        method = "copy"
+    shutil.copystat(src_path, tmp_path)
+    try:
+        os.replace(tmp_path, dst_path)
+    except OSError:
+        _remove(tmp_path)
+        raise
+    return method
+
+
+def is_shared_copy(method):
+    """该方式是否不占用额外磁盘空间"""
+    return method == "reflink"
+
+
+def break_link(path):
+    """
+    原地写入 path 之前调用: 若它是硬链接 (例如旧版本链接到原图的输出)，先删除目录项，
+    保证写入的是新文件而不会改动原图。
+    """
+    try:
+        if os.stat(path).st_nlink > 1:
+            os.remove(path)
+    except OSError:
+        pass
@@ -25,6 +25,24 @@ ZH_DICT = {
     "Collection Analyzer Toggle": "集合分析器开关",
     "Scene Analyzer Toggle": "场景分析器开关",
     "Target Size": "目标尺寸",
+    "Quality": "质量",
+    "Half": "半精度",
+    "Float": "全精度",
+    "Generate All Sizes": "一次生成全部尺寸",
+    "Swap When Finished": "完成后统一切换",
+    "Use Texture Cache": "使用共享贴图缓存",
+    "Cache Folder": "缓存目录",
+    "Cache Limit (GB)": "缓存上限 (GB)",
+    "Include Mipmaps": "计入 Mipmap",
+    "Fit Memory Budget": "适配显存预算",
+    "Visual Priority": "视觉优先",
+    "Use UV Texel Density": "使用 UV 纹素密度",
+    "Sample Animation": "采样整个动画",
+    "Step": "步长",
+    "GB": "GB",
+    "Shrink textures further, least important on screen first, until they fit the budget": "按屏幕重要性从低到高继续缩小贴图，直到总内存符合预算",
+    "Reuse resized textures across projects via a content-addressed cache": "通过内容寻址缓存在不同项目间复用已缩放的贴图",
+    "Decode each image once and write every preset size (2048-128 px) for the Texture Switcher": "每张图只解码一次，写出全部预设尺寸 (2048-128 px) 供贴图切换使用",
 
     # --- Panels (原有翻译保持不变) ---
     "1. Collection Analyzer": "1. 集合分析器",
@@ -85,6 +103,16 @@ ZH_DICT = {
     "High <": "高精度 <",
     "Mid <": "中精度 <",
     "Low <": "低精度 <",
+    "Live LOD": "实时 LOD",
+    "Budget (ms)": "预算 (毫秒)",
+    "Cooldown (s)": "冷却 (秒)",
+    "± Band": "± 滞回",
+    "Suppressed": "已抑制",
+    "Hysteresis": "滞回",
+    "Cooldown": "冷却",
+    "Applied": "已切换",
+    "Bake Schedule": "烘焙 LOD 排程",
+    "Use": "启用",
 
     # --- Viewport Optimization ---
     "Viewport Optimization": "视窗显示优化",
@@ -133,7 +161,7 @@ ZH_DICT = {
     "Update Shaders": "更新材质",
     "Reset Shader Parameters": "重置材质参数",
     # --- Tooltips (Properties Descriptions) ---
-    "Camera used for screen coverage calculation": "用于计算屏幕占比的相机",
+    "Camera used for screen coverage calculation. Animation sampling and schedule baking follow the scene camera instead, so timeline-marker camera switches are respected": "用于计算屏幕占比的相机。动画采样与排程烘焙改用场景相机，以遵循时间线标记的相机切换",
     "High Detail End Distance": "高精度结束距离 (LOD 0)",
     "Mid Detail End Distance": "中精度结束距离 (LOD 1)",
     "Low Detail End Distance": "低精度结束距离 (LOD 2)",
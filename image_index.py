@@ -0,0 +1,159 @@
+# File Path: .\image_index.py
+
+import bpy
+from bpy.app.handlers import persistent
+
+# 引用图片的节点类型
+IMAGE_NODE_TYPES = {'TEX_IMAGE', 'TEX_ENVIRONMENT'}
+
+
+class ImageIndex:
+    """
+    节点树 -> 图片 的依赖索引 (按节点树记忆)。
+    - 每个节点树只记录直接引用的图片和直接使用的节点组 (_direct)
+    - 材质 / 世界 / 节点组的图片集合 = 自身 + 递归节点组的并集 (_closure)，
+      节点组各自缓存，被多个材质共享的组只遍历一次
+    - 某个节点树变化时只丢弃它自己的直接记录；展开结果依赖关系复杂，整体丢弃 (重新展开很便宜)
+    键: ('MAT', 材质名) / ('WORLD', 世界名) / ('GROUP', 节点组名)
+    """
+
+    def __init__(self):
+        self._direct = {}   # key -> (图片名 frozenset, 节点组名 tuple)
+        self._closure = {}  # key -> 图片名 frozenset
+
+    def clear(self):
+        self._direct.clear()
+        self._closure.clear()
+
+    def mark_tree(self, key):
+        self._direct.pop(key, None)
+        self._closure.clear()
+
+    # ------------------------------------------------------------------
+    # 查询
+    # ------------------------------------------------------------------
+    def material_images(self, name):
+        """材质引用的图片名 (含节点组内部)"""
+        return self._images(('MAT', name))
+
+    def world_images(self, name):
+        """世界环境引用的图片名 (含节点组内部)"""
+        return self._images(('WORLD', name))
+
+    def group_images(self, name):
+        return self._images(('GROUP', name))
+
+    def trees_using(self, image_names):
+        """直接引用了 image_names 中任一图片的节点树 [(key, node_tree)]"""
+        image_names = set(image_names)
+        result = []
+        for key in self.all_keys():
+            tree = get_tree(key)
+            if tree is not None and not self._direct_of(key, tree)[0].isdisjoint(image_names):
+                result.append((key, tree))
+        return result
+
+    @staticmethod
+    def all_keys():
+        keys = [('MAT', mat.name) for mat in bpy.data.materials]
+        keys += [('WORLD', world.name) for world in bpy.data.worlds]
+        keys += [('GROUP', group.name) for group in bpy.data.node_groups if group.bl_idname == 'ShaderNodeTree']
+        return keys
+
+    # ------------------------------------------------------------------
+    # 构建
+    # ------------------------------------------------------------------
+    def _images(self, key, visiting=None):
+        images = self._closure.get(key)
+        if images is not None:
+            return images
+
+        tree = get_tree(key)
+        if tree is None:
+            return frozenset()
+        direct, groups = self._direct_of(key, tree)
+
+        visiting = visiting or set()
+        visiting.add(key)
+        images = set(direct)
+        for group_name in groups:
+            group_key = ('GROUP', group_name)
+            if group_key not in visiting:
+                images |= self._images(group_key, visiting)
+        visiting.discard(key)
+
+        images = frozenset(images)
+        self._closure[key] = images
+        return images
+
+    def _direct_of(self, key, tree):
+        entry = self._direct.get(key)
+        if entry is None:
+            images, groups = set(), []
+            for node in tree.nodes:
+                if node.type in IMAGE_NODE_TYPES and node.image:
+                    images.add(node.image.name)
+                elif node.type == 'GROUP' and node.node_tree:
+                    groups.append(node.node_tree.name)
+            entry = (frozenset(images), tuple(dict.fromkeys(groups)))
+            self._direct[key] = entry
+        return entry
+
+
+def get_tree(key):
+    """键对应的节点树 (材质 / 世界未启用节点时为 None)"""
+    kind, name = key
+    if kind == 'GROUP':
+        return bpy.data.node_groups.get(name)
+    owner = (bpy.data.materials if kind == 'MAT' else bpy.data.worlds).get(name)
+    if owner is None or not owner.use_nodes:
+        return None
+    return owner.node_tree
+
+
+_index = ImageIndex()
+
+def get_index():
+    return _index
+
+
+# =============================================================================
+# Handlers
+# =============================================================================
+@persistent
+def on_depsgraph_update(scene, depsgraph):
+    for update in depsgraph.updates:
+        id_data = update.id
+        if isinstance(id_data, bpy.types.Material):
+            _index.mark_tree(('MAT', id_data.name))
+        elif isinstance(id_data, bpy.types.World):
+            _index.mark_tree(('WORLD', id_data.name))
+        elif isinstance(id_data, bpy.types.ShaderNodeTree):
+            if getattr(id_data, "is_embedded_data", False):
+                # 材质 / 世界内嵌的节点树无法反查所属对象，整体丢弃
+                _index.clear()
+            else:
+                _index.mark_tree(('GROUP', id_data.name))
+
+@persistent
+def on_invalidate(*args):
+    _index.clear()
+
+
+HANDLERS = (
+    (bpy.app.handlers.depsgraph_update_post, on_depsgraph_update),
+    (bpy.app.handlers.undo_post, on_invalidate),
+    (bpy.app.handlers.redo_post, on_invalidate),
+    (bpy.app.handlers.load_post, on_invalidate),
+)
+
+def register():
+    for handler_list, func in HANDLERS:
+        if func not in handler_list:
+            handler_list.append(func)
+
+def unregister():
+    for handler_list, func in HANDLERS:
+        if func in handler_list:
+            handler_list.remove(func)
+    _index.clear()
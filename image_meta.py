@@ -0,0 +1,257 @@
+# File Path: .\image_meta.py
+
+import io
+import os
+import struct
+from concurrent.futures import ThreadPoolExecutor
+
+# 注意：本模块不依赖 bpy，只读取文件头，不解码像素
+# 返回的元数据格式:
+# {"width", "height", "channels", "bit_depth", "is_float", "format"}
+
+def _meta(fmt, width, height, channels, bit_depth, is_float=False):
+    return {
+        "format": fmt,
+        "width": int(width),
+        "height": int(height),
+        "channels": int(channels),
+        "bit_depth": int(bit_depth),
+        "is_float": bool(is_float),
+    }
+
+
+# =============================================================================
+# 各格式文件头解析
+# =============================================================================
+
+PNG_CHANNELS = {0: 1, 2: 3, 3: 3, 4: 2, 6: 4}
+
+def _read_png(f, head):
+    # 签名 (8) + IHDR 长度 (4) + "IHDR" (4) + 宽高 (8) + 位深 (1) + 颜色类型 (1)
+    if len(head) < 26 or head[12:16] != b"IHDR":
+        return None
+    width, height, bit_depth, color_type = struct.unpack(">IIBB", head[16:26])
+    channels = PNG_CHANNELS.get(color_type, 4)
+    if color_type == 3:
+        # 调色板图：检查是否带 tRNS (透明)
+        f.seek(33)
+        while True:
+            chunk = f.read(8)
+            if len(chunk) < 8:
+                break
+            length, ctype = struct.unpack(">I4s", chunk)
+            if ctype == b"tRNS":
+                channels = 4
+                break
+            if ctype in (b"IDAT", b"IEND"):
+                break
+            f.seek(length + 4, os.SEEK_CUR)
+        bit_depth = 8
+    return _meta("PNG", width, height, channels, bit_depth)
+
+
+# SOF 标记 (排除 DHT/JPG/DAC)
+JPEG_SOF = {0xC0, 0xC1, 0xC2, 0xC3, 0xC5, 0xC6, 0xC7, 0xC9, 0xCA, 0xCB, 0xCD, 0xCE, 0xCF}
+
+def _read_jpeg(f, head):
+    f.seek(2)
+    while True:
+        byte = f.read(1)
+        if not byte:
+            return None
+        if byte != b"\xFF":
+            continue
+        marker = f.read(1)
+        while marker == b"\xFF":  # 填充字节
+            marker = f.read(1)
+        if not marker:
+            return None
+        code = marker[0]
+        if code in (0xD8, 0x01) or 0xD0 <= code <= 0xD7:
+            continue  # 无长度字段的标记
+        seg = f.read(2)
+        if len(seg) < 2:
+            return None
+        length = struct.unpack(">H", seg)[0]
+        if code in JPEG_SOF:
+            data = f.read(6)
+            if len(data) < 6:
+                return None
+            precision, height, width, components = struct.unpack(">BHHB", data)
+            return _meta("JPEG", width, height, components, precision)
+        if code == 0xDA:  # 扫描数据开始，之后不会再有 SOF
+            return None
+        f.seek(length - 2, os.SEEK_CUR)
+
+
+TIFF_TYPES = {3: ("H", 2), 4: ("I", 4)}
+
+def _read_tiff(f, head):
+    endian = "<" if head[:2] == b"II" else ">"
+    magic, ifd_offset = struct.unpack(endian + "HI", head[2:8])
+    if magic != 42:
+        return None  # BigTIFF 等交给 Blender 处理
+
+    f.seek(ifd_offset)
+    raw = f.read(2)
+    if len(raw) < 2:
+        return None
+    count = struct.unpack(endian + "H", raw)[0]
+    entries = f.read(count * 12)
+
+    tags = {}
+    bits = []
+    for i in range(count):
+        tag, typ, n, value = struct.unpack(endian + "HHI4s", entries[i * 12:(i + 1) * 12])
+        if typ not in TIFF_TYPES:
+            continue
+        code, size = TIFF_TYPES[typ]
+        if tag == 258:
+            # BitsPerSample: 每个通道一个值，超过 4 字节时存在偏移处
+            if n * size > 4:
+                offset = struct.unpack(endian + "I", value)[0]
+                pos = f.tell()
+                f.seek(offset)
+                bits = list(struct.unpack(endian + code * n, f.read(n * size)))
+                f.seek(pos)
+            else:
+                bits = list(struct.unpack(endian + code * n, value[:n * size]))
+            continue
+        tags[tag] = struct.unpack(endian + code, value[:size])[0]
+
+    if 256 not in tags or 257 not in tags:
+        return None
+    channels = tags.get(277, len(bits) or 1)
+    bit_depth = max(bits) if bits else 8
+    is_float = tags.get(339, 1) == 3
+    return _meta("TIFF", tags[256], tags[257], channels, bit_depth, is_float)
+
+
+EXR_PIXEL_BITS = {0: 32, 1: 16, 2: 32}  # UINT, HALF, FLOAT
+
+def _read_cstr(f, limit=256):
+    out = bytearray()
+    while len(out) < limit:
+        c = f.read(1)
+        if not c or c == b"\x00":
+            break
+        out += c
+    return bytes(out)
+
+def _read_exr(f, head):
+    f.seek(8)  # magic (4) + version (4)
+    channels = []
+    window = None
+    while True:
+        name = _read_cstr(f)
+        if not name:
+            break
+        _read_cstr(f)  # 属性类型
+        size = struct.unpack("<i", f.read(4))[0]
+        data = f.read(size)
+        if name == b"channels":
+            pos = 0
+            while pos < len(data) and data[pos] != 0:
+                end = data.index(b"\x00", pos)
+                pixel_type = struct.unpack("<i", data[end + 1:end + 5])[0]
+                channels.append(EXR_PIXEL_BITS.get(pixel_type, 32))
+                pos = end + 1 + 16
+        elif name == b"dataWindow":
+            window = struct.unpack("<iiii", data[:16])
+        if channels and window:
+            break
+
+    if not window:
+        return None
+    xmin, ymin, xmax, ymax = window
+    return _meta("EXR", xmax - xmin + 1, ymax - ymin + 1, len(channels) or 4,
+                 max(channels) if channels else 16, True)
+
+
+def _read_hdr(f, head):
+    f.seek(0)
+    for _ in range(64):
+        line = f.readline(512).strip()
+        if not line:
+            break
+    res = f.readline(512).split()
+    # 分辨率行: "-Y H +X W"
+    if len(res) != 4:
+        return None
+    if res[0].endswith(b"Y"):
+        height, width = int(res[1]), int(res[3])
+    else:
+        width, height = int(res[1]), int(res[3])
+    return _meta("HDR", width, height, 3, 32, True)
+
+
+def _read_webp(f, head):
+    chunk = head[12:16]
+    if chunk == b"VP8 " and len(head) >= 30:
+        width, height = struct.unpack("<HH", head[26:30])
+        return _meta("WEBP", width & 0x3FFF, height & 0x3FFF, 3, 8)
+    if chunk == b"VP8L" and len(head) >= 25:
+        bits = struct.unpack("<I", head[21:25])[0]
+        width = (bits & 0x3FFF) + 1
+        height = ((bits >> 14) & 0x3FFF) + 1
+        channels = 4 if (bits >> 28) & 1 else 3
+        return _meta("WEBP", width, height, channels, 8)
+    if chunk == b"VP8X" and len(head) >= 30:
+        flags = head[20]
+        width = int.from_bytes(head[24:27], "little") + 1
+        height = int.from_bytes(head[27:30], "little") + 1
+        channels = 4 if flags & 0x10 else 3
+        return _meta("WEBP", width, height, channels, 8)
+    return None
+
+
+def _read_meta(f):
+    head = f.read(64)
+    if head.startswith(b"\x89PNG\r\n\x1a\n"):
+        return _read_png(f, head)
+    if head.startswith(b"\xFF\xD8"):
+        return _read_jpeg(f, head)
+    if head[:4] in (b"II*\x00", b"MM\x00*"):
+        return _read_tiff(f, head)
+    if head.startswith(b"\x76\x2f\x31\x01"):
+        return _read_exr(f, head)
+    if head.startswith(b"#?"):
+        return _read_hdr(f, head)
+    if head[:4] == b"RIFF" and head[8:12] == b"WEBP":
+        return _read_webp(f, head)
+    return None
+
+
+def read_image_meta(path):
+    """
+    只读文件头获取尺寸/通道数/位深。
+    不支持的格式或损坏的文件返回 None (调用方应回退到 Blender)。
+    """
+    try:
+        with open(path, "rb") as f:
+            return _read_meta(f)
+    except (OSError, struct.error, ValueError, IndexError):
+        return None
+
+
+def read_image_meta_bytes(data):
+    """同 read_image_meta，解析内存中的文件数据 (如打包图片的 packed_file.data)"""
+    try:
+        return _read_meta(io.BytesIO(data))
+    except (OSError, struct.error, ValueError, IndexError):
+        return None
+
+
+def scan_files(paths, max_workers=None):
+    """
+    在线程池中并行读取多个文件头。
+    返回: {path: meta 或 None}
+    """
+    paths = list(dict.fromkeys(paths))
+    if not paths:
+        return {}
+    if max_workers is None:
+        # I/O 密集型任务，线程数可以多于 CPU 核数
+        max_workers = min(32, (os.cpu_count() or 4) * 2)
+    with ThreadPoolExecutor(max_workers=max_workers) as executor:
+        return dict(zip(paths, executor.map(read_image_meta, paths)))
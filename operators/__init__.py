@@ -3,3 +3,5 @@ from . import image
 from . import viewport  
 from . import geometry 
 from . import shader_lod
+from . import schedule
+from . import live_lod
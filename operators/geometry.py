@@ -1,14 +1,16 @@
 import bpy
 import time
 import math
+import numpy as np
 from mathutils import Vector
 from .. import utils
+from .. import scene_snapshot
 
 # =============================================================================
 # 常量定义
 # =============================================================================
 DECIMATE_MOD_NAME = "LOD_DECIMATE"
-GEO_NODES_MOD_NAME = "LOD_GEO_LOD"
+GEO_NODES_MOD_NAME = scene_snapshot.LOD_GEO_MOD_NAME
 GN_INPUT_FACTOR = "LOD_Factor"      # 接口1：强度
 GN_INPUT_ANGLE = "Angle_Threshold" 
 GN_INPUT_MAX_DIST = "Max_Merge_Dist" # 接口2：角度阈值
@@ -180,6 +182,110 @@ def get_input_identifier(node_group, input_name):
                 return input_socket.identifier
     return None
 
+def get_gn_identifiers():
+    """返回 LOD 节点组 (LOD_Factor, Max_Merge_Dist) 的接口 ID"""
+    group = bpy.data.node_groups.get("LOD_GEO_LOD_Advanced")
+    return get_input_identifier(group, GN_INPUT_FACTOR), get_input_identifier(group, GN_INPUT_MAX_DIST)
+
+def get_geo_rows(snap, method, candidates=None):
+    """
+    参与几何 LOD 的快照行: 可见 Mesh、非实例源、且带有对应的 LOD 修改器。
+    candidates 不为空时只检查这些行。
+    """
+    target_mod = DECIMATE_MOD_NAME if method == 'DECIMATE' else GEO_NODES_MOD_NAME
+    rows = snap.select(types=('MESH',), visible=True, skip_sources=True)
+    if candidates is not None:
+        rows = np.intersect1d(rows, candidates)
+    return np.array([i for i in rows.tolist() if snap.objects[i].modifiers.get(target_mod)], dtype=np.int64)
+
+def compute_geo_ratios(scene, snap, rows, cam):
+    """
+    批量计算快照行的归一化屏幕占比 (NumPy)。
+    视锥外的物体由空间索引直接排除 (占比为 0)。
+    """
+    in_view = np.isin(rows, snap.spatial_index('center').query_frustum(
+        utils.get_frustum_planes(scene, cam)))
+    ratios = np.zeros(len(rows))
+    _, _, view_ratios = utils.batch_screen_coverage(
+        scene, None, cam,
+        matrices=snap.matrices[rows[in_view]], bboxes=snap.bboxes[rows[in_view]],
+    )
+    ratios[in_view] = view_ratios
+    return ratios
+
+_tracker = scene_snapshot.TransitionTracker()
+
+def geo_settings(scn, cam):
+    """影响几何 LOD 结果的全部设置 (变化时清空阶梯记录)"""
+    return (
+        cam.name, scn.geo_lod_method, scn.geo_lod_min_ratio,
+        scn.geo_lod_min_faces, scn.geo_lod_max_dist, scn.geo_lod_hysteresis,
+    )
+
+def update_geo_lod(scene, snap, rows, cam, scn, cooldown=0.0, reset_rows=None):
+    """
+    计算几何 LOD 阶梯 (带滞回带与冷却)，更新 _tracker。
+    面数低于 geo_lod_min_faces 的物体固定为阶梯 0 (Factor 1.0)。
+    reset_rows: 需要忘记上次阶梯的行 (例如重新 Setup 后)
+    返回 (factors, changed)：每行当前生效的 Factor，以及阶梯是否发生切换
+    """
+    _tracker.prepare(snap, geo_settings(scn, cam))
+    if reset_rows is not None:
+        _tracker.forget(reset_rows)
+
+    ratios = compute_geo_ratios(scene, snap, rows, cam)
+    raw = utils.get_lod_steps(ratios)
+    steps = utils.get_lod_steps(ratios, _tracker.levels[rows], scn.geo_lod_hysteresis)
+    protected = snap.face_counts[rows] < scn.geo_lod_min_faces
+    raw[protected] = 0
+    steps[protected] = 0
+
+    changed_rows, _ = _tracker.commit(rows, raw, steps, cooldown)
+    factors = utils.get_step_factors(_tracker.levels[rows], scn.geo_lod_min_ratio)
+    return factors, np.isin(rows, changed_rows)
+
+def apply_geo_factor(obj, method, target_factor, gn_id_factor=None, gn_id_dist=None, max_dist=0.5):
+    """
+    把 LOD Factor 写入物体的 LOD 修改器，只在数值变化时写入。
+    返回 True 表示物体被修改。
+    """
+    EPSILON = 0.001 
+
+    if method == 'DECIMATE':
+        mod = obj.modifiers.get(DECIMATE_MOD_NAME)
+        if mod and abs(mod.ratio - target_factor) > EPSILON:
+            mod.ratio = target_factor
+            obj.update_tag() 
+            return True
+        
+    elif method == 'GNODES':
+        mod = obj.modifiers.get(GEO_NODES_MOD_NAME)
+        if mod:
+            changed = False
+            
+            # A. 更新 LOD_Factor (核心)
+            if gn_id_factor:
+                try:
+                    curr = mod.get(gn_id_factor, 1.0)
+                    if abs(curr - target_factor) > EPSILON:
+                        mod[gn_id_factor] = target_factor
+                        changed = True
+                except: pass
+            
+            # B. 同步 Max_Dist (允许用户在播放时实时调整最大塌陷程度)
+            if gn_id_dist:
+                try:
+                    curr_dist = mod.get(gn_id_dist, 0.5)
+                    if abs(curr_dist - max_dist) > 0.0001:
+                        mod[gn_id_dist] = max_dist
+                        changed = True
+                except: pass
+            
+            if changed:
+                obj.update_tag() 
+                return True
+    return False
+
 # =============================================================================
 # Operators
 # =============================================================================
@@ -246,24 +352,19 @@ class LOD_OT_GeoLODSetup(bpy.types.Operator):
             except Exception as e:
                 self.report({'ERROR'}, f"Create Node Error: {e}")
                 return {'CANCELLED'}
-        # [新增] 1.1 预先计算实例源黑名单
-        self.instance_sources = utils.get_instance_sources(context.scene)
-        if self.instance_sources:
-             print(f"[LOD] Detected {len(self.instance_sources)} instance source objects. They will be skipped.")
+        # [新增] 1.1 实例源黑名单 (快照中已标记)
+        snap = scene_snapshot.get_snapshot(context.scene)
+        source_count = int(snap.is_instance_source.sum())
+        if source_count:
+             print(f"[LOD] Detected {source_count} instance source objects. They will be skipped.")
       
         # 2. 构建任务队列
-        self._queue = []
-        # 遍历场景所有物体
-        for obj in context.scene.objects:
-            if obj.type != 'MESH': continue
-
-            #  如果是实例源，跳过优化（保护母体）
-            if obj in self.instance_sources:
-                continue            
-            # 面数过滤
-            if self.min_faces > 0 and len(obj.data.polygons) < self.min_faces: continue
-            
-            self._queue.append(obj)
+        # 如果是实例源，跳过优化（保护母体）
+        rows = snap.select(types=('MESH',), skip_sources=True)
+        # 面数过滤
+        if self.min_faces > 0:
+            rows = rows[snap.face_counts[rows] >= self.min_faces]
+        self._queue = [snap.objects[i] for i in rows.tolist()]
         
         if not self._queue:
             self.report({'WARNING'}, "No eligible mesh objects found.")
@@ -374,18 +475,10 @@ class LOD_OT_GeoLODUpdateAsync(bpy.types.Operator):
         method = scn.geo_lod_method
         target_mod = DECIMATE_MOD_NAME if method == 'DECIMATE' else GEO_NODES_MOD_NAME
         
-        # 获取黑名单
-        skipped_sources = utils.get_instance_sources(context.scene)   
-
-        self._queue = []
-        for obj in context.scene.objects:
-            if obj.type == 'MESH' and not obj.hide_viewport:
-                # 如果是实例源就跳过计算
-                if obj in skipped_sources:
-                    continue
-
-                if obj.modifiers.get(target_mod):
-                    self._queue.append(obj)
+        # 可见 Mesh，实例源跳过计算 (快照中已标记)
+        snap = scene_snapshot.get_snapshot(context.scene)
+        rows = get_geo_rows(snap, method)
+        self._queue = [snap.objects[i] for i in rows.tolist()]
         
         if not self._queue:
             self.report({'WARNING'}, "Run 'Setup' first.")
@@ -395,19 +488,19 @@ class LOD_OT_GeoLODUpdateAsync(bpy.types.Operator):
         self._processed = 0
         self._updated_count = 0
         self.method = method
+
+        # 一次性批量计算所有物体的 Factor (NumPy，带滞回带)，逐物体处理时只查表
+        factors, _ = update_geo_lod(context.scene, snap, rows, self.cam, scn)
+        self._factors = dict(zip((o.name for o in self._queue), factors.tolist()))
         
         # 全局参数缓存
-        self.min_protection = scn.geo_lod_min_ratio
-        self.min_faces = scn.geo_lod_min_faces
         self.max_dist = scn.geo_lod_max_dist # 用户设置的最大塌陷距离
         
         self.gn_id_factor = None
         self.gn_id_dist = None
         
         if method == 'GNODES':
-            group = bpy.data.node_groups.get("LOD_GEO_LOD_Advanced")
-            self.gn_id_factor = get_input_identifier(group, GN_INPUT_FACTOR)
-            self.gn_id_dist = get_input_identifier(group, GN_INPUT_MAX_DIST)
+            self.gn_id_factor, self.gn_id_dist = get_gn_identifiers()
 
         context.window_manager.progress_begin(0, self._total_tasks)
         self._timer = context.window_manager.event_timer_add(0.01, window=context.window) 
@@ -416,62 +509,12 @@ class LOD_OT_GeoLODUpdateAsync(bpy.types.Operator):
         return {'RUNNING_MODAL'}
 
     def process_object(self, context, obj):
-        # 1. 面数保护
-        is_protected_by_faces = False
-        if hasattr(obj.data, "polygons") and len(obj.data.polygons) < self.min_faces:
-            is_protected_by_faces = True
-
-        # 2. 计算 Factor
-        if is_protected_by_faces:
-            target_factor = 1.0
-        else:
-            if hasattr(utils, 'get_normalized_screen_ratio'):
-                raw_ratio = utils.get_normalized_screen_ratio(context.scene, obj, self.cam)
-            else:
-                raw_ratio = 0.5 
-            
-            # 使用 Stepped 还是 Linear 取决于你，这里保持 Stepped 更稳定
-            if hasattr(utils, 'get_stepped_lod_factor'):
-                target_factor = utils.get_stepped_lod_factor(raw_ratio, self.min_protection)
-            else:
-                target_factor = 1.0
+        # 1~2. 面数保护与 Factor 已在 invoke 中批量计算
+        target_factor = self._factors.get(obj.name, 1.0)
 
         # 3. 应用到修改器
-        EPSILON = 0.001 
-
-        if self.method == 'DECIMATE':
-            mod = obj.modifiers.get(DECIMATE_MOD_NAME)
-            if mod and abs(mod.ratio - target_factor) > EPSILON:
-                mod.ratio = target_factor
-                obj.update_tag() 
-                self._updated_count += 1
-            
-        elif self.method == 'GNODES':
-            mod = obj.modifiers.get(GEO_NODES_MOD_NAME)
-            if mod:
-                changed = False
-                
-                # A. 更新 LOD_Factor (核心)
-                if self.gn_id_factor:
-                    try:
-                        curr = mod.get(self.gn_id_factor, 1.0)
-                        if abs(curr - target_factor) > EPSILON:
-                            mod[self.gn_id_factor] = target_factor
-                            changed = True
-                    except: pass
-                
-                # B. 同步 Max_Dist (允许用户在播放时实时调整最大塌陷程度)
-                if self.gn_id_dist:
-                    try:
-                        curr_dist = mod.get(self.gn_id_dist, 0.5)
-                        if abs(curr_dist - self.max_dist) > 0.0001:
-                            mod[self.gn_id_dist] = self.max_dist
-                            changed = True
-                    except: pass
-                
-                if changed:
-                    obj.update_tag() 
-                    self._updated_count += 1
+        if apply_geo_factor(obj, self.method, target_factor, self.gn_id_factor, self.gn_id_dist, self.max_dist):
+            self._updated_count += 1
 
     def finish(self, context):
         context.window_manager.event_timer_remove(self._timer)
@@ -496,6 +539,7 @@ class LOD_OT_GeoLODReset(bpy.types.Operator):
             if obj.modifiers.get(GEO_NODES_MOD_NAME): 
                 obj.modifiers.remove(obj.modifiers.get(GEO_NODES_MOD_NAME)); removed+=1
             if "_lod_geo_lod_created" in obj: del obj["_lod_geo_lod_created"]
+        _tracker.reset()
         self.report({'INFO'}, f"Reset {removed} objects.")
         return {'FINISHED'}
 
@@ -3,11 +3,65 @@
 import os
 import bpy
 import shutil
+import re
+import math
 import time
 import gc
-import subprocess # 替代 threading
-import sys        # 用于获取 python 解释器路径
+import traceback
+import hashlib
+import heapq
+import json
+import numpy as np
+from collections import deque
 from .. import utils
+from .. import worker_pool
+from .. import texture_cache
+from .. import fast_copy
+from .. import image_meta
+from .. import scene_snapshot
+from .. import image_index
+from . import schedule
+
+# 延迟导入 OpenImageIO (Blender 自带)：worker 用它按扫描线流式读取超大贴图
+def check_oiio_available():
+    try:
+        import OpenImageIO
+        return True
+    except ImportError:
+        return False
+
+# 浮点贴图：worker 在线性空间缩放 (EXR 需要 OpenImageIO，HDR 可由 NumPy 直接读写)
+FLOAT_EXTS = {'.exr', '.hdr'}
+
+def can_resize_float(img, ext):
+    """本地 EXR / HDR 文件能否交给 worker 缩放"""
+    if img.packed_file or not img.filepath or not udim_path_exists(img, bpy.path.abspath(img.filepath)):
+        return False
+    return ext == '.hdr' or check_oiio_available()
+
+# 原生保存时各扩展名对应的渲染输出格式与颜色模式
+NATIVE_FORMATS = {
+    '.jpg': ('JPEG', 'RGB'), '.jpeg': ('JPEG', 'RGB'),
+    '.png': ('PNG', 'RGBA'),
+    '.exr': ('OPEN_EXR', 'RGBA'), '.hdr': ('HDR', 'RGB'),
+}
+
+def save_native(img, path, scn):
+    """用 Blender 自身的写出器保存 (主线程原生路径)，临时切换渲染输出设置"""
+    # 目标可能是旧版本链接到原图的输出，先断开再写
+    fast_copy.break_link(path)
+    render = bpy.context.scene.render.image_settings
+    old = (render.file_format, render.color_mode, render.color_depth, render.exr_codec)
+    try:
+        ext = os.path.splitext(path)[1].lower()
+        if ext in NATIVE_FORMATS:
+            render.file_format, render.color_mode = NATIVE_FORMATS[ext]
+        if ext == '.exr':
+            render.color_depth = '16' if scn.float_depth == 'HALF' else '32'
+            render.exr_codec = scn.exr_codec
+        img.save_render(filepath=path)
+    finally:
+        render.file_format, render.color_mode, render.color_depth, render.exr_codec = old
 
 # 延迟导入pil
 def check_pil_available():
@@ -21,7 +75,681 @@ def check_pil_available():
         return True
     except ImportError:
         return False
+
+# 金字塔模式下一次解码生成的尺寸组 (供 Texture Switcher 使用)
+PYRAMID_SIZES = (2048, 1024, 512, 256, 128)
+
+# textures_{N}px 目录中的变体清单：{文件名: 生成它的缩放设置}
+VARIANT_MANIFEST = ".lod_variants.json"
+
+def read_variant_manifest(folder):
+    try:
+        with open(os.path.join(folder, VARIANT_MANIFEST), 'r', encoding='utf-8') as f:
+            manifest = json.load(f)
+        return manifest if isinstance(manifest, dict) else {}
+    except (OSError, ValueError):
+        return {}
+
+class VariantLog:
+    """
+    记录本次生成的输出由哪种缩放设置得到，结束时合并写入各目录的变体清单 (只在主线程写)。
+    settings 为 None 表示不可复用 (如 Blender 原生缩放)，会从清单中移除。
+    """
+
+    def __init__(self):
+        self._entries = {}  # 目录 -> {文件名: 设置}
+
+    def record(self, task, settings):
+        outputs = task.get("outputs") or [{"dst": task["dst_path"]}]
+        for out in outputs:
+            folder, name = os.path.split(out["dst"])
+            self._entries.setdefault(folder, {})[name] = settings
+
+    def flush(self):
+        entries, self._entries = self._entries, {}
+        for folder, updates in entries.items():
+            manifest = read_variant_manifest(folder)
+            for name, settings in updates.items():
+                if settings is None:
+                    manifest.pop(name, None)
+                else:
+                    manifest[name] = settings
+            path = os.path.join(folder, VARIANT_MANIFEST)
+            try:
+                tmp_path = f"{path}.{os.getpid()}.lodtmp"
+                with open(tmp_path, 'w', encoding='utf-8') as f:
+                    json.dump(manifest, f)
+                os.replace(tmp_path, path)
+            except OSError as e:
+                print(f"[LOD] Failed to write variant manifest: {e}")
+
+def find_cached_variant(search_root, name_part, ext, target_size, src_path, settings):
+    """
+    在 search_root 下已生成的 textures_{N}px 目录中，寻找 N > target_size 的最小变体。
+    用它代替 4K/8K 原图作为降采样源，解码成本更低。
+    变体必须比原图新，且清单中记录的缩放设置与 settings 相同 (或是 EXACT)，
+    否则视为过期 / 质量不足 (例如 FAST 档位的输出不能用来生成 EXACT 结果)。找不到返回 None。
+    """
+    try:
+        src_mtime = os.path.getmtime(src_path)
+        entries = os.listdir(search_root)
+    except OSError:
+        return None
+
+    best_size = None
+    best_path = None
+    for folder in entries:
+        if not (folder.startswith("textures_") and folder.endswith("px")):
+            continue
+        size_str = folder[len("textures_"):-2]
+        if not size_str.isdigit():
+            continue
+        size = int(size_str)
+        if size <= target_size:
+            continue
+        if best_size is not None and size >= best_size:
+            continue
+
+        file_name = f"{name_part}_{size}px{ext}"
+        if read_variant_manifest(os.path.join(search_root, folder)).get(file_name) not in (settings, CACHE_RESAMPLE):
+            continue
+        candidate = os.path.join(search_root, folder, file_name)
+        try:
+            if os.path.getmtime(candidate) >= src_mtime:
+                best_size, best_path = size, candidate
+        except OSError:
+            continue
+    return best_path
+
+# =============================================================================
+#  UDIM：平铺图片按图块展开
+# =============================================================================
+UDIM_TOKEN = "<UDIM>"
+UVTILE_TOKEN = "<UVTILE>"
+
+def is_udim_path(path):
+    return UDIM_TOKEN in path or UVTILE_TOKEN in path
+
+def udim_tile_path(path, number):
+    """把路径中的 <UDIM> / <UVTILE> 标记替换为图块编号 (1012 -> 1012 / u2_v2)"""
+    index = number - 1001
+    return path.replace(UDIM_TOKEN, str(number)).replace(UVTILE_TOKEN, f"u{index % 10 + 1}_v{index // 10 + 1}")
+
+def is_udim(img):
+    """平铺图片且路径带图块标记 (可以逐图块处理)"""
+    return img.source == 'TILED' and is_udim_path(img.filepath)
+
+def udim_path_exists(img, path):
+    """UDIM 路径要求所有图块文件都存在；普通路径同 os.path.exists"""
+    if img.source == 'TILED' and is_udim_path(path):
+        return all(os.path.exists(udim_tile_path(path, tile.number)) for tile in img.tiles)
+    return os.path.exists(path)
+
+def udim_name_regex(stem):
+    """输出文件名主干的正则：图块标记处匹配实际的图块编号"""
+    pattern = re.escape(stem)
+    pattern = pattern.replace(re.escape(UDIM_TOKEN), r"\d{4}")
+    return pattern.replace(re.escape(UVTILE_TOKEN), r"u\d+_v\d+")
+
+def expand_udim_task(task, img, tile_sizes=None):
+    """
+    把 UDIM 图片的任务拆成每个图块一个任务 (src / dst / outputs 中的标记替换为图块编号)。
+    tile_sizes: {图块编号: 目标尺寸}，未给出的图块使用 task["target_size"]。
+    每个图块任务记录 tile (编号) 与 udim_dst (切换用的带标记路径)。
+    """
+    tiles = []
+    for tile in img.tiles:
+        number = tile.number
+        tile_task = dict(task, tile=number, udim_dst=task["dst_path"])
+        tile_task["src_path"] = udim_tile_path(task["src_path"], number)
+        tile_task["dst_path"] = udim_tile_path(task["dst_path"], number)
+        if tile_sizes:
+            tile_task["target_size"] = tile_sizes.get(number, task["target_size"])
+        if "outputs" in task:
+            tile_task["outputs"] = [dict(out, dst=udim_tile_path(out["dst"], number)) for out in task["outputs"]]
+        tiles.append(tile_task)
+    return tiles
+
+def get_source_path(img):
+    """
+    原图的绝对路径。优先使用 lod_original_path (图片可能已被切换到缩放版本)，
+    原图不存在时回退到当前路径。UDIM 图片返回带图块标记的路径。
+    """
+    current = bpy.path.abspath(img.filepath, library=img.library)
+    if "lod_original_path" in img:
+        original = bpy.path.abspath(img["lod_original_path"], library=img.library)
+        if udim_path_exists(img, original):
+            return original
+    return current
+
+def build_output_stems():
+    """
+    为每张图生成输出文件名 {img.name: (stem, ext)}，基于原图文件名。
+    不同目录下的同名贴图 (如两个 albedo.png) 追加路径哈希，防止输出互相覆盖。
+    """
+    groups = {}
+    for img in bpy.data.images:
+        if img.source == 'VIEWER': continue
+        raw_path = img["lod_original_path"] if "lod_original_path" in img else img.filepath
+        abs_path = bpy.path.abspath(raw_path, library=img.library) if raw_path else ""
+
+        file_name = os.path.basename(abs_path)
+        if not file_name: file_name = f"{img.name}.png"
+        stem, ext = os.path.splitext(file_name)
+        if not ext: ext = ".png"
+
+        path_key = os.path.normcase(os.path.normpath(abs_path)) if abs_path else img.name
+        groups.setdefault(stem.lower(), []).append((img.name, stem, ext, path_key))
+
+    stems = {}
+    for entries in groups.values():
+        distinct_paths = {e[3] for e in entries}
+        for name, stem, ext, path_key in entries:
+            if len(distinct_paths) > 1:
+                digest = hashlib.sha1(path_key.encode("utf-8")).hexdigest()[:8]
+                stem = f"{stem}_{digest}"
+            stems[name] = (stem, ext)
+    return stems
+
+# 缓存键中的缩放设置 (算法变化时需同步修改，使旧缓存失效)
+CACHE_RESAMPLE = "LANCZOS"
+
+def get_cache_config(scn):
+    """共享贴图缓存配置，未启用时返回 None"""
+    if not scn.use_texture_cache:
+        return None
+    if scn.texture_cache_dir:
+        cache_dir = bpy.path.abspath(scn.texture_cache_dir)
+    else:
+        cache_dir = bpy.utils.user_resource('DATAFILES', path="lodify_texture_cache", create=True)
+    return {
+        "dir": cache_dir,
+        "max_bytes": int(scn.texture_cache_max_gb * 1024 * 1024 * 1024),
+    }
+
+def resample_settings(task):
+    """任务的缩放设置标识，用于缓存键与变体清单"""
+    if task.get("action") == "COPY" and "copies" not in task:
+        # 原样复制的输出与原图相同 (缓存命中的 COPY 仍按原任务的设置)
+        return CACHE_RESAMPLE
+    # 降低解码分辨率的档位结果不同，需单独区分 (EXACT 保持原有键)
+    resample = CACHE_RESAMPLE
+    quality = task.get("quality", "EXACT")
+    if quality != "EXACT":
+        resample = f"{CACHE_RESAMPLE}:{quality}"
+    if task.get("stream"):
+        # 流式路径先做区域平均，结果与整图解码不同
+        resample += ":stream"
+    return resample
+
+def attach_cache(task, cache_cfg, key_src):
+    """给任务附加缓存信息，缓存键基于原图内容 (而不是降采样用的中间变体)"""
+    ext = os.path.splitext(task["dst_path"])[1].lower()
+    resample = resample_settings(task)
+    if ext == '.exr':
+        resample += f":{task.get('float_depth')}:{task.get('exr_codec')}"
+    task["cache"] = dict(cache_cfg, key_src=key_src, settings=f"{resample}|{ext}")
+
+def fetch_from_cache(task):
+    """
+    主线程快速检查：只使用已记忆的源文件哈希 (一次 stat，不读文件内容)。
+    全部输出命中时把任务改为 COPY 并返回 True：由进程池的 I/O 线程从缓存克隆到输出
+    (不阻塞主线程)；否则交给 worker (worker 会计算哈希并写回缓存)。
+    """
+    info = task.get("cache")
+    if not info:
+        return False
+    try:
+        cache = texture_cache.get_cache(info["dir"], info["max_bytes"])
+        outputs = task.get("outputs") or [{"size": task["target_size"], "dst": task["dst_path"]}]
+        hits = []
+        for out in outputs:
+            cached_path = cache.lookup(info["key_src"], out["size"], info["settings"], compute_hash=False)
+            if not cached_path:
+                return False
+            hits.append((cached_path, out["dst"]))
+        task["action"] = "COPY"
+        task["copies"] = hits
+        task["cost"] = 0
+        task["mem_bytes"] = 0
+        del task["cache"]
+        return True
+    except Exception as e:
+        print(f"[LOD] Cache lookup failed: {e}")
+        return False
     
+def get_blender_image_meta(img):
+    """
+    从 Blender 读取元数据 (会加载像素，仅用于打包/生成的图片或无法解析文件头的情况)
+    """
+    width, height = img.size[0], img.size[1]
+    return {
+        "format": img.file_format,
+        "width": width,
+        "height": height,
+        "channels": img.channels,
+        "bit_depth": img.depth // max(img.channels, 1) if img.depth else 8,
+        "is_float": img.is_float,
+        "tiles": len(img.tiles) if img.source == 'TILED' else 1,
+    }
+
+def collect_image_meta(images):
+    """
+    批量获取元数据 {img.name: meta 或 None}。
+    本地文件只读文件头 (线程池并行)，打包/生成的图片或无法解析的格式回退到 Blender。
+    """
+    file_paths = {}
+    tile_paths = {}
+    for img in images:
+        if img.packed_file or not img.filepath: continue
+        if img.source == 'FILE':
+            file_paths[img.name] = bpy.path.abspath(img.filepath, library=img.library)
+        elif is_udim(img):
+            # UDIM: 逐个图块读文件头
+            path = bpy.path.abspath(img.filepath, library=img.library)
+            tile_paths[img.name] = [udim_tile_path(path, tile.number) for tile in img.tiles]
+
+    all_paths = list(file_paths.values())
+    for paths in tile_paths.values():
+        all_paths.extend(paths)
+    meta_map = image_meta.scan_files(all_paths)
+
+    result = {}
+    for img in images:
+        meta = meta_map.get(file_paths.get(img.name))
+        if img.name in tile_paths:
+            # 以最大的图块代表整张图片，并记录图块数 (内存估算按图块数累计)
+            tile_metas = [meta_map.get(p) for p in tile_paths[img.name]]
+            if tile_metas and all(tile_metas):
+                meta = dict(max(tile_metas, key=lambda m: m["width"] * m["height"]), tiles=len(tile_metas))
+        if meta is None:
+            try:
+                meta = get_blender_image_meta(img)
+            except Exception:
+                meta = None
+        result[img.name] = meta
+    return result
+
+def get_meta_memory_bytes(meta, mipmaps=True, size=None):
+    """按元数据估算内存；size 给定时按缩放到该尺寸后的分辨率估算"""
+    width, height = meta["width"], meta["height"]
+    if size:
+        width, height = utils.fit_image_size(width, height, size)
+    return utils.estimate_image_memory_bytes(
+        width, height,
+        channels=meta["channels"],
+        is_float=meta["is_float"],
+        bit_depth=meta["bit_depth"],
+        mipmaps=mipmaps,
+        tiles=meta.get("tiles", 1),
+    )
+
+# worker 解码时的工作集：原图像素 + 模式转换 (如转 RGBA) 产生的一份拷贝
+WORKER_MEMORY_FACTOR = 2
+
+# 各格式每像素的相对处理成本 (解码 + 缩放 + 编码)，用于最长任务优先调度
+CODEC_COST = {
+    '.png': 3.0, '.webp': 2.5, '.tif': 1.5, '.tiff': 1.5,
+    '.jpg': 1.0, '.jpeg': 1.0, '.bmp': 0.8, '.tga': 0.8,
+    '.exr': 2.5, '.hdr': 2.0,
+}
+DEFAULT_CODEC_COST = 1.5
+COPY_COST = 0.05                    # 文件拷贝只与文件大小有关，远小于解码
+DEFAULT_TASK_PIXELS = 2048 * 2048   # 无法读取文件头时按 2K 估算
+
+def estimate_task_memory(task, meta):
+    """
+    估算 worker 处理任务时的峰值内存 (宽 × 高 × 通道 × 位深)。
+    meta 为 None (无法解析文件头) 时返回 None，由进程池按默认值处理。
+    """
+    if task["action"] == "COPY":
+        return 0
+    if meta is None:
+        return None
+    bytes_per_channel = 4 if meta["is_float"] else max(meta["bit_depth"], 8) // 8
+    decoded = meta["width"] * meta["height"] * max(meta["channels"], 1) * bytes_per_channel
+    return decoded * WORKER_MEMORY_FACTOR
+
+def estimate_task_cost(task, meta):
+    """任务的相对耗时：源图像素数 × 格式成本"""
+    pixels = meta["width"] * meta["height"] if meta else DEFAULT_TASK_PIXELS
+    if task["action"] == "COPY":
+        return pixels * COPY_COST
+    ext = os.path.splitext(task["src_path"] or task["dst_path"])[1].lower()
+    return pixels * CODEC_COST.get(ext, DEFAULT_CODEC_COST)
+
+# 解码后超过此大小 (如 16K RGB / 12K RGBA) 的贴图交给 worker 分条带流式降采样
+STREAM_MIN_BYTES = 512 * 1024 * 1024
+STREAM_STRIP_BYTES = 64 * 1024 * 1024   # 与 worker.STRIP_BYTES 一致
+STREAM_GAPS = {"EXACT": 4.0, "BALANCED": 3.0, "FAST": 2.0}   # 与 worker.STREAM_GAPS 一致
+STREAM_FORMATS = {'.png', '.jpg', '.jpeg', '.tif', '.tiff', '.tga', '.bmp'}
+RAW_STRIP_FORMATS = {'.tif', '.tiff'}   # 无 OpenImageIO 时 Pillow 只能按条带读取未压缩 TIFF
+
+def route_stream(task, meta):
+    """
+    超大贴图改走流式路径: 设置 task["stream"]，并把 mem_bytes 改为
+    条带工作集 (条带 + uint32 累加) + 区域平均后的图，而不是整图解码大小。
+    """
+    if task["action"] not in ("RESIZE", "PYRAMID") or task.get("shared") or meta is None:
+        return
+    if meta["is_float"] or not task["mem_bytes"] or task["mem_bytes"] < STREAM_MIN_BYTES * WORKER_MEMORY_FACTOR:
+        return
+    ext = os.path.splitext(task["src_path"])[1].lower()
+    if ext not in (STREAM_FORMATS if check_oiio_available() else RAW_STRIP_FORMATS):
+        return
+
+    target = max((o["size"] for o in task["outputs"]), default=0) if "outputs" in task else task["target_size"]
+    width, height = meta["width"], meta["height"]
+    k = int(max(width, height) / (max(target, 1) * STREAM_GAPS.get(task.get("quality"), STREAM_GAPS["EXACT"])))
+    if k < 2:
+        return
+    channels = max(meta["channels"], 1)
+    reduced = -(-width // k) * -(-height // k) * channels
+    task["stream"] = True
+    task["mem_bytes"] = STREAM_STRIP_BYTES * 5 + reduced * WORKER_MEMORY_FACTOR
+
+def route_copy(task, meta):
+    """原图不大于目标尺寸时无需解码：改为 COPY，由进程池在 I/O 线程上克隆 (不启动子进程)"""
+    if task["action"] not in ("RESIZE", "FLOAT") or "outputs" in task or meta is None:
+        return
+    if meta["width"] <= task["target_size"] and meta["height"] <= task["target_size"]:
+        task["action"] = "COPY"
+
+def annotate_task(task, img):
+    """读取一次源文件头，写入 mem_bytes (进程池准入) 与 cost (调度排序)"""
+    kind = task.get("shared")
+    if kind == 'ENCODED':
+        meta = image_meta.read_image_meta_bytes(img.packed_file.data)
+    elif kind == 'PIXELS':
+        meta = {"width": img.size[0], "height": img.size[1], "channels": img.channels,
+                "bit_depth": 32, "is_float": True}
+    else:
+        meta = image_meta.read_image_meta(task["src_path"])
+    route_copy(task, meta)
+    task["mem_bytes"] = estimate_task_memory(task, meta)
+    task["cost"] = estimate_task_cost(task, meta)
+    route_stream(task, meta)
+
+
+# =============================================================================
+#  共享内存传输：打包 / 生成的图片不落盘交给 worker
+# =============================================================================
+
+# 编码结果缓冲：按 16bit RGBA 原始大小 + 文件头余量分配 (PNG 最坏情况略大于原始数据)
+ENCODED_BYTES_PER_PIXEL = 8
+ENCODED_HEADROOM = 64 * 1024
+
+def get_shared_kind(img):
+    """
+    没有本地文件的图片交给 worker 的方式：
+    - 'ENCODED': 打包的文件字节 (packed_file.data)，结果重新打包
+    - 'PIXELS':  生成图片的像素 (pixels.foreach_get)，结果 foreach_set 写回
+    - None:      共享内存 / PIL 不可用，或多视图 / UDIM / EXR 等，只能在主线程处理
+    """
+    if worker_pool.shared_memory is None or not check_pil_available():
+        return None
+    if img.source == 'TILED' or len(img.packed_files) > 1:
+        return None
+    if img.packed_file:
+        if img.file_format in {'OPEN_EXR', 'OPEN_EXR_MULTILAYER', 'HDR'}:
+            return None
+        return 'ENCODED'
+    if img.source == 'GENERATED':
+        return 'PIXELS'
+    return None
+
+def skip_generated(img):
+    """生成的图片只有能以像素形式经共享内存交给 worker 时才列出 / 参与相机分析"""
+    return img.source == 'GENERATED' and get_shared_kind(img) != 'PIXELS'
+
+def share_task_input(task):
+    """
+    提交前才把数据放入共享内存 (排队中的任务不占内存)，同时分配结果缓冲。
+    打包字节拷贝一次；像素由 foreach_get 直接写入共享缓冲区。
+    """
+    img = bpy.data.images[task["img_name"]]
+    kind = task["shared"]
+    if kind == 'ENCODED':
+        data = img.packed_file.data
+        meta = image_meta.read_image_meta_bytes(data)
+        width, height = (meta["width"], meta["height"]) if meta else tuple(img.size)
+        tw, th = utils.fit_image_size(width, height, task["target_size"])
+        src = worker_pool.create_shared(len(data))
+        task["src_shm"] = {"name": src.name, "kind": kind, "size": len(data)}
+        src.buf[:len(data)] = data
+        dst = worker_pool.create_shared(tw * th * ENCODED_BYTES_PER_PIXEL + ENCODED_HEADROOM)
+        task["dst_shm"] = {"name": dst.name, "size": dst.size}
+    else:
+        width, height = img.size
+        channels = img.channels
+        tw, th = utils.fit_image_size(width, height, task["target_size"])
+        src = worker_pool.create_shared(width * height * channels * 4)
+        task["src_shm"] = {"name": src.name, "kind": kind, "width": width, "height": height, "channels": channels}
+        view = np.ndarray(width * height * channels, dtype=np.float32, buffer=src.buf)
+        img.pixels.foreach_get(view)
+        del view
+        dst = worker_pool.create_shared(tw * th * channels * 4)
+        task["dst_shm"] = {"name": dst.name, "width": tw, "height": th}
+
+def apply_shared_result(task, result):
+    """把 SHARED 任务的结果写回图片：打包图片重新打包，生成图片 foreach_set"""
+    img = bpy.data.images.get(task["img_name"])
+    dst = worker_pool.get_shared(task["dst_shm"]["name"])
+    if img is None or dst is None:
+        return
+    try:
+        if task["shared"] == 'ENCODED':
+            size = result["shm_bytes"]
+            img.pack(data=bytes(dst.buf[:size]), data_len=size)
+            # 丢弃旧的解码缓存，下次使用时从新的打包数据解码
+            # (reload 会从原文件路径重新打包，这里不能用)
+            img.buffers_free()
+        else:
+            info = task["dst_shm"]
+            img.generated_width = info["width"]
+            img.generated_height = info["height"]
+            view = np.ndarray(info["width"] * info["height"] * img.channels, dtype=np.float32, buffer=dst.buf)
+            img.pixels.foreach_set(view)
+            del view
+            img.update()
+    except Exception as e:
+        print(f"Write-back Error: {e}")
+
+# 相邻采样帧之间任一物体的需求尺寸变化超过 2^0.5 倍 (半个八度) 时二分细化
+SAMPLE_REFINE_OCTAVES = 0.5
+
+def iter_animation_coverage(scene, scn, snap, rows, step, px_floor=32, px_cap=4096):
+    """
+    在整个帧范围内采样物体的屏幕像素尺寸 (生成器，每次采样后 yield None，便于分时执行)，
+    结束时返回 (px_max, visible_any, sample_count)。
+    - 粗采样：每 step 帧一次，另加首尾帧与相机切换标记前后的帧
+    - 细化：相邻采样间相机不同，或某物体需求尺寸变化过快且可能刷新其最大值时二分插入采样
+      (尺寸先限制在 [px_floor, px_cap]，低于下限 / 高于上限的变化不影响结果)
+    静止物体的矩阵只读一次；调用方负责恢复当前帧 (见 schedule.suspended)。
+    """
+    matrices = snap.matrices[rows].copy()
+    bboxes = snap.bboxes[rows]
+    objects = [snap.objects[i] for i in rows.tolist()]
+    dynamic = [j for j, obj in enumerate(objects) if not utils.is_static_transform(obj)]
+
+    px_max = np.zeros(len(rows))
+    visible_any = np.zeros(len(rows), dtype=bool)
+    count = 0
+
+    def sample(frame):
+        nonlocal count
+        scene.frame_set(frame)
+        for j in dynamic:
+            matrices[j] = objects[j].matrix_world
+        # 跟随时间线标记切换的镜头 (固定的 LOD Camera 会让标记前后的细化失去意义)
+        cam = utils.get_shot_camera(scene, scn)
+        px, visible, _ = utils.batch_screen_coverage(scene, None, cam, matrices=matrices, bboxes=bboxes)
+        px = np.where(visible, px, 0.0)
+        np.maximum(px_max, px, out=px_max)
+        visible_any[:] |= visible
+        count += 1
+        return cam, np.log2(np.clip(px, px_floor, px_cap))
+
+    def refine(a, sample_a, b, sample_b):
+        if b - a <= 1:
+            return
+        (cam_a, level_a), (cam_b, level_b) = sample_a, sample_b
+        if cam_a == cam_b:
+            best = np.log2(np.clip(px_max, px_floor, px_cap))
+            fast = np.abs(level_a - level_b) > SAMPLE_REFINE_OCTAVES
+            near_max = np.maximum(level_a, level_b) + SAMPLE_REFINE_OCTAVES > best
+            if not np.any(fast & near_max):
+                return
+        mid = (a + b) // 2
+        sample_mid = sample(mid)
+        yield
+        yield from refine(a, sample_a, mid, sample_mid)
+        yield from refine(mid, sample_mid, b, sample_b)
+
+    start, end = scene.frame_start, scene.frame_end
+    frames = set(range(start, end + 1, max(step, 1))) | {end}
+    for frame in utils.get_camera_switch_frames(scene, start, end):
+        frames.update((frame - 1, frame))
+    frames = sorted(f for f in frames if start <= f <= end)
+
+    prev_frame, prev = frames[0], sample(frames[0])
+    for frame in frames[1:]:
+        yield
+        current = sample(frame)
+        yield from refine(prev_frame, prev, frame, current)
+        prev_frame, prev = frame, current
+
+    return px_max, visible_any, count
+
+# 相机分析的尺寸下限；无 UV 时按包围盒像素尺寸估算的放大系数
+CAM_MIN_FLOOR = 32
+BBOX_SIZE_MARGIN = 1.2
+
+def snap_texture_size(req_px):
+    """相机需求像素向上取到 2 的幂 (4 - 4096)"""
+    for size in (4, 8, 16, 32, 64, 128, 256, 512, 1024, 2048):
+        if req_px <= size:
+            return size
+    return 4096
+
+def get_user_max_cap(scn):
+    if scn.resize_size == 'c':
+        return scn.custom_resize_size
+    try: return int(scn.resize_size)
+    except: return 4096
+
+def iter_image_requirements(scene, scn, cam, cap, tile_needs=None):
+    """
+    相机分析 (生成器)：每张图片在屏幕上实际被采样的分辨率。
+    - 屏幕尺寸：当前帧或整个动画的采样最大值 (cam_sample_animation)
+    - 纹素密度 (cam_texel_density)：屏幕像素 / 世界单位 ÷ UV 长度 / 世界单位，
+      平铺 UV 需求更低，图集或只用到一部分的 UV 需求更高；无 UV 时退回包围盒估算
+    逐物体分析，图片的所有使用者都分析完后立即产出 (img, target_res, need, weight)：
+      target_res - 限制在 [CAM_MIN_FLOOR, cap] 内的目标尺寸
+      need       - 未限制的需求尺寸 (不可见为 0)，用于找出分辨率过剩的图片
+      weight     - 屏幕重要性 (归一化屏幕占比的最大值)
+    tile_needs 给出 (dict) 时，UDIM 图片按 UV 重心所在图块分别计算纹素密度需求，
+    写入 tile_needs[图片名] = {图块编号: 限制后的尺寸}；无法按图块估算时为 None。
+    其余时候 yield None，调用方可在任意一次 yield 处暂停 (分时执行)。
+    """
+    render = scene.render
+    max_screen_res = max(render.resolution_x, render.resolution_y, 1)
+    snap = scene_snapshot.get_snapshot(scene)
+    rows = snap.select(types=('MESH',), renderable=True, skip_sources=True)
+
+    if scn.cam_sample_animation:
+        # 整个帧范围 (含多机位切换) 自适应采样，每个物体取所有采样中的最大尺寸
+        with schedule.suspended(scene):
+            px_sizes, visibles, n_samples = yield from iter_animation_coverage(
+                scene, scn, snap, rows, scn.cam_sample_step, px_floor=CAM_MIN_FLOOR, px_cap=np.inf,
+            )
+        print(f"[LOD] Sampled {n_samples} frames.")
+    else:
+        # 一次性批量计算所有物体的屏幕占比 (NumPy)
+        px_sizes, visibles, _ = utils.batch_screen_coverage(
+            scene, None, cam, matrices=snap.matrices[rows], bboxes=snap.bboxes[rows],
+        )
+
+    # 每张图片还有多少个物体未分析 (材质 -> 图片引用由 image_index 记忆)
+    row_images = []
+    remaining = {}
+    for row in rows.tolist():
+        names = {name for mat_name in snap.materials[row] for name in snap.material_images(mat_name)}
+        row_images.append(names)
+        for name in names:
+            remaining[name] = remaining.get(name, 0) + 1
+
+    # 屏幕最长边对应物体世界包围盒的最长边
+    lo, hi = snap.world_aabbs(rows)
+    extents = (hi - lo).max(axis=1) if len(rows) else np.zeros(0)
+    density_cache = {}
+    best = {}   # 图片名 -> [target_res, need, weight]
+    tiled = set()
+    if tile_needs is not None:
+        tiled = {img.name for img in bpy.data.images if img.source == 'TILED'}
+
+    for row, names, px_size, visible, extent in zip(
+            rows.tolist(), row_images, px_sizes.tolist(), visibles.tolist(), extents.tolist()):
+        densities = {}
+        tile_densities = {}
+        if visible and scn.cam_texel_density and extent > 0:
+            densities = utils.get_uv_densities(snap.objects[row], density_cache)
+            if not tiled.isdisjoint(names):
+                tile_densities = utils.get_uv_tile_densities(snap.objects[row], density_cache)
+        weight = min(px_size / max_screen_res, 1.0) if visible else 0.0
+
+        for mat_name in snap.materials[row]:
+            if not visible:
+                need = 0.0
+            elif mat_name in densities:
+                need = px_size / extent / densities[mat_name]
+            else:
+                need = px_size * BBOX_SIZE_MARGIN
+            target_res = min(max(need, CAM_MIN_FLOOR), cap)
+
+            for img_name in snap.material_images(mat_name):
+                entry = best.setdefault(img_name, [0, 0.0, 0.0])
+                entry[0] = max(entry[0], target_res)
+                entry[1] = max(entry[1], need)
+                entry[2] = max(entry[2], weight)
+
+                # UDIM: 每个图块按落在其中的三角形的密度单独计算；
+                # 有使用者只能按包围盒估算时记为 None，所有图块都用整张图的尺寸
+                if img_name in tiled and visible:
+                    per_tile = tile_needs.setdefault(img_name, {})
+                    if mat_name not in tile_densities:
+                        tile_needs[img_name] = None
+                    elif per_tile is not None:
+                        for tile, density in tile_densities[mat_name].items():
+                            tile_res = min(max(px_size / extent / density, CAM_MIN_FLOOR), cap)
+                            per_tile[tile] = max(per_tile.get(tile, 0), tile_res)
+
+        # 这一行是某些图片的最后一个使用者：尺寸已确定，立即产出
+        for img_name in names:
+            remaining[img_name] -= 1
+            if remaining[img_name]:
+                continue
+            img = bpy.data.images.get(img_name)
+            if not img or img.source == 'VIEWER' or skip_generated(img): continue
+            target_res, need, weight = best.pop(img_name)
+            yield img, target_res, need, weight
+        yield None
+
+def compute_image_requirements(scene, scn, cam, cap):
+    """
+    一次性执行完整的相机分析，返回 (res_map, weight_map, need_map)，键为图片
+    (各值含义见 iter_image_requirements)。
+    """
+    res_map, weight_map, need_map = {}, {}, {}
+    for item in iter_image_requirements(scene, scn, cam, cap):
+        if item is None:
+            continue
+        img, target_res, need, weight = item
+        res_map[img] = target_res
+        need_map[img] = need
+        weight_map[img] = weight
+    return res_map, weight_map, need_map
+
 class LOD_OT_UpdateImageList(bpy.types.Operator):
     bl_idname = "lod.updateimagelist"
     bl_label = "Update Image List"
@@ -35,25 +763,30 @@ class LOD_OT_UpdateImageList(bpy.types.Operator):
         count = 0
         
         temp_data_list = []
+        candidates = []
+
+        # 世界环境贴图 (含节点组内部) 不参与缩放
+        world = context.scene.world
+        world_images = image_index.get_index().world_images(world.name) if world else frozenset()
 
         for img in bpy.data.images:
             if img.name in {'Render Result', 'Viewer Node'}: continue
-            if img.source == 'GENERATED': continue
-
-            is_world_tex = False
-            if bpy.context.scene.world and bpy.context.scene.world.node_tree:
-                for n in bpy.context.scene.world.node_tree.nodes:
-                    if n.type == 'TEX_ENVIRONMENT' and n.image == img:
-                        is_world_tex = True
-                        break
-            if is_world_tex: continue
-
-            # 提前计算大小
-            size_str = utils.get_image_size_str(img)
-            try:
-                size_float = float(size_str)
-            except:
+            if skip_generated(img): continue
+            if img.name in world_images: continue
+
+            candidates.append(img)
+
+        # 本地文件只读文件头，不让 Blender 加载像素
+        meta_map = collect_image_meta(candidates)
+
+        for img in candidates:
+            meta = meta_map.get(img.name)
+
+            if meta:
+                size_float = get_meta_memory_bytes(meta, scn.mem_include_mipmaps) / (1024 * 1024)
+            else:
                 size_float = 0.0
+            size_str = f"{size_float:.2f}"
             
             total_size_mb += size_float
             count += 1
@@ -63,6 +796,7 @@ class LOD_OT_UpdateImageList(bpy.types.Operator):
                 "obj": img,
                 "size_str": size_str,
                 "size_float": size_float,
+                "meta": meta,
                 "packed_status": 0
             }
             
@@ -86,6 +820,14 @@ class LOD_OT_UpdateImageList(bpy.types.Operator):
             item.image_size = data["size_str"]
             item.packed_img = data["packed_status"]
             item.image_selected = False 
+            meta = data["meta"]
+            if meta:
+                item.image_width = meta["width"]
+                item.image_height = meta["height"]
+                item.image_channels = meta["channels"]
+                item.image_bit_depth = meta["bit_depth"]
+                item.image_is_float = meta["is_float"]
+                item.image_tiles = meta.get("tiles", 1)
             
         scn.r_total_images = count
         scn.total_image_memory = f"{total_size_mb:.2f}"
@@ -105,7 +847,161 @@ class LOD_OT_SelectAllImages(bpy.types.Operator):
 
 
 # =============================================================================
-#  核心修改：基于 Subprocess 的异步缩放 Operator
+#  批量切换：合并多张图片的重载，只刷新一次视图
+# =============================================================================
+
+# 完成的图片攒够 RELOAD_BATCH 张或距上次切换超过 RELOAD_INTERVAL 秒时统一重载
+RELOAD_BATCH = 16
+RELOAD_INTERVAL = 0.5
+
+def tag_redraw_all(context):
+    for window in context.window_manager.windows:
+        for area in window.screen.areas:
+            area.tag_redraw()
+
+class SwapBatch:
+    """
+    待切换到新文件的图片 [(img_name, dst_path)]。
+    逐张 filepath + reload() 会各自触发一次 GPU 重新上传和材质更新；
+    这里用 filepath_raw (不触发 RNA 更新) 设置路径，每张图只 reload 一次，
+    同一次回调内的更新由 depsgraph 合并，最后统一刷新一次视图。
+    defer=True 时全部推迟到任务结束 (flush(force=True))。
+    """
+
+    def __init__(self, defer=False):
+        self.pending = []
+        self.defer = defer
+        self.last_flush = time.time()
+
+    def add(self, img_name, dst_path):
+        self.pending.append((img_name, dst_path))
+
+    def due(self):
+        if not self.pending or self.defer:
+            return False
+        return len(self.pending) >= RELOAD_BATCH or time.time() - self.last_flush >= RELOAD_INTERVAL
+
+    def flush(self, context, force=False):
+        """执行一批切换，返回切换的图片数量"""
+        if not self.pending or not (force or self.due()):
+            return 0
+        swaps, self.pending = self.pending, []
+        self.last_flush = time.time()
+        for img_name, dst_path in swaps:
+            img = bpy.data.images.get(img_name)
+            if not img:
+                continue
+            try:
+                img.filepath_raw = bpy.path.relpath(dst_path)
+                img.reload()
+            except Exception as e:
+                print(f"Reload Error: {e}")
+        tag_redraw_all(context)
+        return len(swaps)
+
+
+class TileSet:
+    """
+    UDIM 图块任务的汇合：一张图片的全部图块都成功后，才把它切换到新的带标记路径
+    (任一图块失败则保持原图，避免新旧图块混用)。
+    """
+
+    def __init__(self):
+        self._pending = {}  # 图片名 -> [剩余图块数, 是否全部成功]
+
+    def expect(self, img_name, count):
+        self._pending[img_name] = [count, True]
+
+    def finish(self, task, ok):
+        """记录一个图块的结果；图片的最后一个图块到达时返回是否全部成功，否则返回 None"""
+        entry = self._pending.get(task["img_name"])
+        if entry is None:
+            return None
+        entry[0] -= 1
+        entry[1] = entry[1] and ok
+        if entry[0] > 0:
+            return None
+        del self._pending[task["img_name"]]
+        return entry[1]
+
+
+# =============================================================================
+#  worker 结果分发：后台读取线程 -> 结果队列 -> bpy.app.timers 回调
+# =============================================================================
+
+# 只等待 worker 时的检查间隔 (每次仅一次 Queue.empty()，不轮询子进程)。
+# bpy.app.timers 无法从后台读取线程唤醒，只能轮询；连续没有结果时逐步退避到
+# MAX_WAIT_INTERVAL，取回结果后再恢复为 WAIT_INTERVAL。
+WAIT_INTERVAL = 0.05
+MAX_WAIT_INTERVAL = 0.25
+WAIT_BACKOFF = 1.5
+# 主线程仍有任务 (分析 / 原生缩放) 时的间隔
+BUSY_INTERVAL = 0.01
+
+_active_ops = {}    # owner -> 正在运行的异步 Operator
+_wait_interval = WAIT_INTERVAL
+
+def start_driving(op):
+    """由 drain_timer 驱动 op.tick()，modal 本身不再挂 10ms 定时器"""
+    global _wait_interval
+    _active_ops[op._owner] = op
+    _wait_interval = WAIT_INTERVAL
+    if not bpy.app.timers.is_registered(drain_timer):
+        bpy.app.timers.register(drain_timer, first_interval=0.0)
+
+def stop_driving(op):
+    _active_ops.pop(op._owner, None)
+
+def wake_modal(op, context):
+    """全部完成后停止驱动，并用一次性定时器事件唤醒 modal 收尾"""
+    stop_driving(op)
+    op._timer = context.window_manager.event_timer_add(0.0, window=op._window)
+
+def abort_driving(op, context, error):
+    """tick 出错：停止驱动并唤醒 modal，由 modal 走 cancel() 释放资源并报告错误"""
+    op._error = str(error) or type(error).__name__
+    wake_modal(op, context)
+
+def drain_timer():
+    """
+    worker 结果由后台线程放入进程池的队列。只有结果待取回或主线程仍有任务时
+    才调用 Operator 的 tick()，否则本次回调只检查队列是否为空，并逐步拉长间隔。
+    异常不能传出回调，否则 Blender 会永久注销本定时器，modal 永远等不到结束。
+    """
+    global _wait_interval
+    if not _active_ops:
+        return None
+    busy = False
+    ready = False
+    for owner, op in list(_active_ops.items()):
+        try:
+            if op._main_thread_work() or op._pool.has_results(owner):
+                ready = True
+                busy = op.tick(bpy.context) or busy
+        except ReferenceError:
+            # Operator 已被 Blender 释放 (如加载新文件)
+            _active_ops.pop(owner, None)
+        except Exception as e:
+            traceback.print_exc()
+            _active_ops.pop(owner, None)
+            try:
+                abort_driving(op, bpy.context, e)
+            except Exception:
+                traceback.print_exc()
+    if not _active_ops:
+        return None
+    if busy:
+        _wait_interval = WAIT_INTERVAL
+        return BUSY_INTERVAL
+    if ready:
+        _wait_interval = WAIT_INTERVAL
+    else:
+        _wait_interval = min(_wait_interval * WAIT_BACKOFF, MAX_WAIT_INTERVAL)
+    return _wait_interval
+
+
+# =============================================================================
+#  核心修改：基于常驻进程池的异步缩放 Operator
 # =============================================================================
 
 class LOD_OT_ResizeImagesAsync(bpy.types.Operator):
@@ -115,85 +1011,94 @@ class LOD_OT_ResizeImagesAsync(bpy.types.Operator):
     bl_options = {'REGISTER', 'UNDO'}
 
 
-    _timer = None
-    _task_queue = []        # 待处理任务 (字典列表)
-    _active_processes = []  # 正在运行的子进程列表: [(process_obj, task_data), ...]
+    _timer = None           # 完成时唤醒 modal 的一次性定时器
+    _window = None
+    _done = False
+    _error = None           # tick 中未处理的异常 (由 modal 取消并报告)
+    _swaps = None           # 待批量切换的图片 (SwapBatch)
+    _tiles = None           # UDIM 图块汇合 (TileSet)
+    _variants = None        # 输出的缩放设置记录 (VariantLog)
+    _worker_queue = None    # 子进程任务 (deque，按成本降序：最长任务优先)
+    _native_queue = None    # 主线程任务 (deque)
+    _pool = None            # 共享的常驻 worker 进程池
+    _owner = ""             # 本次调用在进程池中的标识
+    _in_flight = 0          # 已提交给进程池、尚未返回的任务数
     
     _processed = 0
     _total_tasks = 0
-    _worker_script = ""     # worker.py 的路径
+    _bytes_written = 0
     
-    # 并发配置
-    MAX_PROCESSES = 4       # 同时运行的子进程数量
+    # 并发配置 (进程数由进程池按 CPU / 可用内存自动确定)
     TIME_BUDGET = 0.02      # 主线程每帧处理 Native 任务的时间
 
     def modal(self, context, event):
-        if event.type == 'TIMER':
-            
-            # --- A. 检查正在运行的子进程 ---
-            # 倒序遍历以便安全移除
-            for i in range(len(self._active_processes) - 1, -1, -1):
-                proc, task_data = self._active_processes[i]
-                
-                # 检查进程是否结束
-                ret_code = proc.poll()
-                
-                if ret_code is not None:
-                    # 进程已结束，获取输出
-                    # communicate 会阻塞，但因为 poll 已经确认结束，所以这里会瞬间完成
-                    stdout_data, stderr_data = proc.communicate()
-                    
-                    if ret_code == 0 and "SUCCESS" in stdout_data:
-                        # 成功：在主线程刷新图片
-                        self.handle_worker_success(task_data)
-                    else:
-                        # 失败：打印错误
-                        img_name = task_data["img_name"]
-                        err_msg = stderr_data if stderr_data else stdout_data
-                        print(f"[LODify] Worker Failed for {img_name}: {err_msg}")
-                        # 可选：如果是因为没装 PIL 导致的失败，可以考虑在这里触发回退逻辑
-                        # 但为了代码简单，这里只做报错
-                    
-                    self._processed += 1
-                    # 从活动列表中移除
-                    self._active_processes.pop(i)
+        # 调度由 drain_timer 驱动，modal 只在全部完成或出错后被唤醒一次
+        if event.type == 'TIMER' and self._error:
+            self.cancel(context)
+            self.report({'ERROR'}, f"Resize aborted: {self._error}")
+            return {'CANCELLED'}
+        if event.type == 'TIMER' and self._done:
+            return self.finish(context)
+        return {'PASS_THROUGH'}
 
-            # --- B. 调度新任务 ---
-            if not self._task_queue and not self._active_processes:
-                return self.finish(context)
-            
-            start_time = time.time()
-            
-            while self._task_queue:
-                # 1. 检查 Native 时间预算
-                if (time.time() - start_time) > self.TIME_BUDGET:
-                    break
-                
-                # 2. 预读任务
-                next_task = self._task_queue[0]
-                
-                if next_task["method"] == "PIL":
-                    # 检查进程池是否已满
-                    if len(self._active_processes) < self.MAX_PROCESSES:
-                        task = self._task_queue.pop(0)
-                        self.spawn_worker_process(task)
-                    else:
-                        # 进程池满了，等待下一帧
-                        break
-                        
-                elif next_task["method"] == "NATIVE":
-                    # 原生任务必须在主线程执行
-                    task = self._task_queue.pop(0)
-                    try:
-                        self.process_native_image(task)
-                    except Exception as e:
-                        print(f"Native Error: {e}")
-                    self._processed += 1
+    def _main_thread_work(self):
+        """是否有不依赖 worker 结果、可以立即推进的主线程任务"""
+        # 原生任务待处理，或没有在途任务 (需要首次提交 / 检查完成)，或有一批图片该切换了
+        return bool(self._native_queue) or not self._in_flight or self._swaps.due()
+
+    def tick(self, context):
+        """推进一步 (收取结果 / 提交任务 / 原生缩放)，返回 True 表示主线程仍有任务"""
+        # --- A. 收取进程池中已完成的任务 ---
+        for task_data, result in self._pool.collect(self._owner):
+            if result.get("status") == "SUCCESS":
+                # 成功：在主线程刷新图片
+                self._bytes_written += result.get("bytes", 0)
+                if "shared" in task_data:
+                    apply_shared_result(task_data, result)
+                else:
+                    self.handle_worker_success(task_data)
+            else:
+                # 失败：打印错误 (UDIM 图片整体保持原图)
+                img_name = task_data["img_name"]
+                print(f"[LODify] Worker Failed for {img_name}: {result.get('error')}")
+                if "tile" in task_data:
+                    self._tiles.finish(task_data, False)
+            worker_pool.release_task_shared(task_data)
 
-            # 更新进度条
-            context.window_manager.progress_update(self._processed)
-            
-        return {'PASS_THROUGH'}
+            self._processed += 1
+            self._in_flight -= 1
+
+        # --- B. 调度新任务 ---
+        if not self._worker_queue and not self._native_queue and not self._in_flight:
+            self._done = True
+            wake_modal(self, context)
+            return False
+
+        # 1. 子进程任务：最长任务优先，直到进程池满或内存预算不足
+        while self._worker_queue and self._pool.can_admit(self._worker_queue[0]):
+            task = self._worker_queue.popleft()
+            if not self.submit_worker_job(task):
+                self._worker_queue.appendleft(task)
+                break
+
+        # 2. 原生任务必须在主线程执行，受时间预算限制
+        start_time = time.time()
+        while self._native_queue:
+            if (time.time() - start_time) > self.TIME_BUDGET:
+                break
+            task = self._native_queue.popleft()
+            try:
+                self.process_native_image(task)
+            except Exception as e:
+                print(f"Native Error: {e}")
+            self._processed += 1
+
+        # 合并重载已完成的图片
+        self._swaps.flush(context)
+
+        # 更新进度条
+        context.window_manager.progress_update(self._processed)
+        return bool(self._native_queue)
 
     def invoke(self, context, event):
         scn = context.scene.lod_props
@@ -203,16 +1108,12 @@ class LOD_OT_ResizeImagesAsync(bpy.types.Operator):
             self.report({'ERROR'}, "Please save the .blend file first!")
             return {'CANCELLED'}
 
-        # --- 1. 定位 worker.py 路径 ---
-        # 假设当前文件在 addons/LODify/operators/image.py
-        # worker.py 在 addons/LODify/worker.py
-        current_dir = os.path.dirname(os.path.abspath(__file__)) # .../operators
-        root_dir = os.path.dirname(current_dir)                  # .../LODify
-        self._worker_script = os.path.join(root_dir, "worker.py")
-        
-        if not os.path.exists(self._worker_script):
-            self.report({'ERROR'}, f"Worker script not found at: {self._worker_script}")
+        # --- 1. 检查 worker.py 并获取共享进程池 ---
+        if not os.path.exists(worker_pool.WORKER_SCRIPT):
+            self.report({'ERROR'}, f"Worker script not found at: {worker_pool.WORKER_SCRIPT}")
             return {'CANCELLED'}
+        self._pool = worker_pool.get_pool()
+        self._owner = self._pool.new_owner(self.bl_idname)
 
         # 准备输出目录
         if scn.resize_size == 'c':
@@ -222,23 +1123,37 @@ class LOD_OT_ResizeImagesAsync(bpy.types.Operator):
 
         folder_name = f"textures_{self.target_size}px"
         if scn.duplicate_images and not scn.use_same_directory:
-            self.output_dir = os.path.join(bpy.path.abspath(scn.custom_output_path), folder_name)
+            self.output_root = bpy.path.abspath(scn.custom_output_path)
         else:
-            self.output_dir = os.path.join(base_path, folder_name)
+            self.output_root = base_path
+        self.output_dir = os.path.join(self.output_root, folder_name)
 
         if not os.path.exists(self.output_dir):
             os.makedirs(self.output_dir, exist_ok=True)
 
+        # 完成的图片批量切换 (可推迟到全部完成)；UDIM 图片等全部图块完成后再切换
+        self._swaps = SwapBatch(scn.defer_image_swaps)
+        self._tiles = TileSet()
+        self._variants = VariantLog()
+
         # 构建任务队列
-        self._task_queue = []
-        self._active_processes = []
+        worker_tasks = []
+        native_tasks = []
+        self._in_flight = 0
+        self._bytes_written = 0
+        stems = build_output_stems()
+        cache_cfg = get_cache_config(scn)
+        cache_hits = 0
         
         for item in scn.image_list:
             if not item.image_selected: continue
             
             img = bpy.data.images.get(item.lod_image_name)
             if not img: continue
-            if img.source in {'VIEWER', 'GENERATED'}: continue
+            # 打包 / 生成的图片经共享内存交给 worker
+            shared_kind = get_shared_kind(img)
+            if img.source == 'VIEWER': continue
+            if img.source == 'GENERATED' and not shared_kind: continue
             
             # --- 智能分流策略 ---
             method = "NATIVE"
@@ -248,107 +1163,168 @@ class LOD_OT_ResizeImagesAsync(bpy.types.Operator):
             if img.filepath:
                 ext = os.path.splitext(img.filepath)[1].lower()
 
-            # HDR/EXR 保护
-            if ext in {'.exr', '.hdr'}:
-                print(f"[LOD] Copying HDR/EXR (No Resize): {img.name}")
-                method = "PIL" # 使用子进程进行文件拷贝，避免主线程 IO 卡顿
-                action = "COPY"
+            # HDR/EXR: worker 线性空间缩放；无法读取时交给 Blender 原生写出
+            if ext in FLOAT_EXTS:
+                if can_resize_float(img, ext):
+                    method = "PIL"
+                    action = "FLOAT"
+
+            elif shared_kind:
+                method = "PIL"
+                action = "SHARED"
             
             # 只有当安装了 PIL 且文件在本地时，才使用子进程
             elif check_pil_available():
                 if not img.packed_file and img.filepath:
                      abs_path = bpy.path.abspath(img.filepath)
-                     if os.path.exists(abs_path):
+                     if udim_path_exists(img, abs_path):
                          method = "PIL"
+
+            # UDIM 图块只能交给 worker 逐块处理 (Blender 原生缩放只作用于单张图)
+            if img.source == 'TILED' and (method != "PIL" or not is_udim(img)):
+                print(f"[LOD] Skip UDIM image (tiles missing or PIL unavailable): {img.name}")
+                continue
             
             # 记录原始路径
             if "lod_original_path" not in img:
                 img["lod_original_path"] = img.filepath
 
-            # 构造文件名
-            original_filepath = img.filepath_from_user()
-            file_name = os.path.basename(original_filepath)
-            if not file_name: file_name = f"{img.name}.png"
-            name_part, ext_part = os.path.splitext(file_name)
-            if not ext_part: ext_part = ".png"
-            
-            if action == "COPY":
-                final_ext = ext 
-            else:
-                final_ext = ext_part
+            # 构造文件名 (同名不同路径的贴图会带上路径哈希)
+            name_part, ext_part = stems[img.name]
             
             new_file_name = f"{name_part}_{self.target_size}px{ext_part}"
             new_full_path = os.path.join(self.output_dir, new_file_name)
+            original_src = get_source_path(img)
+            src_path = original_src
+            outputs = None
+
+            if method == "PIL" and action in ("RESIZE", "FLOAT"):
+                sizes = [self.target_size]
+                if scn.resize_pyramid:
+                    # 金字塔：一次解码写出全部尺寸组 (FLOAT 任务同样支持多个输出)
+                    if action == "RESIZE":
+                        action = "PYRAMID"
+                    sizes = sorted(set(PYRAMID_SIZES) | {self.target_size}, reverse=True)
+                    outputs = []
+                    for size in sizes:
+                        size_dir = os.path.join(self.output_root, f"textures_{size}px")
+                        os.makedirs(size_dir, exist_ok=True)
+                        outputs.append({
+                            "size": size,
+                            "dst": os.path.join(size_dir, f"{name_part}_{size}px{ext_part}"),
+                        })
+
+                # 优先从已缓存的更大变体降采样，而不是重新解码原图
+                # (浮点变体可能是半精度，总是从原图缩放；UDIM 按图块直接读原图)
+                variant = None
+                if action != "FLOAT" and img.source != 'TILED':
+                    variant = find_cached_variant(
+                        self.output_root, name_part, ext_part, max(sizes), src_path,
+                        resample_settings({"quality": scn.resize_quality}),
+                    )
+                if variant:
+                    src_path = variant
 
             task_data = {
                 "img_name": item.lod_image_name,
                 "target_size": self.target_size,
-                "src_path": bpy.path.abspath(img.filepath), 
+                "src_path": src_path, 
                 "dst_path": new_full_path,                 
                 "method": method,
                 "action": action
             }
-            self._task_queue.append(task_data)
+            if outputs:
+                task_data["outputs"] = outputs
+            if action == "SHARED":
+                task_data["src_path"] = ""
+                task_data["shared"] = shared_kind
+            if action == "FLOAT":
+                task_data["float_depth"] = scn.float_depth
+                task_data["exr_codec"] = scn.exr_codec
+
+            # UDIM: 每个图块一个任务，分散到整个进程池并行处理
+            tile_tasks = [task_data]
+            if img.source == 'TILED':
+                tile_tasks = expand_udim_task(task_data, img)
+                self._tiles.expect(img.name, len(tile_tasks))
+
+            for task_data in tile_tasks:
+                if method == "PIL":
+                    task_data["quality"] = scn.resize_quality
+                    annotate_task(task_data, img)
+
+                # 共享缓存：命中则直接切换，不再调度任务
+                if cache_cfg and task_data["action"] in {"RESIZE", "PYRAMID", "FLOAT"} and method == "PIL":
+                    key_src = udim_tile_path(original_src, task_data["tile"]) if "tile" in task_data else original_src
+                    attach_cache(task_data, cache_cfg, key_src)
+                    if fetch_from_cache(task_data):
+                        cache_hits += 1
+
+                if method == "PIL":
+                    worker_tasks.append(task_data)
+                else:
+                    # 原生任务按列表中记录的原图尺寸估算成本
+                    task_data["cost"] = item.image_width * item.image_height
+                    native_tasks.append(task_data)
 
-        if not self._task_queue:
+        # 最长任务优先 (LPT)：大图先开始，避免最后才拿到的 16K 贴图拖长整体耗时
+        worker_tasks.sort(key=lambda t: t["cost"], reverse=True)
+        native_tasks.sort(key=lambda t: t["cost"], reverse=True)
+        self._worker_queue = deque(worker_tasks)
+        self._native_queue = deque(native_tasks)
+
+        if not worker_tasks and not native_tasks:
             self.report({'WARNING'}, "No images selected.")
             return {'CANCELLED'}
 
-        self._total_tasks = len(self._task_queue)
+        self._total_tasks = len(worker_tasks) + len(native_tasks)
         self._processed = 0
         
         context.window_manager.progress_begin(0, self._total_tasks)
-        self._timer = context.window_manager.event_timer_add(0.01, window=context.window)
+        self._timer = None
+        self._window = context.window
+        self._done = False
+        self._error = None
         context.window_manager.modal_handler_add(self)
+        start_driving(self)
         
-        pil_count = sum(1 for t in self._task_queue if t["method"] == "PIL")
-        self.report({'INFO'}, f"Starting: {pil_count} via Worker (Fast), {self._total_tasks - pil_count} via Blender (Slow).")
+        pil_count = len(worker_tasks) - cache_hits
+        self.report({'INFO'}, f"Starting: {pil_count} via Worker (Fast), {len(native_tasks)} via Blender (Slow), {cache_hits} from Cache.")
         return {'RUNNING_MODAL'}
 
-    def spawn_worker_process(self, task):
-        """启动一个子进程来执行任务"""
-        # 构建命令： python worker.py --src ... --dst ...
-        cmd = [
-            sys.executable,  # 使用 Blender 自带的 Python
-            self._worker_script,
-            "--src", task["src_path"],
-            "--dst", task["dst_path"],
-            "--size", str(task["target_size"]),
-            "--action", task["action"]
-        ]
-        
+    def submit_worker_job(self, task):
+        """
+        把任务交给常驻进程池 (不再为每张图启动新进程)。
+        返回 False 表示池已满，调用方需把任务放回队列。
+        """
         try:
-            # 启动子进程，接管 stdout 和 stderr
-            # text=True 确保返回字符串而不是字节
-            # creationflags=subprocess.CREATE_NO_WINDOW (可选，防止 Windows 弹窗，但在 Blender 内部通常不需要)
-            proc = subprocess.Popen(
-                cmd,
-                stdout=subprocess.PIPE, 
-                stderr=subprocess.PIPE,
-                text=True,
-                encoding='utf-8' # 强制编码
-            )
-            self._active_processes.append((proc, task))
-            
+            if not self._pool.can_admit(task):
+                return False
+            if "shared" in task:
+                share_task_input(task)
+            if not self._pool.submit(self._owner, task):
+                worker_pool.release_task_shared(task)
+                return False
+            self._in_flight += 1
         except Exception as e:
-            print(f"Failed to spawn worker: {e}")
-            # 如果启动失败，尝试降级到 Native 处理（或者标记失败）
-            # 这里简单处理为标记完成
+            worker_pool.release_task_shared(task)
+            print(f"Failed to submit worker job: {e}")
+            # 如果提交失败，这里简单处理为标记完成
+            if "tile" in task:
+                self._tiles.finish(task, False)
             self._processed += 1
+        return True
 
     def handle_worker_success(self, task):
-        """子进程成功后的回调"""
-        img = bpy.data.images.get(task["img_name"])
-        if not img: return
-        
-        try:
-            # 热重载
-            if hasattr(img, "filepath"):
-                rel_path = bpy.path.relpath(task["dst_path"])
-                img.filepath = rel_path
-            img.reload()
-        except Exception as e:
-            print(f"Reload Error: {e}")
+        """子进程成功后的回调：加入待切换列表，由 SwapBatch 合并重载"""
+        if "shared" not in task:
+            self._variants.record(task, resample_settings(task))
+        if "tile" in task:
+            # UDIM 图块：全部成功后切换到带标记的路径
+            if self._tiles.finish(task, True):
+                self._swaps.add(task["img_name"], task["udim_dst"])
+            return
+        self._swaps.add(task["img_name"], task["dst_path"])
 
     def process_native_image(self, task):
         """Native Fallback (保持原有逻辑)"""
@@ -361,36 +1337,38 @@ class LOD_OT_ResizeImagesAsync(bpy.types.Operator):
         if img.size[0] > target_size or img.size[1] > target_size:
             img.scale(target_size, target_size)
             
-        render = bpy.context.scene.render.image_settings
-        old_fmt = render.file_format
-        old_mode = render.color_mode
-        
-        try:
-            ext = os.path.splitext(new_full_path)[1].lower()
-            if ext in {'.jpg', '.jpeg'}:
-                render.file_format = 'JPEG'
-                render.color_mode = 'RGB'
-            elif ext == '.png':
-                render.file_format = 'PNG'
-                render.color_mode = 'RGBA'
-                
-            img.save_render(filepath=new_full_path)
-        finally:
-            render.file_format = old_fmt
-            render.color_mode = old_mode
-            
-        img.filepath = new_full_path
-        img.reload()
+        # 按扩展名选择输出格式 (EXR 使用面板中的精度与压缩)
+        save_native(img, new_full_path, bpy.context.scene.lod_props)
+        # Blender 原生缩放的结果不作为降采样源
+        self._variants.record(task, None)
+
+        # 与 worker 结果一样经 SwapBatch 切换 (遵循推迟切换设置)
+        self._swaps.add(img.name, new_full_path)
 
     def finish(self, context):
         context.window_manager.event_timer_remove(self._timer)
         context.window_manager.progress_end()
+        self._swaps.flush(context, force=True)
+        self._variants.flush()
         
         bpy.ops.lod.updateimagelist()
         gc.collect() 
         
-        self.report({'INFO'}, f"Resize Complete! {self._processed} images processed.")
+        written_mb = self._bytes_written / (1024 * 1024)
+        self.report({'INFO'}, f"Resize Complete! {self._processed} images processed ({written_mb:.1f} MB written).")
         return {'FINISHED'}
+
+    def cancel(self, context):
+        stop_driving(self)
+        if self._timer:
+            context.window_manager.event_timer_remove(self._timer)
+        context.window_manager.progress_end()
+        if self._pool:
+            self._pool.discard(self._owner)
+        # 已完成的图片仍然切换过去
+        self._swaps.flush(context, force=True)
+        if self._variants:
+            self._variants.flush()
     
 class LOD_OT_ClearDuplicateImage(bpy.types.Operator):
     bl_idname = "lod.clearduplicateimage"
@@ -422,14 +1400,16 @@ class LOD_OT_ClearDuplicateImage(bpy.types.Operator):
             self.report({'INFO'}, "No duplicate images found.")
             return {'FINISHED'}
 
-        for mat in bpy.data.materials:
-            if not mat.use_nodes or not mat.node_tree: continue
-            for node in mat.node_tree.nodes:
-                if node.type == 'TEX_IMAGE' and node.image:
+        # 只遍历引用了重复图片的节点树 (材质 / 世界 / 节点组)
+        index = image_index.get_index()
+        for key, tree in index.trees_using(remap_dict.keys()):
+            for node in tree.nodes:
+                if node.type in image_index.IMAGE_NODE_TYPES and node.image:
                     if node.image.name in remap_dict:
                         target_img = remap_dict[node.image.name]
                         node.image = target_img
                         cleaned_count += 1
+            index.mark_tree(key)
         
         # Purge logic
         for img in list(bpy.data.images):
@@ -524,21 +1504,17 @@ class LOD_OT_SwitchResolution(bpy.types.Operator):
 
         switched_count = 0
         fail_count = 0
+        stems = build_output_stems()
 
         for item in scn.image_list:
             img = bpy.data.images.get(item.lod_image_name)
             if not img: continue
             if img.source in {'VIEWER', 'GENERATED'}: continue
 
-            # 获取基础文件名用于匹配
-            if "lod_original_path" in img:
-                raw_filepath = img["lod_original_path"]
-            else:
-                raw_filepath = img.filepath_from_user()
-
-            file_name = os.path.basename(raw_filepath)
-            if not file_name: file_name = img.name
-            clean_name_base, _ = os.path.splitext(file_name)
+            # 获取输出文件名主干用于匹配 (与缩放时的命名规则一致)
+            clean_name_base, _ = stems.get(img.name, (img.name, ""))
+            # UDIM 图片的主干带图块标记，匹配任意一个图块文件
+            name_pattern = re.compile(rf"^({udim_name_regex(clean_name_base)})_\d+px\.")
 
             # --- 切换逻辑 ---
             if target == 'ORIGINAL':
@@ -546,8 +1522,8 @@ class LOD_OT_SwitchResolution(bpy.types.Operator):
                     orig_path = img["lod_original_path"]
                     abs_orig_path = bpy.path.abspath(orig_path)
                     
-                    # [优化] 检查原图是否存在
-                    if os.path.exists(abs_orig_path):
+                    # [优化] 检查原图是否存在 (UDIM 要求所有图块都在)
+                    if udim_path_exists(img, abs_orig_path):
                         img.filepath = orig_path
                         img.reload()
                         switched_count += 1
@@ -574,9 +1550,12 @@ class LOD_OT_SwitchResolution(bpy.types.Operator):
 
                 if os.path.exists(target_dir_abs):
                     for f in os.listdir(target_dir_abs):
-                        check_prefix = clean_name_base + "_"
-                        if f.startswith(check_prefix):
+                        match = name_pattern.match(f)
+                        if match:
                             found_file = f
+                            if img.source == 'TILED':
+                                # 图块编号换回标记，指向整套图块
+                                found_file = clean_name_base + f[match.end(1):]
                             break
                 if found_file:
                     rel_path = f"//{folder_name}/{found_file}"
@@ -604,85 +1583,128 @@ class LOD_OT_OptimizeByCamera(bpy.types.Operator):
     bl_label = "Optimize by Camera (Async)"
     bl_options = {'REGISTER', 'UNDO'}
     
-    _timer = None
-    _queue = []       # 待处理任务
-    _active_processes = [] # 子进程列表
+    _timer = None     # 完成时唤醒 modal 的一次性定时器
+    _window = None
+    _error = None     # tick 中未处理的异常 (由 modal 取消并报告)
+    _blocked = False  # 队列头部任务因进程池满 / 内存不足而等待
+    _swaps = None     # 待批量切换的图片 (SwapBatch)
+    _quality = 'EXACT'  # 缩放质量档位
+    _float_depth = 'HALF'   # EXR 输出精度
+    _exr_codec = 'ZIP'      # EXR 输出压缩
+    _queue = []       # 待处理任务 (堆: (排序键, 序号, img, req_px))
+    _seq = 0          # 入堆序号 (排序键相同时保持先后顺序)
+    _ready = None     # 已展开、待提交的 UDIM 图块任务 (deque)
+    _tiles = None     # UDIM 图块汇合 (TileSet)
+    _tile_needs = {}  # UDIM 图片各图块的需求尺寸 (分析时填充)
+    _pool = None      # 共享的常驻 worker 进程池
+    _owner = ""
+    _in_flight = 0
     
     _processed = 0    
     _total_tasks = 0  
     _output_dir = ""  
     _phase = 'INIT'   
-    _worker_script = ""
+    _stems = {}       # {img.name: (stem, ext)} 输出文件命名
+    _cache_cfg = None # 共享缓存配置
+    _analysis = None  # 分析生成器 (与缩放并行，分时推进)
 
-    # 配置
-    MAX_PROCESSES = 4     
+    # 配置 (进程数由进程池按 CPU / 可用内存自动确定)
     TIME_BUDGET = 0.02    
 
     def modal(self, context, event):
-        if event.type == 'TIMER':
-            if self._phase == 'ANALYZING':
-                self.do_analysis(context)
-                self._phase = 'PROCESSING'
-                self._active_processes = []
-                context.window_manager.progress_begin(0, self._total_tasks)
-                return {'RUNNING_MODAL'}
-
-            elif self._phase == 'PROCESSING':
-                
-                # A. 检查活动进程
-                for i in range(len(self._active_processes) - 1, -1, -1):
-                    proc, task_data = self._active_processes[i]
-                    ret_code = proc.poll()
-                    if ret_code is not None:
-                        stdout_data, stderr_data = proc.communicate()
-                        if ret_code == 0 and "SUCCESS" in stdout_data:
-                            self.handle_worker_success(task_data)
-                        else:
-                             print(f"CamOpt Worker Failed: {stderr_data or stdout_data}")
-                        self._processed += 1
-                        self._active_processes.pop(i)
-                
-                # B. 检查完成
-                if not self._queue and not self._active_processes:
-                    self._phase = 'FINISHED'
-                
-                # C. 分发新任务
-                start_time = time.time()
-                while self._queue:
-                    if (time.time() - start_time) > self.TIME_BUDGET:
-                        break
-                    
-                    # 预读
-                    img, req_px = self._queue[0]
-                    task_data = self.prepare_task_data(img, req_px)
-                    self._queue.pop(0) # 移除
+        # 分析与调度由 drain_timer 驱动，modal 只在全部完成或出错后被唤醒一次
+        if event.type == 'TIMER' and self._error:
+            self.cancel(context)
+            self.report({'ERROR'}, f"Camera Optimization aborted: {self._error}")
+            return {'CANCELLED'}
+        if event.type == 'TIMER' and self._phase == 'FINISHED':
+            self.finish(context)
+            return {'FINISHED'}
+        return {'PASS_THROUGH'}
 
-                    if not task_data:
-                        self._processed += 1 
-                        continue
-                        
-                    if task_data["method"] == "PIL":
-                        if len(self._active_processes) < self.MAX_PROCESSES:
-                            self.spawn_worker_process(task_data)
-                        else:
-                            # 塞回队列头等待下一次
-                            self._queue.insert(0, (img, req_px)) 
-                            break 
+    def _main_thread_work(self):
+        """是否有不依赖 worker 结果、可以立即推进的主线程任务"""
+        if self._phase == 'ANALYZING':
+            return True
+        # 队列未被进程池阻塞，或已没有在途任务 (需要检查完成)，或有一批图片该切换了
+        pending = bool(self._queue) or bool(self._ready)
+        return (pending and not self._blocked) or not self._in_flight or self._swaps.due()
+
+    def tick(self, context):
+        """推进一步 (分析时间片 / 收取结果 / 分发任务)，返回 True 表示主线程仍有任务"""
+        if self._phase == 'ANALYZING':
+            # 分析按时间片推进，已确定尺寸的图片立即进入队列并与缩放并行
+            self.step_analysis(context)
+
+        # A. 收取已完成的任务
+        for task_data, result in self._pool.collect(self._owner):
+            if result.get("status") == "SUCCESS":
+                if "shared" in task_data:
+                    apply_shared_result(task_data, result)
+                else:
+                    self.handle_worker_success(task_data)
+            else:
+                print(f"CamOpt Worker Failed: {result.get('error')}")
+                if "tile" in task_data:
+                    self._tiles.finish(task_data, False)
+            worker_pool.release_task_shared(task_data)
+            self._processed += 1
+            self._in_flight -= 1
+
+        # B. 检查完成 (分析结束后)
+        if self._phase == 'PROCESSING' and not self._queue and not self._ready and not self._in_flight:
+            self._phase = 'FINISHED'
+            wake_modal(self, context)
+            return False
+
+        # C. 分发新任务
+        self._blocked = False
+        start_time = time.time()
+        while self._ready or self._queue:
+            if (time.time() - start_time) > self.TIME_BUDGET:
+                break
+
+            entry = None
+            if self._ready:
+                # 先提交已展开的 UDIM 图块
+                task_data = self._ready.popleft()
+            else:
+                entry = heapq.heappop(self._queue)
+                _, _, img, req_px = entry
+                task_data = self.prepare_task_data(img, req_px)
+
+                if not task_data:
+                    self._processed += 1 
+                    continue
+                if isinstance(task_data, list):
+                    # UDIM: 每个图块一个任务，按图块计入进度
+                    self._ready.extend(task_data)
+                    self._total_tasks += len(task_data) - 1
+                    continue
+
+            if task_data["method"] == "PIL":
+                if not self.submit_worker_job(task_data):
+                    # 放回队列 (堆的排序键不变，下次仍最先取出)
+                    if entry is None:
+                        self._ready.appendleft(task_data)
                     else:
-                        # Native
-                        try:
-                            self.process_native_fallback(task_data)
-                        except Exception as e:
-                            print(f"Native Error: {e}")
-                        self._processed += 1
-
-                context.window_manager.progress_update(self._processed)
-            
-            elif self._phase == 'FINISHED':
-                self.finish(context)
-                return {'FINISHED'}
+                        heapq.heappush(self._queue, entry)
+                    self._blocked = True
+                    break 
+            else:
+                # Native
+                try:
+                    self.process_native_fallback(task_data)
+                except Exception as e:
+                    print(f"Native Error: {e}")
+                self._processed += 1
 
-        return {'PASS_THROUGH'}
+        # 合并重载已完成的图片
+        self._swaps.flush(context)
+
+        context.window_manager.progress_update(self._processed)
+        # 队列被进程池阻塞时只需等待 worker 结果
+        return self._phase == 'ANALYZING' or ((bool(self._queue) or bool(self._ready)) and not self._blocked)
 
     def invoke(self, context, event):
         scn = context.scene.lod_props
@@ -697,118 +1719,167 @@ class LOD_OT_OptimizeByCamera(bpy.types.Operator):
             self.report({'ERROR'}, "Save file first!")
             return {'CANCELLED'}
         
-        # 查找 worker 路径
-        current_dir = os.path.dirname(os.path.abspath(__file__))
-        root_dir = os.path.dirname(current_dir)
-        self._worker_script = os.path.join(root_dir, "worker.py")
+        # 获取共享 worker 进程池
+        self._pool = worker_pool.get_pool()
+        self._owner = self._pool.new_owner(self.bl_idname)
+        self._stems = build_output_stems()
+        self._cache_cfg = get_cache_config(scn)
+        self._swaps = SwapBatch(scn.defer_image_swaps)
+        self._quality = scn.resize_quality
+        self._float_depth = scn.float_depth
+        self._exr_codec = scn.exr_codec
 
         wm = context.window_manager
-        self._timer = wm.event_timer_add(0.01, window=context.window)
+        self._timer = None
+        self._window = context.window
         wm.modal_handler_add(self)
         
         self._phase = 'ANALYZING'
+        self._error = None
+        self._analysis = self.iter_analysis(context)
         self._queue = []
+        self._seq = 0
+        self._ready = deque()
+        self._tiles = TileSet()
+        self._tile_needs = {}
+        self._blocked = False
         self._processed = 0
+        self._total_tasks = 0
+        self._in_flight = 0
         self._output_dir = os.path.join(base_path, "textures_camera_optimized")
         if not os.path.exists(self._output_dir):
             os.makedirs(self._output_dir, exist_ok=True)
-            
+
+        start_driving(self)
         self.report({'INFO'}, "Starting Camera Optimization...")
         return {'RUNNING_MODAL'}
 
-    def spawn_worker_process(self, task):
-        cmd = [
-            sys.executable, 
-            self._worker_script,
-            "--src", task["src_path"],
-            "--dst", task["dst_path"],
-            "--size", str(task["target_size"]),
-            "--action", task["action"]
-        ]
+    def submit_worker_job(self, task):
+        """返回 False 表示池已满或内存不足，调用方需把任务放回队列"""
         try:
-            proc = subprocess.Popen(
-                cmd,
-                stdout=subprocess.PIPE, 
-                stderr=subprocess.PIPE,
-                text=True,
-                encoding='utf-8'
-            )
-            self._active_processes.append((proc, task))
+            if not self._pool.can_admit(task):
+                return False
+            if "shared" in task:
+                share_task_input(task)
+            if not self._pool.submit(self._owner, task):
+                worker_pool.release_task_shared(task)
+                return False
+            self._in_flight += 1
         except Exception as e:
-            print(f"Failed to spawn worker: {e}")
+            worker_pool.release_task_shared(task)
+            print(f"Failed to submit worker job: {e}")
+            if "tile" in task:
+                self._tiles.finish(task, False)
             self._processed += 1
+        return True
 
     def handle_worker_success(self, res):
-        """回调"""
-        img = bpy.data.images.get(res["img_name"])
-        if not img: return
-        try:
-            if hasattr(img, "filepath") and "dst_path" in res:
-                rel_path = bpy.path.relpath(res["dst_path"])
-                img.filepath = rel_path
-            img.reload()
-        except Exception as e:
-            print(f"Reload Error: {e}")
-
-    def do_analysis(self, context):
-        """分析场景 (逻辑保持不变)"""
+        """回调：加入待切换列表，由 SwapBatch 合并重载 (UDIM 图块全部成功后才切换)"""
+        if "tile" in res:
+            if self._tiles.finish(res, True):
+                self._swaps.add(res["img_name"], res["udim_dst"])
+            return
+        self._swaps.add(res["img_name"], res["dst_path"])
+
+    def iter_analysis(self, context):
+        """
+        分析生成器：产出 (img, req_px, weight) 或 None (时间片边界)。
+        显存预算需要全部图片的需求才能求解，启用时在分析结束后统一产出。
+        """
         scn = context.scene.lod_props
         cam = scn.lod_camera or context.scene.camera
+        user_max_cap = get_user_max_cap(scn)
+        requirements = iter_image_requirements(context.scene, scn, cam, user_max_cap, self._tile_needs)
+
+        if not scn.cam_budget_enabled:
+            for item in requirements:
+                yield (item[0], item[1], item[3]) if item else None
+            return
+
+        image_res_map, image_weight_map = {}, {}
+        for item in requirements:
+            if item:
+                img, target_res, _, weight = item
+                image_res_map[img] = target_res
+                image_weight_map[img] = weight
+            yield None
+
+        # 显存预算：在屏幕需求的基础上进一步压缩，直到总内存符合预算
+        if image_res_map:
+            self.apply_memory_budget(scn, image_res_map, image_weight_map)
+        for img, target_res in image_res_map.items():
+            yield img, target_res, image_weight_map[img]
+
+    def step_analysis(self, context):
+        """在时间片内推进分析，分析结束后切换到 PROCESSING"""
+        start_time = time.time()
+        for item in self._analysis:
+            if item:
+                self.enqueue(context.scene.lod_props, *item)
+                self._total_tasks += 1
+            if (time.time() - start_time) > self.TIME_BUDGET:
+                return
+        self._analysis = None
+        self._phase = 'PROCESSING'
+        context.window_manager.progress_begin(0, max(self._total_tasks, 1))
+        print(f"[LOD] Analysis complete. {self._total_tasks} textures to process.")
 
-        if scn.resize_size == 'c':
-            user_max_cap = scn.custom_resize_size
+    def enqueue(self, scn, img, req_px, weight):
+        """
+        入堆。默认最长任务优先 (源图像素数 × 格式成本)；
+        视觉优先模式下屏幕占比大的图片先处理，中途取消时最显眼的贴图已完成。
+        """
+        if scn.cam_visual_priority:
+            key = -weight
         else:
-            try: user_max_cap = int(scn.resize_size)
-            except: user_max_cap = 4096
-
-        ABSOLUTE_MIN_FLOOR = 32
-        image_res_map = {}
-        instance_sources = utils.get_instance_sources(context.scene)
-        mesh_objs = [o for o in context.scene.objects if o.type == 'MESH' and not o.hide_render]
-
-        for obj in mesh_objs:
-            if obj in instance_sources:
+            src_path = get_source_path(img)
+            tiles = 1
+            if is_udim(img) and len(img.tiles):
+                # UDIM 按第一个图块 × 图块数估算
+                src_path, tiles = udim_tile_path(src_path, img.tiles[0].number), len(img.tiles)
+            meta = None if img.packed_file or img.source == 'GENERATED' else image_meta.read_image_meta(src_path)
+            key = -estimate_task_cost({"action": "RESIZE", "src_path": src_path}, meta) * tiles
+        heapq.heappush(self._queue, (key, self._seq, img, req_px))
+        self._seq += 1
+
+    def apply_memory_budget(self, scn, image_res_map, image_weight_map):
+        """用 VRAM 预算求解器覆盖 image_res_map 中的目标尺寸"""
+        images = list(image_res_map.keys())
+        meta_map = collect_image_meta(images)
+        budget_bytes = int(scn.cam_budget_gb * 1024 * 1024 * 1024)
+
+        items = []
+        for img in images:
+            meta = meta_map.get(img.name)
+            if not meta or meta["width"] <= 0:
                 continue
-            
-            px_size, visible = utils.calculate_screen_coverage(context.scene, obj, cam)
-            
-            if not visible:
-                target_res = 32
-            else:
-                calculated_res = px_size * 1.2
-                target_res = max(calculated_res, ABSOLUTE_MIN_FLOOR)
-                target_res = min(target_res, user_max_cap)
-
-            for slot in obj.material_slots:
-                if slot.material and slot.material.use_nodes:
-                    for node in slot.material.node_tree.nodes:
-                        if node.type == 'TEX_IMAGE' and node.image:
-                            img = node.image
-                            if img.source in {'VIEWER', 'GENERATED'}: continue
-                            current_max = image_res_map.get(img, 0)
-                            if target_res > current_max:
-                                image_res_map[img] = target_res
-        
-        for img, req_px in image_res_map.items():
-            self._queue.append((img, req_px))
-            
-        self._total_tasks = len(self._queue)
-        print(f"[LOD] Analysis complete. {self._total_tasks} textures to process.")
+            required = image_res_map[img]
+            items.append({
+                "key": img.name,
+                "width": meta["width"],
+                "height": meta["height"],
+                "channels": meta["channels"],
+                "is_float": meta["is_float"],
+                "bit_depth": meta["bit_depth"],
+                "tiles": meta.get("tiles", 1),
+                "required": required,
+                "weight": image_weight_map.get(img, 0.0),
+                # 起点就是相机分析得到的分级尺寸，预算只会让它更小
+                "max_size": 1 << max(int(math.ceil(math.log2(max(required, 4)))), 2),
+            })
+
+        sizes, total = utils.solve_texture_budget(items, budget_bytes, mipmaps=scn.mem_include_mipmaps)
+        for img in images:
+            if img.name in sizes:
+                image_res_map[img] = min(image_res_map[img], sizes[img.name])
+
+        total_mb = total / (1024 * 1024)
+        fits = "fits" if total <= budget_bytes else "exceeds"
+        print(f"[LOD] Memory budget: {total_mb:.1f} MB {fits} {scn.cam_budget_gb:.2f} GB budget.")
 
     def prepare_task_data(self, img, req_px):
-        """准备任务数据"""
-        final_size = 4
-        if req_px <= 4: final_size = 4
-        elif req_px <= 8: final_size = 8 
-        elif req_px <= 16: final_size = 16
-        elif req_px <= 32: final_size = 32
-        elif req_px <= 64: final_size = 64
-        elif req_px <= 128: final_size = 128
-        elif req_px <= 256: final_size = 256
-        elif req_px <= 512: final_size = 512
-        elif req_px <= 1024: final_size = 1024
-        elif req_px <= 2048: final_size = 2048
-        else: final_size = 4096
+        """准备任务数据 (UDIM 图片返回各图块任务的列表)"""
+        final_size = snap_texture_size(req_px)
         
         orig_w = img.size[0]
         orig_h = img.size[1]
@@ -819,19 +1890,17 @@ class LOD_OT_OptimizeByCamera(bpy.types.Operator):
         if "lod_original_path" not in img:
             img["lod_original_path"] = img.filepath
 
-        original_filepath = img.filepath_from_user()
-        file_name = os.path.basename(original_filepath)
-        if not file_name: file_name = f"{img.name}.png"
-        name_part, ext_part = os.path.splitext(file_name)
-        if not ext_part: ext_part = ".png"
+        if img.name not in self._stems:
+            self._stems = build_output_stems()
+        name_part, ext_part = self._stems[img.name]
 
         new_file_name = f"{name_part}_{final_size}px{ext_part}"
         new_full_path = os.path.join(self._output_dir, new_file_name)
 
-        # 缓存检查
-        if os.path.exists(new_full_path):
-            img.filepath = new_full_path
-            img.reload()
+        # 缓存检查 (共享内存任务的结果直接写回图片，不落盘)
+        shared_kind = get_shared_kind(img)
+        if not shared_kind and udim_path_exists(img, new_full_path):
+            self._swaps.add(img.name, new_full_path)
             return None 
 
         method = "NATIVE"
@@ -841,23 +1910,78 @@ class LOD_OT_OptimizeByCamera(bpy.types.Operator):
         if img.filepath:
             ext = os.path.splitext(img.filepath)[1].lower()
 
-        if ext in {'.exr', '.hdr'}:
+        if ext in FLOAT_EXTS:
+            # HDR/EXR: worker 线性空间缩放；无法读取时交给 Blender 原生写出
+            if can_resize_float(img, ext):
+                method = "PIL"
+                action = "FLOAT"
+        elif shared_kind:
+            # 打包的图片经共享内存交给 worker
             method = "PIL"
-            action = "COPY"
+            action = "SHARED"
         elif check_pil_available():
             if not img.packed_file and img.filepath:
                  abs_path = bpy.path.abspath(img.filepath)
-                 if os.path.exists(abs_path):
+                 if udim_path_exists(img, abs_path):
                      method = "PIL"
+
+        # UDIM 图块只能交给 worker 逐块处理
+        if img.source == 'TILED' and (method != "PIL" or not is_udim(img)):
+            print(f"[LOD] Skip UDIM image (tiles missing or PIL unavailable): {img.name}")
+            return None
+
+        original_src = get_source_path(img)
+        src_path = original_src
+        if method == "PIL" and action == "RESIZE" and img.source != 'TILED':
+            # 复用 textures_{N}px 中已生成的更大变体作为降采样源
+            base_path = os.path.dirname(self._output_dir)
+            variant = find_cached_variant(
+                base_path, name_part, ext_part, final_size, src_path,
+                resample_settings({"quality": self._quality}),
+            )
+            if variant:
+                src_path = variant
         
         task_data = {
             "img_name": img.name,
             "target_size": final_size,
-            "src_path": bpy.path.abspath(img.filepath), 
+            "src_path": src_path, 
             "dst_path": new_full_path,
             "method": method,
             "action": action 
         }
+        if action == "SHARED":
+            task_data["src_path"] = ""
+            task_data["shared"] = shared_kind
+        if action == "FLOAT":
+            task_data["float_depth"] = self._float_depth
+            task_data["exr_codec"] = self._exr_codec
+
+        if img.source == 'TILED':
+            # 每个图块按自身 UV 区域的屏幕需求确定尺寸，不超过整张图的尺寸
+            tile_needs = self._tile_needs.get(img.name)
+            tile_sizes = None
+            if tile_needs:
+                tile_sizes = {
+                    tile.number: min(snap_texture_size(tile_needs.get(tile.number, CAM_MIN_FLOOR)), final_size)
+                    for tile in img.tiles
+                }
+            tiles = expand_udim_task(task_data, img, tile_sizes)
+            self._tiles.expect(img.name, len(tiles))
+            return [self.finish_task_data(t, original_src) for t in tiles]
+        return self.finish_task_data(task_data, original_src)
+
+    def finish_task_data(self, task_data, original_src):
+        """估算成本 / 内存并查询共享缓存 (命中时任务改为从缓存 COPY)"""
+        if task_data["method"] == "PIL":
+            task_data["quality"] = self._quality
+            annotate_task(task_data, bpy.data.images.get(task_data["img_name"]))
+
+        # 共享缓存：命中则直接切换，不再调度任务
+        if self._cache_cfg and task_data["method"] == "PIL" and task_data["action"] in {"RESIZE", "FLOAT"}:
+            key_src = udim_tile_path(original_src, task_data["tile"]) if "tile" in task_data else original_src
+            attach_cache(task_data, self._cache_cfg, key_src)
+            fetch_from_cache(task_data)
         return task_data
 
     def process_native_fallback(self, task):
@@ -871,29 +1995,16 @@ class LOD_OT_OptimizeByCamera(bpy.types.Operator):
         if img.size[0] > target_size or img.size[1] > target_size:
             img.scale(target_size, target_size)
             
-        render = bpy.context.scene.render.image_settings
-        old_fmt = render.file_format
-        old_mode = render.color_mode
-        
-        try:
-            ext = os.path.splitext(new_full_path)[1].lower()
-            if ext in {'.jpg', '.jpeg'}:
-                render.file_format = 'JPEG'
-                render.color_mode = 'RGB'
-            elif ext == '.png':
-                render.file_format = 'PNG'
-                render.color_mode = 'RGBA' 
-            img.save_render(filepath=new_full_path)
-        finally:
-            render.file_format = old_fmt
-            render.color_mode = old_mode
-            
-        img.filepath = new_full_path
-        img.reload()
+        # 按扩展名选择输出格式 (EXR 使用面板中的精度与压缩)
+        save_native(img, new_full_path, bpy.context.scene.lod_props)
+
+        # 与 worker 结果一样经 SwapBatch 切换 (遵循推迟切换设置)
+        self._swaps.add(img.name, new_full_path)
 
     def finish(self, context):
         context.window_manager.event_timer_remove(self._timer)
         context.window_manager.progress_end()
+        self._swaps.flush(context, force=True)
         bpy.ops.lod.updateimagelist()
 
         try:
@@ -906,8 +2017,58 @@ class LOD_OT_OptimizeByCamera(bpy.types.Operator):
         self.report({'INFO'}, f"Camera Optimization Complete! Processed {self._processed} textures.")
 
     def cancel(self, context):
-        context.window_manager.event_timer_remove(self._timer)
+        stop_driving(self)
+        if self._timer:
+            context.window_manager.event_timer_remove(self._timer)
         context.window_manager.progress_end()
+        if self._analysis is not None:
+            # 关闭生成器 (动画采样中会恢复当前帧)
+            self._analysis.close()
+            self._analysis = None
+        if self._pool:
+            self._pool.discard(self._owner)
+        # 已完成的图片仍然切换过去 (视觉优先模式下即最显眼的部分)
+        self._swaps.flush(context, force=True)
+
+class LOD_OT_FindOverResolved(bpy.types.Operator):
+    """Flag textures whose resolution exceeds anything the camera can sample on screen"""
+    bl_idname = "lod.find_over_resolved"
+    bl_label = "Find Over-Resolved Textures"
+    bl_options = {'REGISTER'}
+
+    # 超过需求一个 mip 级 (2 倍) 以上才算过剩
+    OVER_FACTOR = 2.0
+
+    def execute(self, context):
+        scn = context.scene.lod_props
+        cam = scn.lod_camera or context.scene.camera
+        if not cam and not scn.cam_sample_animation:
+            self.report({'ERROR'}, "No active camera found!")
+            return {'CANCELLED'}
+
+        _, _, need_map = compute_image_requirements(context.scene, scn, cam, get_user_max_cap(scn))
+        meta_map = collect_image_meta(list(need_map.keys()))
+
+        over = {}
+        for img, need in need_map.items():
+            meta = meta_map.get(img.name)
+            if not meta or meta["width"] <= 0:
+                continue
+            size = max(meta["width"], meta["height"])
+            required = max(need, CAM_MIN_FLOOR)
+            if size > required * self.OVER_FACTOR:
+                over[img.name] = (size, int(math.ceil(required)))
+
+        # 列表中标记 (需先刷新列表)
+        for item in scn.image_list:
+            info = over.get(item.lod_image_name)
+            item.over_resolved = info is not None
+            item.required_size = info[1] if info else 0
+
+        for name, (size, required) in sorted(over.items(), key=lambda kv: kv[1][1] / kv[1][0]):
+            print(f"[LOD] Over-resolved: {name} {size}px, camera needs ~{required}px")
+        self.report({'INFO'}, f"{len(over)} of {len(need_map)} textures are over-resolved.")
+        return {'FINISHED'}
 
 classes = (
     LOD_OT_UpdateImageList,
@@ -917,6 +2078,7 @@ classes = (
     LOD_OT_DeleteTextureFolder,
     LOD_OT_SwitchResolution,
     LOD_OT_OptimizeByCamera,
+    LOD_OT_FindOverResolved,
 )
 
 def register():
@@ -924,5 +2086,10 @@ def register():
         bpy.utils.register_class(cls)
 
 def unregister():
+    _active_ops.clear()
+    if bpy.app.timers.is_registered(drain_timer):
+        bpy.app.timers.unregister(drain_timer)
+    # 关闭常驻 worker 进程
+    worker_pool.shutdown_pool()
     for cls in reversed(classes):
         bpy.utils.unregister_class(cls)
\ No newline at end of file
@@ -0,0 +1,236 @@
+import bpy
+import time
+import numpy as np
+from collections import OrderedDict
+from bpy.app.handlers import persistent
+from .. import scene_snapshot
+from .. import utils
+from . import viewport
+from . import shader_lod
+from . import geometry
+from . import schedule
+
+
+class LiveLODDriver:
+    """
+    实时 LOD 驱动 (播放 / 相机导航时自动更新)。
+    - evaluate(): 相机或场景变化后，计算 Level/Factor 发生变化的物体并放入待写队列
+      (与手动按钮共享各自的跟踪器，带滞回带；实时模式额外施加最短停留时间)
+    - drain():    在时间预算内写回，剩余任务留给下一次更新或定时器继续处理
+    待写队列按 (类型, 物体名) 去重，新结果覆盖尚未写回的旧结果。
+    被冷却拦下的切换记为 waiting，由定时器稍后重新计算。
+    """
+
+    def __init__(self):
+        self.pending = OrderedDict()    # (kind, obj_name) -> level / factor
+        self.reset()
+
+    def reset(self):
+        self.pending.clear()
+        self.cam_key = None
+        self.snap_version = -1
+        self.geo_key = None
+        self.geo_version = -1
+        self.geo_mask = None
+        self.waiting = False
+        self.written = 0
+
+    # ------------------------------------------------------------------
+    # 计算
+    # ------------------------------------------------------------------
+    def evaluate(self, scene):
+        scn = scene.lod_props
+        cam = scn.lod_camera or scene.camera
+        if not cam:
+            return
+
+        snap = scene_snapshot.get_snapshot(scene)
+        cam_key = tuple(tuple(row) for row in cam.matrix_world)
+        if cam_key == self.cam_key and snap.version == self.snap_version and not self.waiting:
+            return  # 相机与场景都没有变化，也没有等待冷却的物体
+        self.cam_key = cam_key
+        self.snap_version = snap.version
+
+        cam_loc = np.array(cam.matrix_world.translation)
+        thresholds = (scn.lod_dist_0, scn.lod_dist_1, scn.lod_dist_2)
+        margins = utils.get_distance_margins(scn)
+        cooldown = scn.lod_cooldown
+        trackers = []
+
+        if scn.view_lod_enabled:
+            rows, levels = viewport._tracker.update(
+                snap, snap.select(), cam_loc, thresholds, viewport.viewport_settings(scn, cam),
+                margins=margins, cooldown=cooldown,
+            )
+            self._enqueue('VIEW', snap, rows, levels.tolist())
+            trackers.append(viewport._tracker)
+
+        if scn.exp_shader_lod_enabled:
+            eligible = snap.select(types=('MESH',), visible=True, with_materials=True)
+            rows, levels = shader_lod._tracker.update(
+                snap, eligible, cam_loc, thresholds, shader_lod.shader_settings(scn, cam),
+                margins=margins, cooldown=cooldown,
+            )
+            self._enqueue('SHADER', snap, rows, levels.tolist())
+            trackers.append(shader_lod._tracker)
+
+        if scn.geo_lod_enabled:
+            self._evaluate_geometry(scene, scn, snap, cam, cooldown)
+            trackers.append(geometry._tracker)
+
+        self.waiting = any(len(t.deferred) for t in trackers)
+
+    def _evaluate_geometry(self, scene, scn, snap, cam, cooldown):
+        rows, entering = self._geo_rows(snap, scn.geo_lod_method)
+        if not len(rows):
+            return
+        factors, changed = geometry.update_geo_lod(
+            scene, snap, rows, cam, scn, cooldown=cooldown, reset_rows=entering
+        )
+        self._enqueue('GEO', snap, rows[changed], factors[changed].tolist())
+
+    def _geo_rows(self, snap, method):
+        """
+        几何 LOD 的参与行 (按快照版本增量维护，避免每次遍历所有修改器)。
+        返回 (rows, entering)：entering 为新加入的行 (例如重新 Setup 后)，必须重新写入
+        """
+        key = (snap.build_version, method)
+        entering = np.zeros(0, dtype=np.int64)
+        if self.geo_key != key:
+            self.geo_mask = np.zeros(len(snap.objects), dtype=bool)
+            self.geo_mask[geometry.get_geo_rows(snap, method)] = True
+            self.geo_key = key
+        elif self.geo_version < snap.version:
+            changed = snap.changed_rows(self.geo_version)
+            was_eligible = self.geo_mask[changed]
+            self.geo_mask[changed] = False
+            self.geo_mask[geometry.get_geo_rows(snap, method, changed)] = True
+            entering = changed[~was_eligible & self.geo_mask[changed]]
+        self.geo_version = snap.version
+        return np.flatnonzero(self.geo_mask), entering
+
+    def _enqueue(self, kind, snap, rows, values):
+        for row, value in zip(rows.tolist(), values):
+            self.pending[(kind, snap.objects[row].name)] = value
+
+    # ------------------------------------------------------------------
+    # 写回
+    # ------------------------------------------------------------------
+    def drain(self, scene, budget):
+        """在 budget 秒内写回待处理的物体，返回剩余数量"""
+        if not self.pending:
+            return 0
+        scn = scene.lod_props
+        deadline = time.perf_counter() + budget
+        n_mults, d_mults = shader_lod.shader_multipliers(scn)
+        method = scn.geo_lod_method
+        gn_id_factor, gn_id_dist = geometry.get_gn_identifiers() if method == 'GNODES' else (None, None)
+
+        while self.pending:
+            (kind, name), value = self.pending.popitem(last=False)
+            obj = scene.objects.get(name)
+            if obj is not None:
+                try:
+                    if kind == 'VIEW':
+                        viewport.apply_viewport_level(obj, value, scn)
+                    elif kind == 'SHADER':
+                        shader_lod.apply_shader_multipliers(obj, n_mults[value], d_mults[value])
+                    else:
+                        geometry.apply_geo_factor(
+                            obj, method, value, gn_id_factor, gn_id_dist, scn.geo_lod_max_dist
+                        )
+                    self.written += 1
+                except Exception as e:
+                    print(f"Live LOD Error on {name}: {e}")
+            if time.perf_counter() > deadline:
+                break
+        return len(self.pending)
+
+
+_driver = LiveLODDriver()
+
+# 冷却等待期间重新计算的间隔 (秒)
+WAIT_INTERVAL = 0.1
+
+def is_live(scene):
+    props = getattr(scene, "lod_props", None)
+    if not props or not props.live_lod_enabled:
+        return False
+    # 已启用烘焙排程 (或正在遍历帧) 时由排程接管
+    if props.lod_schedule_enabled or schedule._suspended:
+        return False
+    # 渲染期间不干预 (渲染使用独立的场景状态)
+    try:
+        if bpy.app.is_job_running('RENDER'):
+            return False
+    except (AttributeError, TypeError):
+        pass
+    return True
+
+def get_budget(scene):
+    return scene.lod_props.live_lod_budget_ms / 1000.0
+
+def ensure_drain_timer():
+    if (_driver.pending or _driver.waiting) and not bpy.app.timers.is_registered(drain_timer):
+        bpy.app.timers.register(drain_timer, first_interval=0.0)
+
+def drain_timer():
+    """把剩余任务分摊到后续的 UI 空闲时间；有物体在等待冷却时定期重新计算"""
+    scene = bpy.context.scene
+    if scene is None or not is_live(scene):
+        _driver.pending.clear()
+        _driver.waiting = False
+        return None
+    if _driver.drain(scene, get_budget(scene)):
+        return 0.01
+    if _driver.waiting:
+        _driver.evaluate(scene)
+        return 0.01 if _driver.pending else WAIT_INTERVAL
+    return None
+
+
+# =============================================================================
+# Handlers
+# =============================================================================
+@persistent
+def on_frame_change(scene, depsgraph=None):
+    if not is_live(scene):
+        return
+    # 播放时在帧切换后立即写回 (预算内)，保证当前帧 LOD 正确
+    # 帧切换不触发 depsgraph_update_post，先让快照重读会动的物体
+    scene_snapshot.mark_frame_change(scene)
+    _driver.evaluate(scene)
+    _driver.drain(scene, get_budget(scene))
+    ensure_drain_timer()
+
+@persistent
+def on_depsgraph_update(scene, depsgraph):
+    if not is_live(scene):
+        return
+    # depsgraph 回调中不直接修改数据，交给定时器在预算内写回
+    _driver.evaluate(scene)
+    ensure_drain_timer()
+
+@persistent
+def on_load(*args):
+    _driver.reset()
+
+
+HANDLERS = (
+    (bpy.app.handlers.frame_change_post, on_frame_change),
+    (bpy.app.handlers.depsgraph_update_post, on_depsgraph_update),
+    (bpy.app.handlers.load_post, on_load),
+)
+
+def register():
+    for handler_list, func in HANDLERS:
+        if func not in handler_list:
+            handler_list.append(func)
+
+def unregister():
+    for handler_list, func in HANDLERS:
+        if func in handler_list:
+            handler_list.remove(func)
+    if bpy.app.timers.is_registered(drain_timer):
+        bpy.app.timers.unregister(drain_timer)
+    _driver.reset()
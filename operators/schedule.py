@@ -0,0 +1,377 @@
+import bpy
+import time
+import zlib
+import base64
+from contextlib import contextmanager
+import numpy as np
+from bpy.app.handlers import persistent
+from .. import scene_snapshot
+from .. import utils
+from . import viewport
+from . import shader_lod
+from . import geometry
+
+# 排程数据存放在场景自定义属性中 (随 .blend 保存，渲染农场可直接使用)
+SCHEDULE_KEY = "_lod_schedule"
+SCHEDULE_FORMAT = 1
+
+# 每物体每帧一个 uint8：几何阶梯 (bit 0-2) | 视图 Level (bit 3-4) | Shader Level (bit 5-6)
+GEO_SHIFT, VIEW_SHIFT, SHADER_SHIFT = 0, 3, 5
+GEO_MASK, VIEW_MASK, SHADER_MASK = 0b111, 0b11, 0b11
+
+# 每物体一个 uint8：参与的 LOD 类型
+KIND_VIEW, KIND_SHADER, KIND_GEO = 1, 2, 4
+
+# 烘焙 / 采样期间 frame_set() 会触发帧回调，此时不应用排程 (实时 LOD 同样跳过)
+_suspended = False
+
+
+def _encode(arr):
+    return base64.b64encode(zlib.compress(np.ascontiguousarray(arr, dtype=np.uint8).tobytes())).decode('ascii')
+
+def _decode(text):
+    return np.frombuffer(zlib.decompress(base64.b64decode(text)), dtype=np.uint8)
+
+@contextmanager
+def suspended(scene):
+    """遍历帧期间暂停排程 / 实时 LOD 的帧回调，结束后恢复当前帧"""
+    global _suspended
+    orig_frame = scene.frame_current
+    _suspended = True
+    try:
+        yield
+    finally:
+        scene.frame_set(orig_frame)
+        _suspended = False
+
+
+class LODSchedule:
+    """
+    解码后的逐帧 LOD 排程。
+    codes[i, j] 为第 i 个采样帧第 j 个物体的打包 Level。
+    帧回调中只处理与上一次应用的帧相比发生变化的物体：
+    连续播放时直接查预先计算的差异表，跳帧时做一次向量化比较。
+    """
+
+    def __init__(self, names, kinds, codes, frame_start, frame_step):
+        self.names = names
+        self.kinds = kinds
+        self.codes = codes
+        self.frame_start = frame_start
+        self.frame_step = frame_step
+        self.diffs = [np.zeros(0, dtype=np.int64)] + [
+            np.flatnonzero(row) for row in codes[1:] != codes[:-1]
+        ]
+        self.applied = None
+
+    @classmethod
+    def from_scene(cls, scene):
+        data = scene.get(SCHEDULE_KEY)
+        if not data or data.get("format") != SCHEDULE_FORMAT:
+            return None
+        names = data["names"].split("\n")
+        codes = _decode(data["codes"]).reshape(-1, len(names))
+        return cls(names, _decode(data["kinds"]), codes, data["frame_start"], data["frame_step"])
+
+    def frame_index(self, frame):
+        i = int(round((frame - self.frame_start) / self.frame_step))
+        return min(max(i, 0), len(self.codes) - 1)
+
+    def changed_columns(self, i):
+        if self.applied is None:
+            return np.arange(len(self.names))
+        if i == self.applied:
+            return self.diffs[0]
+        if i == self.applied + 1:
+            return self.diffs[i]
+        return np.flatnonzero(self.codes[i] != self.codes[self.applied])
+
+    def apply(self, scene, frame):
+        """应用指定帧的 Level，返回写入的物体数"""
+        i = self.frame_index(frame)
+        cols = self.changed_columns(i)
+        self.applied = i
+        if not len(cols):
+            return 0
+
+        scn = scene.lod_props
+        n_mults, d_mults = shader_lod.shader_multipliers(scn)
+        method = scn.geo_lod_method
+        gn_id_factor, gn_id_dist = geometry.get_gn_identifiers() if method == 'GNODES' else (None, None)
+        step_factors = utils.get_step_factors(np.arange(len(utils.LOD_STEP_FACTORS)), scn.geo_lod_min_ratio)
+
+        count = 0
+        for j in cols.tolist():
+            obj = scene.objects.get(self.names[j])
+            if obj is None:
+                continue
+            code = int(self.codes[i, j])
+            kinds = int(self.kinds[j])
+            try:
+                if kinds & KIND_VIEW:
+                    viewport.apply_viewport_level(obj, (code >> VIEW_SHIFT) & VIEW_MASK, scn)
+                if kinds & KIND_SHADER:
+                    level = (code >> SHADER_SHIFT) & SHADER_MASK
+                    shader_lod.apply_shader_multipliers(obj, n_mults[level], d_mults[level])
+                if kinds & KIND_GEO:
+                    geometry.apply_geo_factor(
+                        obj, method, float(step_factors[(code >> GEO_SHIFT) & GEO_MASK]),
+                        gn_id_factor, gn_id_dist, scn.geo_lod_max_dist,
+                    )
+                count += 1
+            except Exception as e:
+                print(f"LOD Schedule Error on {obj.name}: {e}")
+
+        # 排程直接修改物体，手动/实时更新的 Level 记录已失效
+        viewport._tracker.reset()
+        shader_lod._tracker.reset()
+        geometry._tracker.reset()
+        return count
+
+
+_cache = {"key": None, "schedule": None}
+
+def get_schedule(scene):
+    """当前场景的排程 (解码结果按 bake_id 缓存)"""
+    data = scene.get(SCHEDULE_KEY)
+    key = (scene.name, data.get("bake_id")) if data else None
+    if _cache["key"] != key:
+        _cache["schedule"] = LODSchedule.from_scene(scene) if key else None
+        _cache["key"] = key
+    return _cache["schedule"]
+
+def clear_cache():
+    _cache["key"] = None
+    _cache["schedule"] = None
+
+
+class LOD_OT_BakeLODSchedule(bpy.types.Operator):
+    """Walk the frame range and store per-frame Geometry / Viewport / Shader LOD levels for rendering"""
+    bl_idname = "lod.bake_lod_schedule"
+    bl_label = "Bake LOD Schedule"
+    bl_options = {'REGISTER', 'UNDO'}
+
+    _timer = None
+    TIME_BUDGET = 0.05
+
+    # ------------------------------------------------------------------
+    # 准备
+    # ------------------------------------------------------------------
+    def setup(self, context):
+        scene = context.scene
+        scn = scene.lod_props
+        if not (scn.view_lod_enabled or scn.exp_shader_lod_enabled or scn.geo_lod_enabled):
+            self.report({'WARNING'}, "Enable at least one LOD type first.")
+            return False
+
+        snap = scene_snapshot.get_snapshot(scene)
+        kinds = np.zeros(len(snap.objects), dtype=np.uint8)
+        if scn.view_lod_enabled:
+            kinds[snap.select()] |= KIND_VIEW
+        if scn.exp_shader_lod_enabled:
+            kinds[snap.select(types=('MESH',), visible=True, with_materials=True)] |= KIND_SHADER
+        if scn.geo_lod_enabled:
+            kinds[geometry.get_geo_rows(snap, scn.geo_lod_method)] |= KIND_GEO
+
+        rows = np.flatnonzero(kinds)
+        if not len(rows):
+            self.report({'WARNING'}, "No suitable objects found.")
+            return False
+
+        self.objects = [snap.objects[i] for i in rows.tolist()]
+        self.kinds = kinds[rows]
+        self.bboxes = snap.bboxes[rows].copy()
+        self.local_centers = self.bboxes.mean(axis=1)
+        self.face_counts = snap.face_counts[rows]
+        self.geo_cols = np.flatnonzero(self.kinds & KIND_GEO)
+
+        # 静止物体的矩阵只读一次，之后每帧只重读会动的物体
+        self.matrices = snap.matrices[rows].copy()
+        self.dynamic = [j for j, obj in enumerate(self.objects) if not utils.is_static_transform(obj)]
+
+        self.thresholds = (scn.lod_dist_0, scn.lod_dist_1, scn.lod_dist_2)
+        self.margins = utils.get_distance_margins(scn)
+        self.geo_hysteresis = scn.geo_lod_hysteresis
+        self.min_faces = scn.geo_lod_min_faces
+
+        self.frames = list(range(scene.frame_start, scene.frame_end + 1, max(scene.frame_step, 1)))
+        self.codes = np.zeros((len(self.frames), len(rows)), dtype=np.uint8)
+        self.prev_view = np.full(len(rows), -1, dtype=np.int64)
+        self.prev_shader = np.full(len(rows), -1, dtype=np.int64)
+        self.prev_geo = np.full(len(self.geo_cols), -1, dtype=np.int64)
+        self.index = 0
+        self.orig_frame = scene.frame_current
+        return True
+
+    # ------------------------------------------------------------------
+    # 逐帧计算 (向量化)
+    # ------------------------------------------------------------------
+    def bake_frame(self, context):
+        scene = context.scene
+        scn = scene.lod_props
+        scene.frame_set(self.frames[self.index])
+
+        for j in self.dynamic:
+            self.matrices[j] = self.objects[j].matrix_world
+
+        # 相机可能由时间线标记切换 (使用 scene.camera，而不是固定的 LOD Camera)
+        cam = utils.get_shot_camera(scene, scn)
+        code = np.zeros(len(self.objects), dtype=np.uint8)
+        if cam:
+            cam_loc = np.array(cam.matrix_world.translation)
+            m = self.matrices
+            # 距离 Level 沿时间轴带滞回带，避免在阈值附近逐帧抖动
+            centers = np.einsum('nij,nj->ni', m[:, :3, :3], self.local_centers) + m[:, :3, 3]
+            self.prev_view = utils.get_distance_levels(
+                np.linalg.norm(centers - cam_loc, axis=1), self.thresholds, self.margins, self.prev_view)
+            self.prev_shader = utils.get_distance_levels(
+                np.linalg.norm(m[:, :3, 3] - cam_loc, axis=1), self.thresholds, self.margins, self.prev_shader)
+            code |= (self.prev_view.astype(np.uint8) << VIEW_SHIFT)
+            code |= (self.prev_shader.astype(np.uint8) << SHADER_SHIFT)
+
+            if len(self.geo_cols):
+                _, _, ratios = utils.batch_screen_coverage(
+                    scene, None, cam, matrices=m[self.geo_cols], bboxes=self.bboxes[self.geo_cols])
+                steps = utils.get_lod_steps(ratios, self.prev_geo, self.geo_hysteresis)
+                steps[self.face_counts[self.geo_cols] < self.min_faces] = 0
+                self.prev_geo = steps
+                code[self.geo_cols] |= steps.astype(np.uint8) << GEO_SHIFT
+
+        self.codes[self.index] = code
+        self.index += 1
+
+    def store(self, context):
+        scene = context.scene
+        scene[SCHEDULE_KEY] = {
+            "format": SCHEDULE_FORMAT,
+            "bake_id": int(time.time() * 1000) & 0x7FFFFFFF,
+            "frame_start": self.frames[0],
+            "frame_step": max(scene.frame_step, 1),
+            "names": "\n".join(obj.name for obj in self.objects),
+            "kinds": _encode(self.kinds),
+            "codes": _encode(self.codes),
+        }
+        clear_cache()
+
+    def restore_frame(self, context):
+        global _suspended
+        context.scene.frame_set(self.orig_frame)
+        _suspended = False
+
+    # ------------------------------------------------------------------
+    # 执行方式：后台 (blender -b) 同步执行；界面中以 modal 分片执行
+    # ------------------------------------------------------------------
+    def execute(self, context):
+        global _suspended
+        if not self.setup(context):
+            return {'CANCELLED'}
+        _suspended = True
+        try:
+            while self.index < len(self.frames):
+                self.bake_frame(context)
+        finally:
+            self.restore_frame(context)
+        self.store(context)
+        self.report({'INFO'}, f"LOD Schedule: {len(self.frames)} frames x {len(self.objects)} objects.")
+        return {'FINISHED'}
+
+    def invoke(self, context, event):
+        global _suspended
+        if not self.setup(context):
+            return {'CANCELLED'}
+        _suspended = True
+        context.window_manager.progress_begin(0, len(self.frames))
+        self._timer = context.window_manager.event_timer_add(0.01, window=context.window)
+        context.window_manager.modal_handler_add(self)
+        return {'RUNNING_MODAL'}
+
+    def modal(self, context, event):
+        if event.type == 'ESC':
+            self.finish(context)
+            self.report({'WARNING'}, "LOD Schedule bake cancelled.")
+            return {'CANCELLED'}
+
+        if event.type == 'TIMER':
+            start_time = time.time()
+            while self.index < len(self.frames):
+                self.bake_frame(context)
+                if (time.time() - start_time) > self.TIME_BUDGET:
+                    break
+            context.window_manager.progress_update(self.index)
+
+            if self.index >= len(self.frames):
+                self.finish(context)
+                self.store(context)
+                self.report({'INFO'}, f"LOD Schedule: {len(self.frames)} frames x {len(self.objects)} objects.")
+                return {'FINISHED'}
+
+        return {'PASS_THROUGH'}
+
+    def finish(self, context):
+        context.window_manager.event_timer_remove(self._timer)
+        context.window_manager.progress_end()
+        self.restore_frame(context)
+
+
+class LOD_OT_ClearLODSchedule(bpy.types.Operator):
+    """Remove the baked LOD schedule"""
+    bl_idname = "lod.clear_lod_schedule"
+    bl_label = "Clear LOD Schedule"
+    bl_options = {'REGISTER', 'UNDO'}
+
+    def execute(self, context):
+        scene = context.scene
+        if SCHEDULE_KEY in scene:
+            del scene[SCHEDULE_KEY]
+        scene.lod_props.lod_schedule_enabled = False
+        clear_cache()
+        self.report({'INFO'}, "LOD Schedule cleared.")
+        return {'FINISHED'}
+
+
+# =============================================================================
+# Handlers
+# =============================================================================
+@persistent
+def on_frame_change_pre(scene, depsgraph=None):
+    if _suspended:
+        return
+    props = getattr(scene, "lod_props", None)
+    if not props or not props.lod_schedule_enabled:
+        # 关闭期间物体可能被手动修改，重新开启时全量应用
+        if _cache["schedule"] is not None:
+            _cache["schedule"].applied = None
+        return
+    schedule = get_schedule(scene)
+    if schedule is not None:
+        schedule.apply(scene, scene.frame_current)
+
+@persistent
+def on_load(*args):
+    clear_cache()
+
+
+HANDLERS = (
+    (bpy.app.handlers.frame_change_pre, on_frame_change_pre),
+    (bpy.app.handlers.load_post, on_load),
+)
+
+classes = (
+    LOD_OT_BakeLODSchedule,
+    LOD_OT_ClearLODSchedule,
+)
+
+def register():
+    for cls in classes:
+        bpy.utils.register_class(cls)
+    for handler_list, func in HANDLERS:
+        if func not in handler_list:
+            handler_list.append(func)
+
+def unregister():
+    for handler_list, func in HANDLERS:
+        if func in handler_list:
+            handler_list.remove(func)
+    for cls in reversed(classes):
+        bpy.utils.unregister_class(cls)
+    clear_cache()
@@ -1,6 +1,92 @@
 import bpy
 import time
-from mathutils import Vector
+import numpy as np
+from .. import scene_snapshot
+from .. import utils
+
+# 记录上一次的相机位置与各物体 Level，相机移动后只处理跨越距离阈值的物体
+_tracker = scene_snapshot.LevelTracker('origin')
+
+def shader_settings(scn, cam):
+    """影响 Shader LOD 结果的全部设置 (变化时需要全量重算)"""
+    return (
+        cam.name, scn.lod_dist_0, scn.lod_dist_1, scn.lod_dist_2,
+        scn.exp_normal_mult_1, scn.exp_normal_mult_2, scn.exp_normal_mult_3,
+        scn.exp_disp_mult_1, scn.exp_disp_mult_2, scn.exp_disp_mult_3,
+    )
+
+def shader_multipliers(scn):
+    """各 Level 的 (法线倍率, 置换倍率) 列表"""
+    n_mults = [1.0, scn.exp_normal_mult_1, scn.exp_normal_mult_2, scn.exp_normal_mult_3]
+    d_mults = [1.0, scn.exp_disp_mult_1, scn.exp_disp_mult_2, scn.exp_disp_mult_3]
+    return n_mults, d_mults
+
+def apply_shader_multipliers(obj, target_n_mult, target_d_mult):
+    """按倍率调整物体所有材质的法线强度 / 置换比例 (优化版：智能跳过无效节点)，返回是否有修改"""
+
+    modified = False
+
+    for slot in obj.material_slots:
+        mat = slot.material
+        if not mat or not mat.use_nodes or not mat.node_tree: continue
+
+        # 遍历节点
+        for node in mat.node_tree.nodes:
+
+            # --- A. 处理法线节点 (Normal Map) ---
+            if node.type == 'NORMAL_MAP':
+                # [优化] 1. 检查是否有贴图输入
+                # 如果 "Color" 接口没连线，说明这是一个无效/纯色的法线节点，直接跳过
+                if not node.inputs['Color'].is_linked:
+                    continue
+
+                # 检查 Strength 输入
+                socket = node.inputs.get('Strength')
+                # 只处理未被其他节点控制的 Strength (即没有连线到 Strength)
+                if socket and not socket.is_linked: 
+
+                    # [优化] 2. 只有当原始值大于 0 时才处理 (本来就是0就没必要算了)
+                    # 第一次读取时存档
+                    if "lod_orig_val" not in node:
+                        if socket.default_value <= 0.001: # 原始值极小，视为无效
+                            continue
+                        node["lod_orig_val"] = socket.default_value
+
+                    # 2. 计算新值
+                    orig_val = node["lod_orig_val"]
+                    new_val = orig_val * target_n_mult
+
+                    # 3. 应用 (减少不必要的 update_tag 调用)
+                    if abs(socket.default_value - new_val) > 0.001:
+                        socket.default_value = new_val
+                        modified = True
+
+            # --- B. 处理置换节点 (Displacement) ---
+            elif node.type == 'DISPLACEMENT':
+                # [优化] 1. 检查是否有高度输入
+                # 如果 "Height" (或有的版本叫 Normal) 没连线，跳过
+                height_socket = node.inputs.get('Height')
+                if not height_socket or not height_socket.is_linked:
+                    continue
+
+                # 检查 Scale 输入
+                socket = node.inputs.get('Scale')
+                if socket and not socket.is_linked:
+
+                    if "lod_orig_val" not in node:
+                        if socket.default_value <= 0.001:
+                            continue
+                        node["lod_orig_val"] = socket.default_value
+
+                    orig_val = node["lod_orig_val"]
+                    new_val = orig_val * target_d_mult
+
+                    if abs(socket.default_value - new_val) > 0.001:
+                        socket.default_value = new_val
+                        modified = True
+
+    return modified
+
 
 class LOD_OT_ShaderLODUpdateAsync(bpy.types.Operator):
     """Update shader details (Normal/Displacement) asynchronously"""
@@ -54,33 +140,24 @@ class LOD_OT_ShaderLODUpdateAsync(bpy.types.Operator):
             self.report({'ERROR'}, "No Camera found.")
             return {'CANCELLED'}
         
-        cam_loc = cam.matrix_world.translation
+        cam_loc = np.array(cam.matrix_world.translation)
         d0, d1, d2 = scn.lod_dist_0, scn.lod_dist_1, scn.lod_dist_2
         
         # 1. 构建任务队列
         self._queue = []
         
-        # 预先获取所有可见 Mesh
-        for obj in context.scene.objects:
-            if obj.type != 'MESH' or obj.hide_viewport: continue
-            if not obj.material_slots: continue
-            
-            # 计算距离
-            try:
-                # 简单计算中心点距离
-                center = obj.matrix_world.translation
-                dist = (center - cam_loc).length
-            except:
-                continue
-            
-            # 判定 Level
-            level = 0
-            if dist <= d0: level = 0
-            elif dist <= d1: level = 1
-            elif dist <= d2: level = 2
-            else: level = 3
-            
-            self._queue.append((obj, level))
+        # 预先获取所有可见 Mesh (从快照批量计算原点距离与 Level)
+        # 手动更新总是全量重新应用 (节点数值可能被手动修改)，先清空 Level 记录
+        _tracker.reset()
+        snap = scene_snapshot.get_snapshot(context.scene)
+        eligible = snap.select(types=('MESH',), visible=True, with_materials=True)
+        rows, levels = _tracker.update(
+            snap, eligible, cam_loc, (d0, d1, d2), shader_settings(scn, cam),
+            margins=utils.get_distance_margins(scn),
+        )
+
+        for row, level in zip(rows.tolist(), levels.tolist()):
+            self._queue.append((snap.objects[row], level))
 
         if not self._queue:
             self.report({'WARNING'}, "No suitable objects found.")
@@ -92,8 +169,7 @@ class LOD_OT_ShaderLODUpdateAsync(bpy.types.Operator):
         self._updated_count = 0
         
         # 缓存乘数参数
-        self.n_mults = [1.0, scn.exp_normal_mult_1, scn.exp_normal_mult_2, scn.exp_normal_mult_3]
-        self.d_mults = [1.0, scn.exp_disp_mult_1, scn.exp_disp_mult_2, scn.exp_disp_mult_3]
+        self.n_mults, self.d_mults = shader_multipliers(scn)
 
         context.window_manager.progress_begin(0, self._total_tasks)
         self._timer = context.window_manager.event_timer_add(0.01, window=context.window)
@@ -102,73 +178,8 @@ class LOD_OT_ShaderLODUpdateAsync(bpy.types.Operator):
         return {'RUNNING_MODAL'}
 
     def process_object_material(self, context, obj, level):
-        """处理单个物体的所有材质 (优化版：智能跳过无效节点)"""
-        
-        target_n_mult = self.n_mults[level]
-        target_d_mult = self.d_mults[level]
-        
-        modified = False
-
-        for slot in obj.material_slots:
-            mat = slot.material
-            if not mat or not mat.use_nodes or not mat.node_tree: continue
-            
-            # 遍历节点
-            for node in mat.node_tree.nodes:
-                
-                # --- A. 处理法线节点 (Normal Map) ---
-                if node.type == 'NORMAL_MAP':
-                    # [优化] 1. 检查是否有贴图输入
-                    # 如果 "Color" 接口没连线，说明这是一个无效/纯色的法线节点，直接跳过
-                    if not node.inputs['Color'].is_linked:
-                        continue
-
-                    # 检查 Strength 输入
-                    socket = node.inputs.get('Strength')
-                    # 只处理未被其他节点控制的 Strength (即没有连线到 Strength)
-                    if socket and not socket.is_linked: 
-                        
-                        # [优化] 2. 只有当原始值大于 0 时才处理 (本来就是0就没必要算了)
-                        # 第一次读取时存档
-                        if "lod_orig_val" not in node:
-                            if socket.default_value <= 0.001: # 原始值极小，视为无效
-                                continue
-                            node["lod_orig_val"] = socket.default_value
-                        
-                        # 2. 计算新值
-                        orig_val = node["lod_orig_val"]
-                        new_val = orig_val * target_n_mult
-                        
-                        # 3. 应用 (减少不必要的 update_tag 调用)
-                        if abs(socket.default_value - new_val) > 0.001:
-                            socket.default_value = new_val
-                            modified = True
-
-                # --- B. 处理置换节点 (Displacement) ---
-                elif node.type == 'DISPLACEMENT':
-                    # [优化] 1. 检查是否有高度输入
-                    # 如果 "Height" (或有的版本叫 Normal) 没连线，跳过
-                    height_socket = node.inputs.get('Height')
-                    if not height_socket or not height_socket.is_linked:
-                        continue
-
-                    # 检查 Scale 输入
-                    socket = node.inputs.get('Scale')
-                    if socket and not socket.is_linked:
-                        
-                        if "lod_orig_val" not in node:
-                            if socket.default_value <= 0.001:
-                                continue
-                            node["lod_orig_val"] = socket.default_value
-                        
-                        orig_val = node["lod_orig_val"]
-                        new_val = orig_val * target_d_mult
-                        
-                        if abs(socket.default_value - new_val) > 0.001:
-                            socket.default_value = new_val
-                            modified = True
-
-        if modified:
+        """处理单个物体的所有材质"""
+        if apply_shader_multipliers(obj, self.n_mults[level], self.d_mults[level]):
             self._updated_count += 1
 
     def finish(self, context):
@@ -203,6 +214,7 @@ class LOD_OT_ShaderLODReset(bpy.types.Operator):
                     # del node["lod_orig_val"] 
                     count += 1
                     
+        _tracker.reset()
         self.report({'INFO'}, f"Reset {count} shader nodes to original values.")
         return {'FINISHED'}
 
@@ -1,5 +1,65 @@
 import bpy
-from mathutils import Vector
+import numpy as np
+from .. import scene_snapshot
+from .. import utils
+
+# 记录上一次的相机位置与各物体 Level，相机移动后只处理跨越距离阈值的物体
+_tracker = scene_snapshot.LevelTracker('center')
+
+# --- 定义显示模式的权重 (数字越小越省资源) ---
+DISPLAY_RANKS = {
+    'TEXTURED': 3,
+    'SOLID':    2,
+    'WIRE':     1,
+    'BOUNDS':   0
+}
+
+def viewport_settings(scn, cam):
+    """影响视图 LOD 结果的全部设置 (变化时需要全量重算)"""
+    return (
+        cam.name, scn.lod_dist_0, scn.lod_dist_1, scn.lod_dist_2, scn.view_lod3_hide,
+        tuple(getattr(scn, f"view_lod{i}_display") for i in range(4)),
+    )
+
+def apply_viewport_level(obj, level, scn):
+    """按 Level 设置物体的视图显示模式 (只降级，不升级)"""
+    # --- [快照逻辑] 保存原始状态 ---
+    if "_lod_orig_display" not in obj:
+        obj["_lod_orig_display"] = obj.display_type
+    
+    if "_lod_orig_hide" not in obj:
+        obj["_lod_orig_hide"] = int(obj.hide_viewport)
+    # -----------------------------------------------
+
+    # 获取 LOD 建议的目标模式
+    attr_name = f"view_lod{level}_display"
+    target_display = getattr(scn, attr_name, 'BOUNDS')
+    
+    # --- [核心修改] 降级保护逻辑 ---
+    # 1. 获取该物体最原始的显示模式
+    orig_display = obj.get("_lod_orig_display", 'TEXTURED')
+    
+    # 2. 比较权重
+    rank_target = DISPLAY_RANKS.get(target_display, 2)
+    rank_orig   = DISPLAY_RANKS.get(orig_display, 2)
+    
+    # 3. 取较小值 (min)：如果 LOD 建议是 Solid(2)，但原物是 Wire(1)，则保持 Wire
+    if rank_target < rank_orig:
+        final_display = target_display
+    else:
+        final_display = orig_display
+        
+    # --- [额外优化] 隐藏状态保护 ---
+    # 如果物体原本就是隐藏的，也不要因为 LOD 而把它显示出来
+    should_hide_by_lod = (level == 3 and scn.view_lod3_hide)
+    orig_is_hidden = bool(obj.get("_lod_orig_hide", 0))
+    
+    # 应用属性 (值不变时不写，避免触发多余的 depsgraph 更新)
+    if obj.display_type != final_display:
+        obj.display_type = final_display
+    hide = should_hide_by_lod or orig_is_hidden
+    if obj.hide_viewport != hide:
+        obj.hide_viewport = hide
 
 class LOD_OT_ViewportLODUpdate(bpy.types.Operator):
     """Update Viewport Display Mode Based on Distance (Solid / Wire / Bounds)"""
@@ -20,75 +80,23 @@ class LOD_OT_ViewportLODUpdate(bpy.types.Operator):
             self.report({'ERROR'}, "No Camera found for LOD calculation.")
             return {'CANCELLED'}
         
-        cam_loc = cam.matrix_world.translation
+        cam_loc = np.array(cam.matrix_world.translation)
         d0, d1, d2 = scn.lod_dist_0, scn.lod_dist_1, scn.lod_dist_2
         
         count = 0
-        
-        # --- 定义显示模式的权重 (数字越小越省资源) ---
-        DISPLAY_RANKS = {
-            'TEXTURED': 3,
-            'SOLID':    2,
-            'WIRE':     1,
-            'BOUNDS':   0
-        }
 
-        # 3. 遍历场景物体
-        for obj in context.scene.objects:
-            if obj.type not in {'MESH', 'CURVE', 'SURFACE', 'META', 'FONT'}:
-                continue
-
-            # --- [快照逻辑] 保存原始状态 ---
-            if "_lod_orig_display" not in obj:
-                obj["_lod_orig_display"] = obj.display_type
-            
-            if "_lod_orig_hide" not in obj:
-                obj["_lod_orig_hide"] = int(obj.hide_viewport)
-            # -----------------------------------------------
+        # 2. 从快照中批量计算包围盒中心距离与 Level
+        # 手动更新总是全量重新应用 (用户可能手动改过显示方式)，先清空 Level 记录
+        _tracker.reset()
+        snap = scene_snapshot.get_snapshot(context.scene)
+        rows, levels = _tracker.update(
+            snap, snap.select(), cam_loc, (d0, d1, d2), viewport_settings(scn, cam),
+            margins=utils.get_distance_margins(scn),
+        )
 
-            # 计算距离
-            try:
-                bbox_world = [obj.matrix_world @ Vector(corner) for corner in obj.bound_box]
-                center = sum(bbox_world, Vector()) / 8.0
-            except:
-                center = obj.matrix_world.translation
-            
-            dist = (center - cam_loc).length
-            
-            # 判定 Level
-            level = 0
-            if dist <= d0: level = 0
-            elif dist <= d1: level = 1
-            elif dist <= d2: level = 2
-            else: level = 3
-            
-            # 获取 LOD 建议的目标模式
-            attr_name = f"view_lod{level}_display"
-            target_display = getattr(scn, attr_name, 'BOUNDS')
-            
-            # --- [核心修改] 降级保护逻辑 ---
-            # 1. 获取该物体最原始的显示模式
-            orig_display = obj.get("_lod_orig_display", 'TEXTURED')
-            
-            # 2. 比较权重
-            rank_target = DISPLAY_RANKS.get(target_display, 2)
-            rank_orig   = DISPLAY_RANKS.get(orig_display, 2)
-            
-            # 3. 取较小值 (min)：如果 LOD 建议是 Solid(2)，但原物是 Wire(1)，则保持 Wire
-            if rank_target < rank_orig:
-                final_display = target_display
-            else:
-                final_display = orig_display
-                
-            # --- [额外优化] 隐藏状态保护 ---
-            # 如果物体原本就是隐藏的，也不要因为 LOD 而把它显示出来
-            should_hide_by_lod = (level == 3 and scn.view_lod3_hide)
-            orig_is_hidden = bool(obj.get("_lod_orig_hide", 0))
-            
-            # 应用属性
-            obj.display_type = final_display
-            obj.hide_viewport = should_hide_by_lod or orig_is_hidden
-            
+        # 3. 遍历场景物体
+        for row, level in zip(rows.tolist(), levels.tolist()):
+            apply_viewport_level(snap.objects[row], level, scn)
             count += 1
             
         self.report({'INFO'}, f"Viewport LOD Updated: {count} objects processed (Downgrade Only).")
@@ -134,6 +142,7 @@ class LOD_OT_ViewportLODReset(bpy.types.Operator):
                 obj.hide_viewport = False
             # ---------------------------------------
         
+        _tracker.reset()
         self.report({'INFO'}, f"Reset Viewport: Restored {restored_count} objects.")
         return {'FINISHED'}
 
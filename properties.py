@@ -12,6 +12,16 @@ class LOD_ImageItem(bpy.types.PropertyGroup):
     image_size: StringProperty()
     image_selected: BoolProperty(default=False)
     packed_img: IntProperty(default=0) # 0:File, 1:Packed, 2:Linked
+    # 文件头元数据 (扫描时填充，无需加载像素)
+    image_width: IntProperty(default=0)
+    image_height: IntProperty(default=0)
+    image_channels: IntProperty(default=4)
+    image_bit_depth: IntProperty(default=8)
+    image_is_float: BoolProperty(default=False)
+    image_tiles: IntProperty(default=1) # UDIM 图块数
+    # 纹素密度分析结果 (Find Over-Resolved)
+    over_resolved: BoolProperty(default=False)
+    required_size: IntProperty(default=0)
 
 # --- Main Properties ---
 class LOD_Props(bpy.types.PropertyGroup):
@@ -57,17 +67,114 @@ class LOD_Props(bpy.types.PropertyGroup):
     use_same_directory: BoolProperty(default=True, name="Save in Blend Dir")
     custom_output_path: StringProperty(subtype='DIR_PATH', name="Custom Path")
     duplicate_images: BoolProperty(default=True, name="Duplicate Files")
+    resize_pyramid: BoolProperty(
+        default=False,
+        name="Generate All Sizes",
+        description="Decode each image once and write every preset size (2048-128 px) for the Texture Switcher"
+    )
+    resize_quality: EnumProperty(
+        name="Resize Quality",
+        items=[
+            ('EXACT', "Exact", "Full-resolution decode and LANCZOS resampling"),
+            ('BALANCED', "Balanced", "Reduced-resolution JPEG decode and integer pre-reduction; visually identical, 2-5x faster on large JPEGs"),
+            ('FAST', "Fast", "Aggressive pre-reduction; fastest, slight softening on big downscales"),
+        ],
+        default='EXACT',
+        description="Speed / quality trade-off for large downscales in the worker"
+    )
+    float_depth: EnumProperty(
+        name="Float Depth",
+        items=[
+            ('HALF', "Half", "16-bit half float EXR; half the size, enough for color and most displacement"),
+            ('FLOAT', "Float", "32-bit float EXR; keeps full precision for displacement and data maps"),
+        ],
+        default='HALF',
+        description="Channel precision of downscaled EXR textures (HDR files are always RGBE)"
+    )
+    exr_codec: EnumProperty(
+        name="EXR Codec",
+        items=[
+            ('ZIP', "ZIP", "Lossless, good general-purpose compression"),
+            ('PIZ', "PIZ", "Lossless wavelet compression, best for noisy or photographic data"),
+            ('DWAA', "DWAA", "Lossy, smallest files; avoid for displacement and data maps"),
+            ('NONE', "None", "Uncompressed"),
+        ],
+        default='ZIP',
+        description="Compression of downscaled EXR textures"
+    )
+    defer_image_swaps: BoolProperty(
+        default=False,
+        name="Swap When Finished",
+        description="Keep the original textures in the viewport until the whole job finishes, then switch all images in one pass"
+    )
+
+    # Shared Texture Cache
+    use_texture_cache: BoolProperty(
+        default=False,
+        name="Use Texture Cache",
+        description="Reuse resized textures across projects via a content-addressed cache"
+    )
+    texture_cache_dir: StringProperty(
+        subtype='DIR_PATH',
+        name="Cache Folder",
+        description="Local or shared folder for the texture cache (empty = user data folder)"
+    )
+    texture_cache_max_gb: FloatProperty(
+        default=10.0,
+        min=0.1,
+        name="Cache Limit (GB)",
+        description="Least recently used entries are removed when the cache grows beyond this size"
+    )
 
     # Stats
     r_total_images: IntProperty(name="Total Images")
     total_image_memory: StringProperty(name="Total Memory")
+    mem_include_mipmaps: BoolProperty(
+        default=True,
+        name="Include Mipmaps",
+        description="Count GPU mip chains (+1/3) in the texture memory estimate"
+    )
+
+    # VRAM Budget (Camera Optimization)
+    cam_texel_density: BoolProperty(
+        default=True,
+        name="Use UV Texel Density",
+        description="Size textures from the texel density actually sampled on screen (UV area vs. world area) instead of the bounding-box pixel size"
+    )
+    cam_sample_animation: BoolProperty(
+        default=False,
+        name="Sample Animation",
+        description="Analyze the whole frame range (including marker camera switches) and keep the largest size each texture needs"
+    )
+    cam_sample_step: IntProperty(
+        default=10,
+        min=1,
+        name="Sample Step",
+        description="Frames between coarse samples; intervals where screen size changes quickly are refined automatically"
+    )
+    cam_visual_priority: BoolProperty(
+        default=False,
+        name="Visual Priority",
+        description="Process the textures that dominate the screen first, so a cancelled run still leaves the most visible ones optimized (default: longest jobs first)"
+    )
+    cam_budget_enabled: BoolProperty(
+        default=False,
+        name="Fit Memory Budget",
+        description="Shrink textures further, least important on screen first, until they fit the budget"
+    )
+    cam_budget_gb: FloatProperty(
+        default=6.0,
+        min=0.1,
+        name="Budget (GB)",
+        description="Total texture memory allowed after camera optimization"
+    )
     
     # ==========================================================
     # 2. LOD Manager Core
     # ==========================================================
     lod_camera: PointerProperty(
         name="LOD Camera",
-        description="Camera used for screen coverage calculation",
+        description="Camera used for screen coverage calculation. Animation sampling and schedule baking follow the scene camera instead, so timeline-marker camera switches are respected",
         type=bpy.types.Object,
     )
     
@@ -75,6 +182,36 @@ class LOD_Props(bpy.types.PropertyGroup):
     lod_dist_1: FloatProperty(name="LOD 1 Distance", default=25.0, min=0.0, description="Mid Detail End Distance")
     lod_dist_2: FloatProperty(name="LOD 2 Distance", default=50.0, min=0.0, description="Low Detail End Distance")
 
+    # 滞回带：物体需越过 阈值 ± 宽度 才切换 Level，避免在阈值附近来回抖动
+    lod_dist_hyst_0: FloatProperty(name="LOD 0 Hysteresis", default=0.5, min=0.0, description="Band around LOD 0 Distance that must be crossed before the level changes")
+    lod_dist_hyst_1: FloatProperty(name="LOD 1 Hysteresis", default=0.5, min=0.0, description="Band around LOD 1 Distance that must be crossed before the level changes")
+    lod_dist_hyst_2: FloatProperty(name="LOD 2 Hysteresis", default=0.5, min=0.0, description="Band around LOD 2 Distance that must be crossed before the level changes")
+
+    live_lod_enabled: BoolProperty(
+        name="Live LOD",
+        description="Update enabled LOD types automatically during playback and when the LOD camera moves",
+        default=False,
+    )
+    live_lod_budget_ms: FloatProperty(
+        name="Budget (ms)",
+        default=4.0,
+        min=0.5,
+        max=100.0,
+        description="Time allowed per update; remaining objects are written in later updates"
+    )
+    lod_schedule_enabled: BoolProperty(
+        name="Use LOD Schedule",
+        description="Apply the baked per-frame LOD schedule on every frame change (playback and rendering)",
+        default=False,
+    )
+    lod_cooldown: FloatProperty(
+        name="Cooldown (s)",
+        default=0.5,
+        min=0.0,
+        max=10.0,
+        description="Live LOD: minimum time an object stays at a level before it may change again"
+    )
+
     # ==========================================================
     # 3. Viewport Optimization
     # ==========================================================
@@ -137,6 +274,15 @@ class LOD_Props(bpy.types.PropertyGroup):
         description="Merge radius at furthest distance (Higher = More aggressive)"
     )    
 
+    geo_lod_hysteresis: FloatProperty(
+        name="Hysteresis",
+        default=0.1,
+        min=0.0,
+        max=0.9,
+        subtype='FACTOR',
+        description="Relative band around each screen-coverage step; coverage must move this far past a step before the factor changes"
+    )
+
     # ==========================================================
     # 5. Experimental: Shader LOD
     # ==========================================================
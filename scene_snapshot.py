@@ -0,0 +1,421 @@
+# File Path: .\scene_snapshot.py
+
+import bpy
+import time
+import numpy as np
+from bpy.app.handlers import persistent
+from . import utils
+from . import image_index
+from .spatial_index import SpatialIndex
+
+# 参与 LOD 计算的物体类型 (与视图 LOD 保持一致)
+RENDERABLE_TYPES = ('MESH', 'CURVE', 'SURFACE', 'META', 'FONT')
+TYPE_CODES = {t: i for i, t in enumerate(RENDERABLE_TYPES)}
+
+# LOD 自身的几何节点修改器 (只减面，不产生实例)，其参数写入不影响实例源关系
+LOD_GEO_MOD_NAME = "LOD_GEO_LOD"
+
+
+class SceneSnapshot:
+    """
+    场景中所有可渲染物体的数组化快照。
+    - 世界矩阵 / 局部包围盒 / 面数顶点数 / 隐藏状态 / 实例源标记 存在连续的 NumPy 数组中
+    - 每行对应 self.objects[i]，self.index 提供 name -> 行号
+    - depsgraph_update_post 只标记变化的物体，sync() 时只重读这些行
+    - 物体增删 (结构变化) 或撤销后才整体重建
+    """
+
+    def __init__(self):
+        self.scene = None
+        self.objects = []
+        self.index = {}
+        self.matrices = np.zeros((0, 4, 4))
+        self.bboxes = np.zeros((0, 8, 3))
+        self.types = np.zeros(0, dtype=np.int8)
+        self.face_counts = np.zeros(0, dtype=np.int64)
+        self.vert_counts = np.zeros(0, dtype=np.int64)
+        self.hide_viewport = np.zeros(0, dtype=bool)
+        self.hide_render = np.zeros(0, dtype=bool)
+        self.is_instance_source = np.zeros(0, dtype=bool)
+        self.has_materials = np.zeros(0, dtype=bool)
+        self.animated = np.zeros(0, dtype=bool)   # 世界矩阵可能随帧变化 (动画/约束/刚体/父级)
+        self.materials = []         # 每行: 材质名元组
+
+        # 版本号：每次重建/行更新递增，row_versions 记录每行最后一次更新的版本
+        self.version = 0
+        self.build_version = 0
+        self.row_versions = np.zeros(0, dtype=np.int64)
+        self._indices = {}          # 代表点类型 -> [SpatialIndex, 已同步的版本]
+
+        self._dirty = set()
+        self._structure_dirty = True
+        self._sources_dirty = True
+
+    # ------------------------------------------------------------------
+    # 标记 (由 depsgraph 回调调用，必须足够轻)
+    # ------------------------------------------------------------------
+    def invalidate(self):
+        """撤销 / 载入文件后，Python 持有的物体引用可能失效，整体重建"""
+        self._structure_dirty = True
+        self._dirty.clear()
+
+    def mark_object(self, obj, geometry=False):
+        name = obj.name
+        if name not in self.index:
+            # 新物体或改名：只关心可渲染类型 (相机/灯光移动不触发重建)
+            if obj.type in TYPE_CODES:
+                self._structure_dirty = True
+            return
+        self._dirty.add(name)
+        if geometry and (obj.particle_systems or any(
+                m.type == 'NODES' and m.name != LOD_GEO_MOD_NAME for m in obj.modifiers)):
+            # 实例源关系可能改变 (忽略 LOD 写入自身修改器引起的更新)
+            self._sources_dirty = True
+
+    def mark_structure(self):
+        self._structure_dirty = True
+
+    def mark_animated(self):
+        """
+        帧切换时调用：depsgraph_update_post 不随帧切换触发，
+        会动的物体需要主动标记，否则矩阵停留在旧帧。
+        """
+        if self._structure_dirty:
+            return
+        try:
+            self._dirty.update(self.objects[i].name for i in np.flatnonzero(self.animated).tolist())
+        except ReferenceError:
+            self._structure_dirty = True
+
+    # ------------------------------------------------------------------
+    # 同步
+    # ------------------------------------------------------------------
+    def sync(self, scene):
+        """应用所有挂起的更新，返回自身"""
+        if self.scene != scene or self._structure_dirty:
+            self.rebuild(scene)
+        elif self._dirty:
+            rows = [self.index[n] for n in self._dirty if n in self.index]
+            self._dirty.clear()
+            try:
+                for i in rows:
+                    self._read_row(i, self.objects[i])
+            except ReferenceError:
+                # 物体已被删除但尚未收到集合更新
+                self.rebuild(scene)
+            else:
+                self.version += 1
+                self.row_versions[rows] = self.version
+
+        if self._sources_dirty:
+            self._update_instance_sources(scene)
+        return self
+
+    def rebuild(self, scene):
+        objs = [o for o in scene.objects if o.type in TYPE_CODES]
+        n = len(objs)
+        self.scene = scene
+        self.objects = objs
+        self.index = {o.name: i for i, o in enumerate(objs)}
+        self.matrices = np.empty((n, 4, 4))
+        self.bboxes = np.empty((n, 8, 3))
+        self.types = np.empty(n, dtype=np.int8)
+        self.face_counts = np.zeros(n, dtype=np.int64)
+        self.vert_counts = np.zeros(n, dtype=np.int64)
+        self.hide_viewport = np.zeros(n, dtype=bool)
+        self.hide_render = np.zeros(n, dtype=bool)
+        self.is_instance_source = np.zeros(n, dtype=bool)
+        self.has_materials = np.zeros(n, dtype=bool)
+        self.animated = np.zeros(n, dtype=bool)
+        self.materials = [()] * n
+        for i, obj in enumerate(objs):
+            self._read_row(i, obj)
+
+        self.version += 1
+        self.build_version = self.version
+        self.row_versions = np.full(n, self.version, dtype=np.int64)
+        self._indices.clear()
+        self._dirty.clear()
+        self._structure_dirty = False
+        self._sources_dirty = True
+
+    def _read_row(self, i, obj):
+        self.matrices[i] = obj.matrix_world
+        self.bboxes[i] = obj.bound_box
+        self.types[i] = TYPE_CODES[obj.type]
+        if obj.type == 'MESH':
+            self.face_counts[i] = len(obj.data.polygons)
+            self.vert_counts[i] = len(obj.data.vertices)
+        self.hide_viewport[i] = obj.hide_viewport
+        self.hide_render[i] = obj.hide_render
+        self.materials[i] = tuple(s.material.name for s in obj.material_slots if s.material)
+        self.has_materials[i] = bool(self.materials[i])
+        self.animated[i] = not utils.is_static_transform(obj)
+
+    def _update_instance_sources(self, scene):
+        self.is_instance_source[:] = False
+        for src in utils.get_instance_sources(scene):
+            i = self.index.get(src.name)
+            if i is not None:
+                self.is_instance_source[i] = True
+        self._sources_dirty = False
+
+    # ------------------------------------------------------------------
+    # 查询
+    # ------------------------------------------------------------------
+    def select(self, types=None, visible=False, renderable=False, skip_sources=False, with_materials=False):
+        """按条件筛选行号，返回 int 数组"""
+        mask = np.ones(len(self.objects), dtype=bool)
+        if types is not None:
+            mask &= np.isin(self.types, [TYPE_CODES[t] for t in types])
+        if visible:
+            mask &= ~self.hide_viewport
+        if renderable:
+            mask &= ~self.hide_render
+        if skip_sources:
+            mask &= ~self.is_instance_source
+        if with_materials:
+            mask &= self.has_materials
+        return np.flatnonzero(mask)
+
+    def world_centers(self, rows):
+        """包围盒中心的世界坐标 (N,3)"""
+        local = self.bboxes[rows].mean(axis=1)
+        m = self.matrices[rows]
+        return np.einsum('nij,nj->ni', m[:, :3, :3], local) + m[:, :3, 3]
+
+    def translations(self, rows):
+        """物体原点的世界坐标 (N,3)"""
+        return self.matrices[rows, :3, 3]
+
+    def world_aabbs(self, rows):
+        """世界空间轴对齐包围盒: (lo (N,3), hi (N,3))"""
+        m = self.matrices[rows]
+        corners = np.einsum('nij,nkj->nki', m[:, :3, :3], self.bboxes[rows]) + m[:, None, :3, 3]
+        return corners.min(axis=1), corners.max(axis=1)
+
+    def changed_rows(self, since_version):
+        """since_version 之后被更新过的行"""
+        return np.flatnonzero(self.row_versions > since_version)
+
+    def spatial_index(self, point='center'):
+        """
+        懒构建的空间索引 (行号即索引中的物体编号)。
+        point: 'center' 以包围盒中心为代表点 (视图 LOD)，'origin' 以物体原点为代表点 (Shader LOD)
+        之后的调用只对变化的行做 refit。
+        """
+        entry = self._indices.get(point)
+        if entry is None:
+            rows = np.arange(len(self.objects))
+            lo, hi = self.world_aabbs(rows)
+            entry = [SpatialIndex(self._points(point, rows), lo, hi), self.version]
+            self._indices[point] = entry
+        elif entry[1] < self.version:
+            rows = self.changed_rows(entry[1])
+            lo, hi = self.world_aabbs(rows)
+            entry[0].refit(rows, self._points(point, rows), lo, hi)
+            entry[1] = self.version
+        return entry[0]
+
+    def _points(self, point, rows):
+        return self.world_centers(rows) if point == 'center' else self.translations(rows)
+
+    def material_images(self, name):
+        """材质引用的图片名 (由 image_index 按节点树记忆，含节点组内部)"""
+        return image_index.get_index().material_images(name)
+
+    def row_images(self, i):
+        """第 i 行物体所有材质引用的图片名"""
+        names = []
+        for mat_name in self.materials[i]:
+            names.extend(self.material_images(mat_name))
+        return names
+
+
+_TRACKERS = []
+
+class TransitionTracker:
+    """
+    记录每行当前生效的 Level，并对 Level 切换施加最短停留时间 (冷却)。
+    - prepare(): 快照重建或设置改变时清空记录 (返回 True 表示需要全量计算)
+    - commit():  比较新旧 Level，返回真正需要写回的行；被冷却拦下的行记入 deferred，稍后重查
+    同时统计被滞回带 / 冷却时间抑制的切换次数 (每次抑制即少一次修改器重算)。
+    """
+
+    def __init__(self):
+        self.suppressed_hysteresis = 0
+        self.suppressed_cooldown = 0
+        self.applied = 0
+        self.reset()
+        _TRACKERS.append(self)
+
+    def reset(self):
+        self.build_version = -1
+        self.settings = None
+        self.levels = None
+        self.changed_at = None
+        self.deferred = np.zeros(0, dtype=np.int64)
+
+    def prepare(self, snap, settings):
+        full = (
+            self.levels is None
+            or self.build_version != snap.build_version
+            or self.settings != settings
+        )
+        if full:
+            n = len(snap.objects)
+            self.levels = np.full(n, -1, dtype=np.int64)
+            self.changed_at = np.full(n, -np.inf)
+            self.deferred = np.zeros(0, dtype=np.int64)
+        self.build_version = snap.build_version
+        self.settings = settings
+        return full
+
+    def forget(self, rows):
+        """清除这些行的记录 (下次计算时视为新物体，立即写回)"""
+        self.levels[rows] = -1
+        self.changed_at[rows] = -np.inf
+
+    def commit(self, rows, raw_levels, levels, cooldown=0.0, now=None):
+        """
+        rows: 本次计算的行；raw_levels: 不带滞回的 Level (仅用于统计)；levels: 带滞回的 Level
+        返回 (rows, levels)：Level 发生切换并已生效的行
+        """
+        rows = np.asarray(rows, dtype=np.int64)
+        if now is None:
+            now = time.monotonic()
+        prev = self.levels[rows]
+        known = prev >= 0
+        self.suppressed_hysteresis += int(np.count_nonzero(known & (raw_levels != prev) & (levels == prev)))
+
+        change = levels != prev
+        blocked = change & known & ((now - self.changed_at[rows]) < cooldown)
+        # 已在等待中的行不重复计数
+        self.suppressed_cooldown += int(np.count_nonzero(blocked & ~np.isin(rows, self.deferred)))
+
+        apply = change & ~blocked
+        applied_rows = rows[apply]
+        self.levels[applied_rows] = levels[apply]
+        self.changed_at[applied_rows] = now
+        self.applied += len(applied_rows)
+
+        self.deferred = np.union1d(np.setdiff1d(self.deferred, rows), rows[blocked])
+        return applied_rows, levels[apply]
+
+
+class LevelTracker(TransitionTracker):
+    """
+    基于距离阈值的 Level 跟踪 (视图 / Shader LOD)。
+    记录上一次的相机位置，相机移动后只重算可能跨越阈值 (含滞回带) 的行：
+    - 快照重建 / 设置改变 / 首次调用：全量计算
+    - 否则：空间索引壳层查询的候选行 + 自上次以来被更新过的行 + 冷却中等待的行
+    update() 返回 (rows, levels)：Level 发生变化 (需要写回) 的行
+    """
+
+    def __init__(self, point='center'):
+        self.point = point
+        super().__init__()
+
+    def reset(self):
+        super().reset()
+        self.version = -1
+        self.cam_loc = None
+
+    def update(self, snap, eligible, cam_loc, thresholds, settings, margins=None, cooldown=0.0):
+        """eligible: 参与计算的行号 (例如 snap.select(...) 的结果)"""
+        cam_loc = np.asarray(cam_loc, dtype=np.float64)
+        if margins is None:
+            margins = np.zeros(len(thresholds))
+        full = self.prepare(snap, (settings, tuple(margins))) or self.cam_loc is None
+
+        if full:
+            rows = np.asarray(eligible, dtype=np.int64)
+        else:
+            index = snap.spatial_index(self.point)
+            candidates = np.union1d(
+                np.union1d(
+                    index.query_crossings(cam_loc, self.cam_loc, thresholds, margins),
+                    snap.changed_rows(self.version),
+                ),
+                self.deferred,
+            )
+            # 变为不参与计算的行 (例如被隐藏) 清除记录，重新参与时会被视为变化
+            is_eligible = np.zeros(len(snap.objects), dtype=bool)
+            is_eligible[eligible] = True
+            self.forget(candidates[~is_eligible[candidates]])
+            rows = candidates[is_eligible[candidates]]
+
+        points = snap.world_centers(rows) if self.point == 'center' else snap.translations(rows)
+        dists = np.linalg.norm(points - cam_loc, axis=1)
+        raw = utils.get_distance_levels(dists, thresholds)
+        levels = utils.get_distance_levels(dists, thresholds, margins, self.levels[rows])
+        rows, levels = self.commit(rows, raw, levels, cooldown)
+
+        self.version = snap.version
+        self.cam_loc = cam_loc
+        return rows, levels
+
+
+def get_transition_stats():
+    """所有跟踪器的累计统计: (已切换, 滞回抑制, 冷却抑制)"""
+    return (
+        sum(t.applied for t in _TRACKERS),
+        sum(t.suppressed_hysteresis for t in _TRACKERS),
+        sum(t.suppressed_cooldown for t in _TRACKERS),
+    )
+
+def has_deferred():
+    return any(len(t.deferred) for t in _TRACKERS)
+
+
+_snapshot = SceneSnapshot()
+
+def get_snapshot(scene):
+    """获取已同步到 scene 的全局快照"""
+    return _snapshot.sync(scene)
+
+def mark_frame_change(scene):
+    """帧切换后标记会动的物体，下次 sync() 时重读它们的矩阵"""
+    if _snapshot.scene == scene:
+        _snapshot.mark_animated()
+
+
+# =============================================================================
+# Handlers
+# =============================================================================
+@persistent
+def on_depsgraph_update(scene, depsgraph):
+    if _snapshot.scene != scene:
+        return
+    for update in depsgraph.updates:
+        id_data = update.id
+        if isinstance(id_data, bpy.types.Object):
+            # 变换 / 几何 / 可见性 / 材质槽变化都只重读这一行
+            _snapshot.mark_object(id_data, geometry=update.is_updated_geometry)
+        elif isinstance(id_data, bpy.types.Collection):
+            # 集合内容变化 (增删物体)
+            _snapshot.mark_structure()
+
+@persistent
+def on_invalidate(*args):
+    _snapshot.invalidate()
+
+
+HANDLERS = (
+    (bpy.app.handlers.depsgraph_update_post, on_depsgraph_update),
+    (bpy.app.handlers.undo_post, on_invalidate),
+    (bpy.app.handlers.redo_post, on_invalidate),
+    (bpy.app.handlers.load_post, on_invalidate),
+)
+
+def register():
+    for handler_list, func in HANDLERS:
+        if func not in handler_list:
+            handler_list.append(func)
+
+def unregister():
+    for handler_list, func in HANDLERS:
+        if func in handler_list:
+            handler_list.remove(func)
+    _snapshot.invalidate()
+    _snapshot.objects = []
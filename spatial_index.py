@@ -0,0 +1,219 @@
+# File Path: .\spatial_index.py
+
+import numpy as np
+
+# 注意：本模块不依赖 bpy，只处理 NumPy 数组
+# 平面格式: (N,4) 数组，每行 (nx, ny, nz, d)，n·x + d >= 0 表示在内侧
+
+LEAF_SIZE = 16
+
+
+class SpatialIndex:
+    """
+    物体包围盒上的 BVH (扁平数组存储，前序编号：子节点编号总大于父节点)。
+    每个物体有一个代表点 (用于距离查询) 和一个世界 AABB (用于视锥查询)，
+    节点同时记录两者的并集。
+    - query_shell:   代表点到 center 的距离落在 [r_min, r_max] 内的物体
+    - query_frustum: AABB 与视锥相交 (或无法排除) 的物体
+    - refit:         物体移动后只更新其叶节点与祖先节点
+    """
+
+    def __init__(self, points, box_lo, box_hi, leaf_size=LEAF_SIZE):
+        self.points = np.array(points, dtype=np.float64).reshape(-1, 3)
+        self.box_lo = np.array(box_lo, dtype=np.float64).reshape(-1, 3)
+        self.box_hi = np.array(box_hi, dtype=np.float64).reshape(-1, 3)
+        self.leaf_size = leaf_size
+        self.refit_count = 0
+        self._build()
+
+    def __len__(self):
+        return len(self.points)
+
+    # ------------------------------------------------------------------
+    # 构建
+    # ------------------------------------------------------------------
+    def _build(self):
+        n = len(self.points)
+        self.order = np.arange(n)
+        nodes = []      # [start, count, left, right, parent]
+
+        # 迭代构建，避免深递归
+        stack = [(0, n, -1, None)]
+        while stack:
+            start, count, parent, side = stack.pop()
+            node_id = len(nodes)
+            nodes.append([start, count, -1, -1, parent])
+            if parent >= 0:
+                nodes[parent][2 if side == 0 else 3] = node_id
+
+            if count <= self.leaf_size:
+                continue
+
+            # 按代表点包围盒的最长轴做中位数划分
+            idx = self.order[start:start + count]
+            pts = self.points[idx]
+            axis = int(np.argmax(pts.max(axis=0) - pts.min(axis=0)))
+            half = count // 2
+            part = np.argpartition(pts[:, axis], half)
+            self.order[start:start + count] = idx[part]
+
+            # 右子树先入栈，保证左子树先编号 (前序)
+            stack.append((start + half, count - half, node_id, 1))
+            stack.append((start, half, node_id, 0))
+
+        nodes = np.array(nodes, dtype=np.int64).reshape(-1, 5)
+        self.start = nodes[:, 0]
+        self.count = nodes[:, 1]
+        self.left = nodes[:, 2]
+        self.right = nodes[:, 3]
+        self.parent = nodes[:, 4]
+
+        m = len(nodes)
+        self.pt_lo = np.empty((m, 3))
+        self.pt_hi = np.empty((m, 3))
+        self.node_lo = np.empty((m, 3))
+        self.node_hi = np.empty((m, 3))
+
+        self.leaf_of = np.empty(n, dtype=np.int64)
+        for node_id in np.flatnonzero(self.left < 0).tolist():
+            s, c = self.start[node_id], self.count[node_id]
+            self.leaf_of[self.order[s:s + c]] = node_id
+
+        self._refit_nodes(range(m - 1, -1, -1))
+        self.refit_count = 0
+
+    def _refit_nodes(self, node_ids):
+        """按给定顺序 (子节点在前) 重新计算节点包围盒"""
+        for node_id in node_ids:
+            left = self.left[node_id]
+            if left < 0:
+                s, c = self.start[node_id], self.count[node_id]
+                idx = self.order[s:s + c]
+                if c == 0:
+                    self.pt_lo[node_id] = self.node_lo[node_id] = np.inf
+                    self.pt_hi[node_id] = self.node_hi[node_id] = -np.inf
+                    continue
+                pts = self.points[idx]
+                self.pt_lo[node_id] = pts.min(axis=0)
+                self.pt_hi[node_id] = pts.max(axis=0)
+                self.node_lo[node_id] = self.box_lo[idx].min(axis=0)
+                self.node_hi[node_id] = self.box_hi[idx].max(axis=0)
+            else:
+                right = self.right[node_id]
+                self.pt_lo[node_id] = np.minimum(self.pt_lo[left], self.pt_lo[right])
+                self.pt_hi[node_id] = np.maximum(self.pt_hi[left], self.pt_hi[right])
+                self.node_lo[node_id] = np.minimum(self.node_lo[left], self.node_lo[right])
+                self.node_hi[node_id] = np.maximum(self.node_hi[left], self.node_hi[right])
+
+    # ------------------------------------------------------------------
+    # 增量更新
+    # ------------------------------------------------------------------
+    def refit(self, items, points, box_lo, box_hi):
+        """
+        更新部分物体的代表点与 AABB，只重算受影响的叶节点及其祖先。
+        移动过多 (树质量下降) 时整体重建。
+        """
+        items = np.asarray(items, dtype=np.int64)
+        if len(items) == 0:
+            return
+        self.points[items] = points
+        self.box_lo[items] = box_lo
+        self.box_hi[items] = box_hi
+
+        self.refit_count += len(items)
+        if self.refit_count > len(self.points):
+            self._build()
+            return
+
+        dirty = set()
+        for node_id in np.unique(self.leaf_of[items]).tolist():
+            while node_id >= 0 and node_id not in dirty:
+                dirty.add(node_id)
+                node_id = int(self.parent[node_id])
+        # 前序编号：编号大的先算即可保证子节点在父节点之前
+        self._refit_nodes(sorted(dirty, reverse=True))
+
+    # ------------------------------------------------------------------
+    # 查询
+    # ------------------------------------------------------------------
+    def _collect(self, node_id, out):
+        s, c = self.start[node_id], self.count[node_id]
+        out.append(self.order[s:s + c])
+
+    def query_shell(self, center, r_min, r_max):
+        """代表点与 center 距离在 [r_min, r_max] 内的物体索引"""
+        if len(self.points) == 0 or r_max < r_min:
+            return np.zeros(0, dtype=np.int64)
+        center = np.asarray(center, dtype=np.float64)
+        r_min2 = max(r_min, 0.0) ** 2
+        r_max2 = r_max * r_max
+
+        out = []
+        stack = [0]
+        while stack:
+            node_id = stack.pop()
+            lo, hi = self.pt_lo[node_id], self.pt_hi[node_id]
+            # 点到节点包围盒的最近/最远距离
+            near = np.maximum(np.maximum(lo - center, center - hi), 0.0)
+            far = np.maximum(np.abs(lo - center), np.abs(hi - center))
+            near2 = float(near @ near)
+            far2 = float(far @ far)
+            if near2 > r_max2 or far2 < r_min2:
+                continue
+            if near2 >= r_min2 and far2 <= r_max2:
+                # 整个节点都在壳层内
+                self._collect(node_id, out)
+            elif self.left[node_id] < 0:
+                s, c = self.start[node_id], self.count[node_id]
+                idx = self.order[s:s + c]
+                d2 = ((self.points[idx] - center) ** 2).sum(axis=1)
+                out.append(idx[(d2 >= r_min2) & (d2 <= r_max2)])
+            else:
+                stack.append(int(self.right[node_id]))
+                stack.append(int(self.left[node_id]))
+
+        return np.concatenate(out) if out else np.zeros(0, dtype=np.int64)
+
+    def query_frustum(self, planes):
+        """AABB 未被任何平面完全排除的物体索引"""
+        if len(self.points) == 0:
+            return np.zeros(0, dtype=np.int64)
+        planes = np.asarray(planes, dtype=np.float64)
+        normals, offsets = planes[:, :3], planes[:, 3]
+        positive = normals > 0
+
+        out = []
+        stack = [0]
+        while stack:
+            node_id = stack.pop()
+            lo, hi = self.node_lo[node_id], self.node_hi[node_id]
+            # p-vertex (法线方向最远的角点) 在平面外侧则整个节点在外
+            p_vert = np.where(positive, hi, lo)
+            if np.any((normals * p_vert).sum(axis=1) + offsets < 0):
+                continue
+            if self.left[node_id] < 0:
+                s, c = self.start[node_id], self.count[node_id]
+                idx = self.order[s:s + c]
+                p = np.where(positive[None], self.box_hi[idx, None, :], self.box_lo[idx, None, :])
+                inside = ((normals[None] * p).sum(axis=2) + offsets[None] >= 0).all(axis=1)
+                out.append(idx[inside])
+            else:
+                stack.append(int(self.right[node_id]))
+                stack.append(int(self.left[node_id]))
+
+        return np.concatenate(out) if out else np.zeros(0, dtype=np.int64)
+
+    def query_crossings(self, center, prev_center, thresholds, margins=None):
+        """
+        相机从 prev_center 移动到 center 后，代表点距离可能跨越 thresholds 中
+        某个阈值的物体 (候选集，调用方需再精确判定)。
+        由三角不等式，距离变化不超过相机位移 δ，因此只需查询 [d-δ, d+δ] 壳层；
+        带滞回带 m 时实际阈值为 d±m，查询 [d-m-δ, d+m+δ]。
+        """
+        delta = float(np.linalg.norm(np.asarray(center) - np.asarray(prev_center)))
+        if delta == 0.0:
+            return np.zeros(0, dtype=np.int64)
+        if margins is None:
+            margins = [0.0] * len(thresholds)
+        parts = [self.query_shell(center, d - m - delta, d + m + delta) for d, m in zip(thresholds, margins)]
+        return np.unique(np.concatenate(parts)) if parts else np.zeros(0, dtype=np.int64)
@@ -0,0 +1,188 @@
+# File Path: .\texture_cache.py
+
+import os
+import time
+import sqlite3
+import hashlib
+
+try:
+    from . import fast_copy
+except ImportError:
+    # worker.py 以脚本方式运行时按顶层模块导入
+    import fast_copy
+
+# 注意：本模块不依赖 bpy，主线程 (Blender) 与 worker.py 子进程都会导入它
+
+INDEX_NAME = "index.sqlite"
+HASH_CHUNK = 1024 * 1024
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS sources (
+    path  TEXT PRIMARY KEY,
+    mtime REAL NOT NULL,
+    size  INTEGER NOT NULL,
+    hash  TEXT NOT NULL
+);
+CREATE TABLE IF NOT EXISTS entries (
+    key         TEXT PRIMARY KEY,
+    relpath     TEXT NOT NULL,
+    bytes       INTEGER NOT NULL,
+    last_access REAL NOT NULL
+);
+CREATE INDEX IF NOT EXISTS entries_lru ON entries (last_access);
+"""
+
+
+def hash_file(path):
+    """计算文件内容哈希 (blake2b, 分块读取)"""
+    h = hashlib.blake2b(digest_size=20)
+    with open(path, "rb") as f:
+        for chunk in iter(lambda: f.read(HASH_CHUNK), b""):
+            h.update(chunk)
+    return h.hexdigest()
+
+
+def make_key(src_hash, target_size, settings):
+    """缓存键 = 源内容哈希 + 目标尺寸 + 缩放设置"""
+    raw = f"{src_hash}|{int(target_size)}|{settings}"
+    return hashlib.sha1(raw.encode("utf-8")).hexdigest()
+
+
+class TextureCache:
+    """
+    内容寻址的跨项目贴图缓存。
+    - 文件按缓存键存放在 cache_dir/<key[:2]>/<key><ext>
+    - SQLite 索引记录条目大小与最近访问时间，超出上限时按 LRU 淘汰
+    - 源文件哈希按 (path, mtime, size) 记忆，重复查询只需一次 stat
+    """
+
+    def __init__(self, cache_dir, max_bytes):
+        self.cache_dir = cache_dir
+        self.max_bytes = max_bytes
+        os.makedirs(cache_dir, exist_ok=True)
+        # 多个 worker 进程会同时写入，WAL + busy timeout 保证并发安全
+        self.conn = sqlite3.connect(os.path.join(cache_dir, INDEX_NAME), timeout=30)
+        self.conn.execute("PRAGMA journal_mode=WAL")
+        self.conn.executescript(SCHEMA)
+        self.conn.commit()
+
+    # ------------------------------------------------------------------
+    # 源文件哈希
+    # ------------------------------------------------------------------
+    def source_hash(self, src_path, compute=True):
+        """
+        返回源文件内容哈希。compute=False 时只查记忆表 (不读文件)，未命中返回 None。
+        """
+        try:
+            st = os.stat(src_path)
+        except OSError:
+            return None
+        key_path = os.path.normcase(os.path.abspath(src_path))
+
+        row = self.conn.execute(
+            "SELECT hash FROM sources WHERE path=? AND mtime=? AND size=?",
+            (key_path, st.st_mtime, st.st_size),
+        ).fetchone()
+        if row:
+            return row[0]
+        if not compute:
+            return None
+
+        digest = hash_file(src_path)
+        with self.conn:
+            self.conn.execute(
+                "INSERT OR REPLACE INTO sources (path, mtime, size, hash) VALUES (?, ?, ?, ?)",
+                (key_path, st.st_mtime, st.st_size, digest),
+            )
+        return digest
+
+    # ------------------------------------------------------------------
+    # 查询 / 写入
+    # ------------------------------------------------------------------
+    def lookup(self, src_path, target_size, settings, compute_hash=True):
+        """返回缓存文件的绝对路径，未命中返回 None"""
+        src_hash = self.source_hash(src_path, compute=compute_hash)
+        if not src_hash:
+            return None
+        key = make_key(src_hash, target_size, settings)
+
+        row = self.conn.execute("SELECT relpath FROM entries WHERE key=?", (key,)).fetchone()
+        if not row:
+            return None
+
+        cached_path = os.path.join(self.cache_dir, row[0])
+        with self.conn:
+            if os.path.exists(cached_path):
+                self.conn.execute("UPDATE entries SET last_access=? WHERE key=?", (time.time(), key))
+            else:
+                # 文件被外部删除，清理索引
+                self.conn.execute("DELETE FROM entries WHERE key=?", (key,))
+                cached_path = None
+        return cached_path
+
+    def fetch(self, src_path, target_size, settings, dst_path, compute_hash=True):
+        """命中时把缓存文件复制到 dst_path 并返回 True"""
+        cached_path = self.lookup(src_path, target_size, settings, compute_hash)
+        if not cached_path:
+            return False
+        if os.path.normpath(cached_path) != os.path.normpath(dst_path):
+            fast_copy.clone_file(cached_path, dst_path)
+        return True
+
+    def store(self, src_path, target_size, settings, produced_path):
+        """把已生成的文件存入缓存，并按 LRU 淘汰超出上限的条目"""
+        src_hash = self.source_hash(src_path, compute=True)
+        if not src_hash or not os.path.exists(produced_path):
+            return
+        key = make_key(src_hash, target_size, settings)
+        ext = os.path.splitext(produced_path)[1].lower()
+        relpath = os.path.join(key[:2], key + ext)
+        cached_path = os.path.join(self.cache_dir, relpath)
+
+        if not os.path.exists(cached_path):
+            os.makedirs(os.path.dirname(cached_path), exist_ok=True)
+            # clone_file 先写临时文件再原子替换，避免其他进程读到半个文件
+            fast_copy.clone_file(produced_path, cached_path)
+
+        with self.conn:
+            self.conn.execute(
+                "INSERT OR REPLACE INTO entries (key, relpath, bytes, last_access) VALUES (?, ?, ?, ?)",
+                (key, relpath, os.path.getsize(cached_path), time.time()),
+            )
+        self.evict()
+
+    def evict(self):
+        """总大小超过 max_bytes 时，从最久未访问的条目开始删除"""
+        total = self.conn.execute("SELECT COALESCE(SUM(bytes), 0) FROM entries").fetchone()[0]
+        if total <= self.max_bytes:
+            return
+
+        rows = self.conn.execute(
+            "SELECT key, relpath, bytes FROM entries ORDER BY last_access ASC"
+        ).fetchall()
+        with self.conn:
+            for key, relpath, size in rows:
+                if total <= self.max_bytes:
+                    break
+                try:
+                    os.remove(os.path.join(self.cache_dir, relpath))
+                except OSError:
+                    pass
+                self.conn.execute("DELETE FROM entries WHERE key=?", (key,))
+                total -= size
+
+    def close(self):
+        self.conn.close()
+
+
+_caches = {}
+
+def get_cache(cache_dir, max_bytes):
+    """按目录复用 TextureCache 实例 (每个进程/线程一份连接)"""
+    cache_dir = os.path.abspath(cache_dir)
+    cache = _caches.get(cache_dir)
+    if cache is None:
+        cache = TextureCache(cache_dir, max_bytes)
+        _caches[cache_dir] = cache
+    cache.max_bytes = max_bytes
+    return cache
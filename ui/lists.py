@@ -20,6 +20,17 @@ class LOD_UL_ImageStats(bpy.types.UIList):
             elif item.packed_img == 2:
                 r.label(text="", icon='LINKED')
             
+            # 分辨率 (来自文件头)
+            if item.image_width:
+                res_text = f"{item.image_width}x{item.image_height}"
+                if item.image_tiles > 1:
+                    res_text += f" ×{item.image_tiles}"
+                r.label(text=res_text)
+
+            # 分辨率过剩 (相机最多只需要 required_size)
+            if item.over_resolved:
+                r.label(text=f"> {item.required_size}", icon='ERROR')
+
             # 大小
             r.label(text=f"{item.image_size} MB")
 
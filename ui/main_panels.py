@@ -2,6 +2,8 @@ import bpy
 import os
 from .. import AUTHOR_NAME
 from ..i18n import i18n
+from .. import scene_snapshot
+from ..operators import schedule
 
 class LOD_PT_MainPanel:
     bl_space_type = 'VIEW_3D'
@@ -111,6 +113,7 @@ class LOD_PT_ImageResizer(LOD_PT_MainPanel, bpy.types.Panel):
             # 翻译: 总计, 显存
             r.label(text=f"{i18n('Total')}: {scn.r_total_images}")
             r.label(text=f"{i18n('Mem')}: {scn.total_image_memory} MB")
+            box.prop(scn, "mem_include_mipmaps", text=i18n("Include Mipmaps"))
         
         layout.template_list("LOD_UL_ImageStats", "", scn, "image_list", scn, "custom_index_image_list", rows=5)
         
@@ -128,12 +131,28 @@ class LOD_PT_ImageResizer(LOD_PT_MainPanel, bpy.types.Panel):
         if scn.resize_size == 'c':
             # 翻译: 像素
             col.prop(scn, "custom_resize_size", text=i18n("Pixels"))
+        # 翻译: 缩放质量
+        col.prop(scn, "resize_quality", text=i18n("Quality"))
+        # 翻译: EXR 精度 / 压缩
+        row = col.row(align=True)
+        row.prop(scn, "float_depth", text=i18n("EXR"))
+        row.prop(scn, "exr_codec", text="")
+        # 翻译: 一次生成全部尺寸
+        col.prop(scn, "resize_pyramid", text=i18n("Generate All Sizes"))
             
         # 翻译: 安全模式 (另存副本)
         col.prop(scn, "duplicate_images", text=i18n("Safe Mode (Copy Files)"))
         if scn.duplicate_images and not scn.use_same_directory:
              # 翻译: 输出
              col.prop(scn, "custom_output_path", text=i18n("Output"))
+
+        # 翻译: 完成后统一切换
+        col.prop(scn, "defer_image_swaps", text=i18n("Swap When Finished"))
+        # 翻译: 共享贴图缓存
+        col.prop(scn, "use_texture_cache", text=i18n("Use Texture Cache"))
+        if scn.use_texture_cache:
+            col.prop(scn, "texture_cache_dir", text=i18n("Cache Folder"))
+            col.prop(scn, "texture_cache_max_gb", text=i18n("Cache Limit (GB)"))
              
         row = layout.row()
         row.scale_y = 1.4
@@ -147,6 +166,24 @@ class LOD_PT_ImageResizer(LOD_PT_MainPanel, bpy.types.Panel):
         col = box_cam.column(align=True)
         # 翻译: 基于屏幕占比自动计算尺寸
         col.label(text=i18n("Auto-calculate size based on screen coverage"), icon='INFO')
+        # 翻译: UV 纹素密度
+        row = col.row(align=True)
+        row.prop(scn, "cam_texel_density", text=i18n("Use UV Texel Density"))
+        row.operator("lod.find_over_resolved", text="", icon='VIEWZOOM')
+        # 翻译: 动画采样
+        row = col.row(align=True)
+        row.prop(scn, "cam_sample_animation", text=i18n("Sample Animation"))
+        sub = row.row(align=True)
+        sub.enabled = scn.cam_sample_animation
+        sub.prop(scn, "cam_sample_step", text=i18n("Step"))
+        # 翻译: 显存预算
+        row = col.row(align=True)
+        row.prop(scn, "cam_budget_enabled", text=i18n("Fit Memory Budget"))
+        sub = row.row(align=True)
+        sub.enabled = scn.cam_budget_enabled
+        sub.prop(scn, "cam_budget_gb", text=i18n("GB"))
+        # 翻译: 视觉优先
+        col.prop(scn, "cam_visual_priority", text=i18n("Visual Priority"))
         # 翻译: 运行相机优化
         col.operator("lod.optimize_by_camera", text=i18n("Run Camera Optimization"), icon='SHADING_RENDERED')
 
@@ -213,6 +250,35 @@ class LOD_PT_LODManager(LOD_PT_MainPanel, bpy.types.Panel):
         row.prop(scn, "lod_dist_0", text=i18n("High <"))
         row.prop(scn, "lod_dist_1", text=i18n("Mid <"))
         row.prop(scn, "lod_dist_2", text=i18n("Low <"))
+        # 翻译: 滞回带
+        row = col.row(align=True)
+        row.prop(scn, "lod_dist_hyst_0", text=i18n("± Band"))
+        row.prop(scn, "lod_dist_hyst_1", text=i18n("± Band"))
+        row.prop(scn, "lod_dist_hyst_2", text=i18n("± Band"))
+
+        # 翻译: 实时 LOD
+        row = layout.row(align=True)
+        row.prop(scn, "live_lod_enabled", text=i18n("Live LOD"), icon='PLAY', toggle=True)
+        sub = row.row(align=True)
+        sub.active = scn.live_lod_enabled
+        sub.prop(scn, "live_lod_budget_ms", text=i18n("Budget (ms)"))
+        sub.prop(scn, "lod_cooldown", text=i18n("Cooldown (s)"))
+
+        # 翻译: 烘焙 LOD 排程 (动画渲染)
+        row = layout.row(align=True)
+        row.operator("lod.bake_lod_schedule", text=i18n("Bake Schedule"), icon='RENDER_ANIMATION')
+        sub = row.row(align=True)
+        sub.enabled = schedule.SCHEDULE_KEY in context.scene
+        sub.prop(scn, "lod_schedule_enabled", text=i18n("Use"), toggle=True)
+        sub.operator("lod.clear_lod_schedule", text="", icon='X')
+
+        # 翻译: 被抑制的切换次数 (滞回 / 冷却)
+        applied, by_hyst, by_cooldown = scene_snapshot.get_transition_stats()
+        if by_hyst or by_cooldown:
+            layout.label(
+                text=f"{i18n('Suppressed')}: {by_hyst} ({i18n('Hysteresis')}) / {by_cooldown} ({i18n('Cooldown')}), {i18n('Applied')}: {applied}",
+                icon='INFO',
+            )
         
         layout.separator()
 
@@ -262,6 +328,7 @@ class LOD_PT_LODManager(LOD_PT_MainPanel, bpy.types.Panel):
             col = box.column(align=True)
             # 翻译: 最小面数保护
             col.prop(scn, "geo_lod_min_faces", text=i18n("Min Faces (Safety)"))
+            col.prop(scn, "geo_lod_hysteresis", text=i18n("Hysteresis"), slider=True)
             
             if scn.geo_lod_method == 'DECIMATE':
                 # 翻译: 最小比例保护
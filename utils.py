@@ -1,105 +1,254 @@
 import bpy
-from bpy_extras.object_utils import world_to_camera_view
-from mathutils import Vector
+import math
+import heapq
+import numpy as np
 
-def calculate_screen_coverage(scene, obj, camera):
+# 包围盒 8 个顶点之间的 12 条边 (Blender bound_box 顶点顺序)
+BBOX_EDGES = np.array([
+    (0, 1), (1, 2), (2, 3), (3, 0),
+    (4, 5), (5, 6), (6, 7), (7, 4),
+    (0, 4), (1, 5), (2, 6), (3, 7),
+])
+
+def get_camera_frame(scene, camera):
     """
-    计算物体在相机视角下的屏幕占比（像素宽度估算）。
-    返回: (max_width_pixels, is_visible)
+    相机视框参数 (与 world_to_camera_view 的计算方式一致)。
+    返回: (view_matrix 4x4, (min_x, max_x, min_y, max_y, depth), is_ortho, clip_start)
     """
-    if not camera or not obj:
-        return 0, False
+    cam_data = camera.data
+    frame = cam_data.view_frame(scene=scene)
+    view_matrix = np.array(camera.matrix_world.normalized().inverted(), dtype=np.float64)
+    frame_params = (frame[2].x, frame[1].x, frame[1].y, frame[0].y, -frame[0].z)
+    is_ortho = cam_data.type == 'ORTHO'
+    return view_matrix, frame_params, is_ortho, max(cam_data.clip_start, 1e-6)
+
+def get_frustum_planes(scene, camera):
+    """
+    相机视锥的 6 个世界空间平面 (6,4)，每行 (nx, ny, nz, d)，n·x + d >= 0 为内侧。
+    """
+    view_matrix, (min_x, max_x, min_y, max_y, depth), is_ortho, clip_start = get_camera_frame(scene, camera)
+    clip_end = camera.data.clip_end
+
+    # 相机空间 (看向 -Z)
+    if is_ortho:
+        planes = [
+            (1, 0, 0, -min_x), (-1, 0, 0, max_x),
+            (0, 1, 0, -min_y), (0, -1, 0, max_y),
+        ]
+    else:
+        planes = [
+            (1, 0, min_x / depth, 0), (-1, 0, -max_x / depth, 0),
+            (0, 1, min_y / depth, 0), (0, -1, -max_y / depth, 0),
+        ]
+    planes += [(0, 0, -1, -clip_start), (0, 0, 1, clip_end)]
+    planes = np.array(planes, dtype=np.float64)
+
+    # 变换到世界空间: n_cam·(R x + t) + d = (Rᵀ n_cam)·x + (n_cam·t + d)
+    rot, trans = view_matrix[:3, :3], view_matrix[:3, 3]
+    world = np.empty_like(planes)
+    world[:, :3] = planes[:, :3] @ rot
+    world[:, 3] = planes[:, :3] @ trans + planes[:, 3]
+    return world
+
+def compute_screen_coverage(matrices, bboxes, view_matrix, frame_params, is_ortho, clip_start, real_x, real_y):
+    """
+    向量化的屏幕占比计算 (一次处理 N 个物体)。
+    matrices: (N,4,4) 世界矩阵; bboxes: (N,8,3) 局部包围盒
+    返回: (pixels (N,), visible (N,))
+
+    近裁剪面处理：跨越近裁剪面的包围盒，会把 12 条边与裁剪面的交点也加入投影，
+    而不是简单丢弃相机背后的顶点 (否则贴近相机的大物体会被严重低估)。
+    """
+    n = len(matrices)
+    if n == 0:
+        return np.zeros(0), np.zeros(0, dtype=bool)
+
+    # 1. 局部 -> 相机空间: (V @ M) @ [x, y, z, 1]
+    to_cam = np.einsum('ij,njk->nik', view_matrix, matrices)
+    cam_pts = np.einsum('nij,nkj->nki', to_cam[:, :3, :3], bboxes) + to_cam[:, None, :3, 3]
+    depth = -cam_pts[..., 2]
+
+    # 2. 与近裁剪面的交点
+    d0 = depth[:, BBOX_EDGES[:, 0]]
+    d1 = depth[:, BBOX_EDGES[:, 1]]
+    crossing = (d0 >= clip_start) != (d1 >= clip_start)
+    with np.errstate(divide='ignore', invalid='ignore'):
+        t = np.where(crossing, (clip_start - d0) / (d1 - d0), 0.0)
+    p0 = cam_pts[:, BBOX_EDGES[:, 0]]
+    p1 = cam_pts[:, BBOX_EDGES[:, 1]]
+    cut_pts = p0 + t[..., None] * (p1 - p0)
+
+    points = np.concatenate([cam_pts, cut_pts], axis=1)
+    valid = np.concatenate([depth >= clip_start, crossing], axis=1)
+    z = np.maximum(-points[..., 2], clip_start)
+
+    # 3. 投影到 0~1 屏幕空间
+    min_x, max_x, min_y, max_y, frame_depth = frame_params
+    if is_ortho:
+        px, py = points[..., 0], points[..., 1]
+    else:
+        px = points[..., 0] * frame_depth / z
+        py = points[..., 1] * frame_depth / z
+    sx = (px - min_x) / (max_x - min_x)
+    sy = (py - min_y) / (max_y - min_y)
+
+    lo_x = np.where(valid, sx, np.inf).min(axis=1)
+    hi_x = np.where(valid, sx, -np.inf).max(axis=1)
+    lo_y = np.where(valid, sy, np.inf).min(axis=1)
+    hi_y = np.where(valid, sy, -np.inf).max(axis=1)
+
+    # 4. 可见性：至少有一点在近裁剪面前，且 2D 包围盒与画面相交
+    visible = valid.any(axis=1) & (hi_x >= 0) & (lo_x <= 1) & (hi_y >= 0) & (lo_y <= 1)
+
+    width = np.where(visible, hi_x - lo_x, 0.0)
+    height = np.where(visible, hi_y - lo_y, 0.0)
+    pixels = np.maximum(width * real_x, height * real_y)
+    return np.where(visible, pixels, 0.0), visible
+
+def gather_object_arrays(objects):
+    """把物体的世界矩阵与局部包围盒打包成 (N,4,4) / (N,8,3) 数组"""
+    n = len(objects)
+    matrices = np.empty((n, 4, 4), dtype=np.float64)
+    bboxes = np.empty((n, 8, 3), dtype=np.float64)
+    for i, obj in enumerate(objects):
+        matrices[i] = obj.matrix_world
+        bboxes[i] = obj.bound_box
+    return matrices, bboxes
+
+def batch_screen_coverage(scene, objects, camera, matrices=None, bboxes=None):
+    """
+    批量计算物体在相机视角下的屏幕占比。
+    已有数组 (例如来自场景快照) 时可直接传入 matrices / bboxes，此时 objects 可为 None。
+    返回: (pixels, visible, ratio) 三个长度为 N 的数组
+      pixels  - 屏幕最长边像素
+      visible - 是否可见
+      ratio   - 归一化占比 (0.0 ~ 1.0)
+    """
+    n = len(objects) if matrices is None else len(matrices)
+    if not camera or n == 0:
+        return np.zeros(n), np.zeros(n, dtype=bool), np.zeros(n)
+
+    if matrices is None or bboxes is None:
+        matrices, bboxes = gather_object_arrays(objects)
 
     # 获取渲染分辨率
     render = scene.render
-    res_x = render.resolution_x
-    res_y = render.resolution_y
     scale = render.resolution_percentage / 100.0
-    
-    real_x = res_x * scale
-    real_y = res_y * scale
-    
-    # 获取物体包围盒的 8 个顶点（世界坐标）
-    bbox_corners = [obj.matrix_world @ Vector(corner) for corner in obj.bound_box]
-    
-    min_x, max_x = 1.0, 0.0
-    min_y, max_y = 1.0, 0.0
-    in_front = False
+    real_x = render.resolution_x * scale
+    real_y = render.resolution_y * scale
 
-    # 将所有顶点投影到 2D 屏幕空间 (0.0 ~ 1.0)
-    for corner in bbox_corners:
-        co_2d = world_to_camera_view(scene, camera, corner)
-        
-        # co_2d.z 是深度，负数表示在相机背后
-        if co_2d.z > 0:
-            in_front = True
-            min_x = min(min_x, co_2d.x)
-            max_x = max(max_x, co_2d.x)
-            min_y = min(min_y, co_2d.y)
-            max_y = max(max_y, co_2d.y)
-    
-    # 如果所有点都在相机背后，或者物体在视野外
-    if not in_front:
-        return 0, False
-        
-    # 计算 2D 包围盒的宽高
-    width = max(0.0, max_x - min_x)
-    height = max(0.0, max_y - min_y)
-    
-    # 简单的视锥剔除：如果完全在画面外 (比如 x > 1 或 x < 0)
-    # 这里做个宽松判断，因为 min_x 可能 < 0 但 max_x > 0 (跨越边界)
-    if max_x < 0 or min_x > 1 or max_y < 0 or min_y > 1:
-        # 虽然在相机前方，但在视锥体外面
-        return 0, False
+    view_matrix, frame_params, is_ortho, clip_start = get_camera_frame(scene, camera)
+    pixels, visible = compute_screen_coverage(
+        matrices, bboxes, view_matrix, frame_params, is_ortho, clip_start, real_x, real_y
+    )
 
-    # 转换为像素值
-    pixel_width = width * real_x
-    pixel_height = height * real_y
-    
-    # 取最长边作为分辨率参考
-    return max(pixel_width, pixel_height), True
+    # 取屏幕长宽的最大值作为分母
+    max_screen_res = max(render.resolution_x, render.resolution_y)
+    if max_screen_res == 0:
+        ratio = np.zeros(n)
+    else:
+        ratio = np.minimum(pixels / max_screen_res, 1.0)
+    return pixels, visible, ratio
+
+def calculate_screen_coverage(scene, obj, camera):
+    """
+    计算物体在相机视角下的屏幕占比（像素宽度估算）。
+    返回: (max_width_pixels, is_visible)
+    批量场景请直接使用 batch_screen_coverage。
+    """
+    if not camera or not obj:
+        return 0, False
+    pixels, visible, _ = batch_screen_coverage(scene, [obj], camera)
+    return float(pixels[0]), bool(visible[0])
 
 def get_normalized_screen_ratio(scene, obj, camera):
     """
     获取归一化的屏幕占比 (0.0 ~ 1.0)
     Ratio = 物体屏幕最长边像素 / 屏幕渲染长边像素
     """
-    pixels, visible = calculate_screen_coverage(scene, obj, camera)
-    if not visible:
+    if not camera or not obj:
         return 0.0
-    
-    render = scene.render
-    # 取屏幕长宽的最大值作为分母
-    max_screen_res = max(render.resolution_x, render.resolution_y)
-    
-    if max_screen_res == 0: return 0.0
-    
-    return min(pixels / max_screen_res, 1.0)
+    _, _, ratio = batch_screen_coverage(scene, [obj], camera)
+    return float(ratio[0])
+
+# LOD 阶梯表: (屏幕占比下限, Factor)，按占比从高到低排列
+LOD_STEPS = (
+    (0.8, 1.0),     # 极高
+    (0.5, 0.7),     # 高
+    (0.2, 0.4),     # 中
+    (0.05, 0.1),    # 低
+)
+LOD_FLOOR_FACTOR = 0.01  # 极低 (或者 0.0，视情况而定)
 
 def get_stepped_lod_factor(raw_ratio, min_protection=0.01):
     """
     LOD 阶梯映射策略
     根据设计方案将连续的 Ratio 离散化为固定的 Factor
     """
-    target_factor = 1.0
-    
-    # 阶梯表
-    if raw_ratio > 0.8:     # 极高
-        target_factor = 1.0
-    elif raw_ratio > 0.5:   # 高
-        target_factor = 0.7
-    elif raw_ratio > 0.2:   # 中
-        target_factor = 0.4
-    elif raw_ratio > 0.05:  # 低
-        target_factor = 0.1
-    else:                   # 极低
-        target_factor = 0.01 # 或者 0.0，视情况而定
+    target_factor = LOD_FLOOR_FACTOR
+    for threshold, factor in LOD_STEPS:
+        if raw_ratio > threshold:
+            target_factor = factor
+            break
         
     # 应用最小保护值 (Min Ratio)
     # 如果计算出的 target_factor 比用户设置的底限还要低，则提升至底限
     # 但如果 target_factor 本来就是 1.0 (全屏)，则不需要降低
     return max(target_factor, min_protection)
 
+# 各阶梯对应的 Factor (step 0 = 极高 ... step 4 = 极低)
+LOD_STEP_FACTORS = np.array([factor for _, factor in LOD_STEPS] + [LOD_FLOOR_FACTOR])
+LOD_STEP_THRESHOLDS = np.array([threshold for threshold, _ in LOD_STEPS])
+
+def get_lod_steps(raw_ratios, prev_steps=None, margin=0.0):
+    """
+    屏幕占比 -> 阶梯编号 (0 = 极高 ... 4 = 极低)，支持滞回带。
+    prev_steps 为上一次生效的阶梯 (-1 表示未知)：
+      已经越过的阈值 t，占比需回升到 t*(1+margin) 以上才会升级；
+      尚未越过的阈值 t，占比需降到 t*(1-margin) 以下才会降级。
+    """
+    raw_ratios = np.asarray(raw_ratios, dtype=np.float64)
+    t = LOD_STEP_THRESHOLDS[None, :]
+    if prev_steps is None or margin <= 0.0:
+        eff = np.broadcast_to(t, (len(raw_ratios), t.shape[1]))
+    else:
+        crossed = np.arange(t.shape[1])[None, :] < np.asarray(prev_steps)[:, None]
+        eff = np.where(crossed, t * (1.0 + margin), t * (1.0 - margin))
+        # 未知状态不使用滞回
+        eff = np.where(np.asarray(prev_steps)[:, None] < 0, t, eff)
+    return (raw_ratios[:, None] <= eff).sum(axis=1)
+
+def get_step_factors(steps, min_protection=0.01):
+    """阶梯编号 -> Factor (应用最小保护值)"""
+    return np.maximum(LOD_STEP_FACTORS[np.asarray(steps, dtype=np.int64)], min_protection)
+
+def get_stepped_lod_factors(raw_ratios, min_protection=0.01):
+    """get_stepped_lod_factor 的向量化版本 (输入/输出为 NumPy 数组)"""
+    return get_step_factors(get_lod_steps(raw_ratios), min_protection)
+
+def get_distance_levels(dists, thresholds, margins=None, prev_levels=None):
+    """
+    距离 -> Level (越过的阈值个数，thresholds 升序)，支持滞回带。
+    margins 为每个阈值的滞回宽度 (与距离同单位)：
+      已经越过的阈值 d，需回到 d - margin 以内才会降回；
+      尚未越过的阈值 d，需超过 d + margin 才会越过。
+    """
+    dists = np.asarray(dists, dtype=np.float64)
+    d = np.asarray(thresholds, dtype=np.float64)[None, :]
+    if prev_levels is None or margins is None:
+        eff = np.broadcast_to(d, (len(dists), d.shape[1]))
+    else:
+        m = np.asarray(margins, dtype=np.float64)[None, :]
+        prev = np.asarray(prev_levels)[:, None]
+        crossed = np.arange(d.shape[1])[None, :] < prev
+        eff = np.where(crossed, d - m, d + m)
+        eff = np.where(prev < 0, d, eff)
+    return (dists[:, None] > eff).sum(axis=1)
+
+def get_distance_margins(scn):
+    """三个距离阈值各自的滞回宽度 (米)"""
+    return (scn.lod_dist_hyst_0, scn.lod_dist_hyst_1, scn.lod_dist_hyst_2)
+
 def get_collection_vertex_count(collection):
     """递归计算集合内所有 Mesh 对象的顶点总数"""
     total_verts = 0
@@ -109,23 +258,138 @@ def get_collection_vertex_count(collection):
             total_verts += len(obj.data.vertices)
     return total_verts
 
-def get_image_size_str(image):
+def get_mip_chain_pixels(width, height):
+    """完整 mip 链的像素总数 (每级宽高减半，直到 1x1)"""
+    total = 0
+    w, h = max(1, int(width)), max(1, int(height))
+    while True:
+        total += w * h
+        if w == 1 and h == 1:
+            break
+        w, h = max(1, w // 2), max(1, h // 2)
+    return total
+
+def estimate_image_memory_bytes(width, height, channels=4, is_float=False, bit_depth=8, mipmaps=True, tiles=1):
+    """
+    估算一张图在 Blender 中占用的内存 (字节)。
+    - 8bit 图片使用 byte buffer，Blender 内部固定为 RGBA (4 bytes/px)
+    - float 图片 (EXR/HDR) 以及 16bit PNG/TIFF 使用 float buffer，按实际通道数 * 4 bytes
+    - mipmaps: 计入 GPU mip 链 (约 +1/3)
+    - tiles: UDIM 图块数量 (每块按相同尺寸估算)
+    """
+    if width <= 0 or height <= 0:
+        return 0
+
+    if is_float or bit_depth > 8:
+        bytes_per_pixel = min(max(int(channels), 1), 4) * 4
+    else:
+        bytes_per_pixel = 4
+
+    if mipmaps:
+        pixels = get_mip_chain_pixels(width, height)
+    else:
+        pixels = int(width) * int(height)
+    return pixels * bytes_per_pixel * max(int(tiles), 1)
+
+def estimate_image_memory_mb(width, height, channels=4, is_float=False, bit_depth=8, mipmaps=True, tiles=1):
+    """根据宽高/通道/位深估算图片内存 (MB)"""
+    bytes_size = estimate_image_memory_bytes(width, height, channels, is_float, bit_depth, mipmaps, tiles)
+    return bytes_size / (1024 * 1024)
+
+def get_image_size_str(image, mipmaps=True):
     """估算图片占用的内存大小 (MB)"""
     if not image:
         return "0.00"
     
     try:
-        width = image.size[0]
-        height = image.size[1]
-        # 估算：宽 * 高 * 4通道 (RGBA) * 深度 (通常 32bit float 或 8bit byte)
-        # 这里简化按未压缩的 RGBA 8bit 估算，或者 32bit float
-        # Blender 内部通常是 32bit float (4 bytes per channel)
-        bytes_size = width * height * 4 * 4 
-        size_mb = bytes_size / (1024 * 1024)
+        # 注意：读取 image.size 会让 Blender 加载整张图的像素
+        tiles = len(image.tiles) if image.source == 'TILED' else 1
+        size_mb = estimate_image_memory_mb(
+            image.size[0], image.size[1],
+            channels=image.channels,
+            is_float=image.is_float,
+            mipmaps=mipmaps,
+            tiles=tiles,
+        )
         return f"{size_mb:.2f}"
     except:
         return "0.00"
 
+def fit_image_size(width, height, target_size):
+    """按长边等比缩放到 target_size (不放大)"""
+    longest = max(width, height)
+    if longest <= target_size or longest <= 0:
+        return width, height
+    ratio = target_size / longest
+    return max(1, int(width * ratio)), max(1, int(height * ratio))
+
+def solve_texture_budget(items, budget_bytes, min_size=32, mipmaps=True):
+    """
+    显存预算求解：在总内存不超过 budget_bytes 的前提下，为每张图挑选目标分辨率。
+    items: [{"key", "width", "height", "channels", "is_float", "bit_depth", "tiles",
+             "required": 屏幕所需像素, "weight": 屏幕重要性 0~1, "max_size": 可选上限}, ...]
+    返回: ({key: target_size}, total_bytes)
+
+    贪心策略：每次对 “单位节省内存的画质损失” 最小的图片降一级 (尺寸减半)。
+    尺寸仍高于屏幕所需像素时降级没有损失，会被最先执行；
+    之后的损失按 重要性 * 低于需求的级数 计算，屏幕占比越大的贴图越晚被降级。
+    """
+    def cost(item, size):
+        w, h = fit_image_size(item["width"], item["height"], size)
+        return estimate_image_memory_bytes(
+            w, h, item.get("channels", 4), item.get("is_float", False),
+            item.get("bit_depth", 8), mipmaps, item.get("tiles", 1),
+        )
+
+    def deficit(item, size):
+        # 低于屏幕需求的 “级数” (log2)，够用时为 0
+        required = max(item.get("required", 0), 1)
+        if size >= required:
+            return 0.0
+        return math.log2(required / size)
+
+    sizes = {}
+    costs = {}
+    heap = []
+    total = 0
+
+    def push(idx):
+        item = items[idx]
+        size = sizes[idx]
+        if size // 2 < min_size:
+            return
+        saved = costs[idx] - cost(item, size // 2)
+        if saved <= 0:
+            return
+        weight = max(item.get("weight", 0.0), 0.0) + 1e-6
+        loss = weight * (deficit(item, size // 2) - deficit(item, size))
+        # 损失相同时优先节省更多内存的降级
+        heapq.heappush(heap, (loss / saved, -saved, idx))
+
+    for idx, item in enumerate(items):
+        native = max(item["width"], item["height"], 1)
+        # 起始尺寸：原图尺寸向上取 2 的幂 (与 Camera Optimization 的分级一致)
+        # max_size 可限制起点 (例如相机分析已经算出的目标尺寸)
+        size = 1 << max(int(math.ceil(math.log2(native))), 0)
+        if item.get("max_size"):
+            size = min(size, item["max_size"])
+        sizes[idx] = max(size, min_size)
+        costs[idx] = cost(item, sizes[idx])
+        total += costs[idx]
+        push(idx)
+
+    while total > budget_bytes and heap:
+        _, _, idx = heapq.heappop(heap)
+        item = items[idx]
+        new_size = sizes[idx] // 2
+        new_cost = cost(item, new_size)
+        total -= costs[idx] - new_cost
+        sizes[idx] = new_size
+        costs[idx] = new_cost
+        push(idx)
+
+    return {items[idx]["key"]: size for idx, size in sizes.items()}, total
+
 def format_large_number(num):
     """将大数字格式化为 K/M 后缀"""
     if num >= 1000000:
@@ -137,6 +401,157 @@ def format_large_number(num):
     
     # ... (保留原有的引用和函数) ...
 
+def _mesh_uv_triangles(mesh, matrix3):
+    """
+    网格扇形三角化后每个三角形的 (材质索引, 世界面积, UV 面积, UV 重心)。
+    顶点 / 循环 / UV / 面数据用 foreach_get 批量读取；没有面或 UV 时返回 None。
+    """
+    n_loops, n_polys = len(mesh.loops), len(mesh.polygons)
+    if not n_polys or not len(mesh.uv_layers):
+        return None
+    uv_layer = next((layer for layer in mesh.uv_layers if layer.active_render), mesh.uv_layers.active)
+
+    co = np.empty(len(mesh.vertices) * 3, dtype=np.float32)
+    mesh.vertices.foreach_get("co", co)
+    co = co.reshape(-1, 3).astype(np.float64) @ np.asarray(matrix3, dtype=np.float64).T
+    vert_index = np.empty(n_loops, dtype=np.int32)
+    mesh.loops.foreach_get("vertex_index", vert_index)
+    uv = np.empty(n_loops * 2, dtype=np.float32)
+    uv_layer.data.foreach_get("uv", uv)
+    uv = uv.reshape(-1, 2).astype(np.float64)
+
+    starts = np.empty(n_polys, dtype=np.int32)
+    totals = np.empty(n_polys, dtype=np.int32)
+    mat_index = np.empty(n_polys, dtype=np.int32)
+    mesh.polygons.foreach_get("loop_start", starts)
+    mesh.polygons.foreach_get("loop_total", totals)
+    mesh.polygons.foreach_get("material_index", mat_index)
+
+    # 每个循环所属的面，扇形三角形 (first, k, k+1)
+    order = np.argsort(starts, kind='stable')
+    poly = np.repeat(order, totals[order])
+    first = starts[poly]
+    loop = np.arange(len(poly))
+    inner = (loop > first) & (loop < first + totals[poly] - 1)
+    a, b = first[inner], loop[inner]
+    c = b + 1
+
+    p = co[vert_index]
+    world_area = 0.5 * np.linalg.norm(np.cross(p[b] - p[a], p[c] - p[a]), axis=1)
+    e1, e2 = uv[b] - uv[a], uv[c] - uv[a]
+    uv_area = 0.5 * np.abs(e1[:, 0] * e2[:, 1] - e1[:, 1] * e2[:, 0])
+    uv_center = (uv[a] + uv[b] + uv[c]) / 3.0
+    return mat_index[poly[inner]], world_area, uv_area, uv_center
+
+def get_mesh_uv_ratios(mesh, matrix3):
+    """
+    按材质索引统计 UV 面积 / 世界面积，开方后即每世界单位跨越的 UV 长度。
+    matrix3: 物体世界矩阵的 3x3 部分 (世界面积包含缩放)。
+    返回 {材质索引: 比值}，没有 UV 或面积为 0 的材质不包含在内。
+    """
+    tris = _mesh_uv_triangles(mesh, matrix3)
+    if tris is None:
+        return {}
+    tri_mat, world_area, uv_area, _ = tris
+    world_sum = np.bincount(tri_mat, world_area)
+    uv_sum = np.bincount(tri_mat, uv_area, minlength=len(world_sum))
+    valid = (world_sum > 0) & (uv_sum > 0)
+    return {int(i): float(np.sqrt(uv_sum[i] / world_sum[i])) for i in np.flatnonzero(valid)}
+
+def get_mesh_tile_ratios(mesh, matrix3):
+    """
+    同 get_mesh_uv_ratios，但按 (材质索引, UDIM 图块编号) 分别统计。
+    三角形按 UV 重心所在的图块归类 (1001 + u + 10 * v)，返回 {(材质索引, 图块编号): 比值}。
+    """
+    tris = _mesh_uv_triangles(mesh, matrix3)
+    if tris is None:
+        return {}
+    tri_mat, world_area, uv_area, uv_center = tris
+    cell = np.floor(uv_center).astype(np.int64)
+    inside = (cell[:, 0] >= 0) & (cell[:, 0] < 10) & (cell[:, 1] >= 0)
+    tile = 1001 + cell[:, 0] + 10 * cell[:, 1]
+
+    keys, inverse = np.unique(np.stack([tri_mat[inside], tile[inside]], axis=1), axis=0, return_inverse=True)
+    inverse = inverse.ravel()
+    world_sum = np.bincount(inverse, world_area[inside], minlength=len(keys))
+    uv_sum = np.bincount(inverse, uv_area[inside], minlength=len(keys))
+    valid = (world_sum > 0) & (uv_sum > 0)
+    return {
+        (int(keys[i, 0]), int(keys[i, 1])): float(np.sqrt(uv_sum[i] / world_sum[i]))
+        for i in np.flatnonzero(valid)
+    }
+
+def get_uv_densities(obj, cache=None):
+    """
+    物体每个材质的 UV 密度 (每世界单位跨越的 UV 长度)，返回 {材质名: 密度}。
+    cache 以 (网格名, 变换) 为键，在一次分析中复用共享网格的结果。
+    同一材质出现在多个槽位时取较小的密度 (对应更高的需求分辨率)。
+    """
+    mesh = obj.data
+    if obj.type != 'MESH' or mesh is None:
+        return {}
+    matrix3 = np.array(obj.matrix_world, dtype=np.float64)[:3, :3]
+    key = (mesh.name, tuple(np.round(matrix3, 6).ravel().tolist()))
+    ratios = cache.get(key) if cache is not None else None
+    if ratios is None:
+        ratios = get_mesh_uv_ratios(mesh, matrix3)
+        if cache is not None:
+            cache[key] = ratios
+
+    densities = {}
+    slots = obj.material_slots
+    for index, ratio in ratios.items():
+        if index < len(slots) and slots[index].material:
+            name = slots[index].material.name
+            densities[name] = min(densities.get(name, ratio), ratio)
+    return densities
+
+def get_uv_tile_densities(obj, cache=None):
+    """
+    物体每个材质在每个 UDIM 图块上的 UV 密度，返回 {材质名: {图块编号: 密度}}。
+    cache 与 get_uv_densities 共用 (键带 'TILES' 前缀)。
+    """
+    mesh = obj.data
+    if obj.type != 'MESH' or mesh is None:
+        return {}
+    matrix3 = np.array(obj.matrix_world, dtype=np.float64)[:3, :3]
+    key = ('TILES', mesh.name, tuple(np.round(matrix3, 6).ravel().tolist()))
+    ratios = cache.get(key) if cache is not None else None
+    if ratios is None:
+        ratios = get_mesh_tile_ratios(mesh, matrix3)
+        if cache is not None:
+            cache[key] = ratios
+
+    densities = {}
+    slots = obj.material_slots
+    for (index, tile), ratio in ratios.items():
+        if index < len(slots) and slots[index].material:
+            tiles = densities.setdefault(slots[index].material.name, {})
+            tiles[tile] = min(tiles.get(tile, ratio), ratio)
+    return densities
+
+def is_static_transform(obj):
+    """世界矩阵不随帧变化 (无动画/驱动、约束、刚体，且父级同样静止)"""
+    while obj is not None:
+        if obj.animation_data or len(obj.constraints) or obj.rigid_body:
+            return False
+        obj = obj.parent
+    return True
+
+def get_shot_camera(scene, scn):
+    """
+    逐帧采样 (动画覆盖率 / 排程烘焙) 使用的相机：时间线标记切换的是 scene.camera，
+    因此优先使用它；场景没有相机时才回退到 LOD Camera。
+    """
+    return scene.camera or scn.lod_camera
+
+def get_camera_switch_frames(scene, frame_start, frame_end):
+    """帧范围内由时间线标记绑定的相机切换帧"""
+    return sorted({
+        m.frame for m in scene.timeline_markers
+        if m.camera and frame_start <= m.frame <= frame_end
+    })
+
 def get_instance_sources(scene):
     """
     扫描场景，找出所有被用作“实例源”的物体。
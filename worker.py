@@ -1,97 +1,920 @@
 # File Path: .\worker.py
 
+import io
 import sys
 import os
+import json
+import time
 import argparse
 import shutil
 
 # 尝试导入 Pillow
 try:
-    from PIL import Image
+    from PIL import Image, ImageFile
     HAS_PIL = True
 except ImportError:
     HAS_PIL = False
 
+# 共享内存像素传输 (SHARED 任务)
+try:
+    import numpy as np
+except ImportError:
+    np = None
+try:
+    from multiprocessing import shared_memory
+except ImportError:
+    shared_memory = None
+
+# 内容寻址缓存 (与 worker.py 位于同一目录)
+try:
+    import texture_cache
+except ImportError:
+    texture_cache = None
+# reflink 复制 (写出前断开旧的硬链接)
+try:
+    import fast_copy
+except ImportError:
+    fast_copy = None
+
+# 文件头解析 (浮点贴图缓存命中时读取尺寸)
+try:
+    import image_meta
+except ImportError:
+    image_meta = None
+
+
+def _file_size(path):
+    try:
+        return os.path.getsize(path)
+    except OSError:
+        return 0
+
+
+def copy_file(src_path, dst_path):
+    """无需缩放时的复制：优先 reflink (写时复制文件系统上不占额外磁盘)"""
+    if os.path.normpath(src_path) == os.path.normpath(dst_path):
+        return
+    if fast_copy is not None:
+        fast_copy.clone_file(src_path, dst_path)
+    else:
+        shutil.copy2(src_path, dst_path)
+
+
+def prepare_write(dst_path):
+    """原地写出前断开硬链接，避免改写到原图"""
+    if fast_copy is not None:
+        fast_copy.break_link(dst_path)
+
+
+def save_image(img, dst_path, fp=None):
+    """按扩展名保存 (JPG 去透明, PNG 优化)；给定 fp 时按 dst_path 的扩展名编码写入 fp"""
+    ext = os.path.splitext(dst_path)[1].lower()
+    target = dst_path if fp is None else fp
+    if fp is None:
+        prepare_write(dst_path)
+    fmt = None if fp is None else Image.registered_extensions().get(ext, "PNG")
+    if ext in ('.jpg', '.jpeg'):
+        # JPG 不支持透明，转 RGB 并加白底 (防止透明变黑)
+        if img.mode in ('RGBA', 'LA'):
+            background = Image.new('RGB', img.size, (255, 255, 255))
+            background.paste(img, mask=img.split()[-1])
+            img = background
+        elif img.mode != 'RGB':
+            img = img.convert('RGB')
+
+        img.save(target, format=fmt, quality=95, optimize=True)
+
+    elif ext == '.png':
+        img.save(target, format=fmt, optimize=True)
+
+    else:
+        # 其他格式 (bmp, tiff etc)
+        img.save(target, format=fmt)
+
+
+def open_cache(job):
+    """根据 job["cache"] 打开共享缓存，未启用时返回 (None, None)"""
+    info = job.get("cache")
+    if not info or texture_cache is None:
+        return None, None
+    try:
+        cache = texture_cache.get_cache(info["dir"], info["max_bytes"])
+    except Exception as e:
+        print(f"LODify cache unavailable: {e}", file=sys.stderr)
+        return None, None
+    return cache, info
+
+
+def cache_fetch(cache, info, size, dst_path):
+    """缓存命中时直接写出 dst_path，返回 True"""
+    if cache is None:
+        return False
+    try:
+        return cache.fetch(info["key_src"], size, info["settings"], dst_path)
+    except Exception as e:
+        print(f"LODify cache fetch failed: {e}", file=sys.stderr)
+        return False
+
+
+def cache_store(cache, info, size, produced_path):
+    if cache is None:
+        return
+    try:
+        cache.store(info["key_src"], size, info["settings"], produced_path)
+    except Exception as e:
+        # 缓存失败不影响任务本身
+        print(f"LODify cache store failed: {e}", file=sys.stderr)
+
+
+def read_dimensions(path):
+    """只读文件头获取尺寸 (不解码像素)"""
+    try:
+        with Image.open(path) as img:
+            return img.size
+    except Exception:
+        return 0, 0
+
+
+def fit_size(width, height, target_size):
+    """按长边等比缩放到 target_size"""
+    ratio = min(target_size / width, target_size / height)
+    return max(1, int(width * ratio)), max(1, int(height * ratio))
+
+
+# 缩放质量档位: (JPEG DCT 域解码保留的目标倍数, reducing_gap)
+#   EXACT    - 全分辨率解码 + 全程 LANCZOS
+#   BALANCED - JPEG 解码到 >= 目标 4 倍；先按整数倍 reduce 到 >= 目标 3 倍，再 LANCZOS
+#   FAST     - JPEG 解码到 >= 目标 2 倍；reduce 到 >= 目标 2 倍，再 LANCZOS
+# 速度与 PSNR 对比见 README
+QUALITY_TIERS = {
+    "EXACT": (None, None),
+    "BALANCED": (4, 3.0),
+    "FAST": (2, 2.0),
+}
+
+
+def prepare_decode(img, target_size, quality):
+    """load() 之前调用：按档位让 JPEG 在 DCT 域直接解码出较小的图 (其他格式无效)"""
+    draft_factor, _ = QUALITY_TIERS.get(quality, QUALITY_TIERS["EXACT"])
+    if draft_factor and img.format == "JPEG":
+        img.draft(img.mode, fit_size(img.size[0], img.size[1], target_size * draft_factor))
+
+
+def resize_image(img, size, quality):
+    """缩放到 size；非 EXACT 档位先整数倍 reduce 再做小范围 LANCZOS"""
+    _, reducing_gap = QUALITY_TIERS.get(quality, QUALITY_TIERS["EXACT"])
+    return img.resize(size, Image.Resampling.LANCZOS, reducing_gap=reducing_gap)
+
+
+# =============================================================================
+# 分条带流式降采样 (超大贴图)
+# =============================================================================
+# 每个条带读取的最大字节数：峰值内存 ≈ 条带 + 条带/k 的 uint32 累加 + 缩小后的图，与原图大小无关
+STRIP_BYTES = 64 * 1024 * 1024
+
+# 流式路径先按整数倍 k 做盒式 (区域平均) 降采样到 >= 目标 gap 倍，再交给 resize_image 做 LANCZOS，
+# 与 Pillow 的 reducing_gap 同理；EXACT 档位也必须先缩小才能限制内存，因此取最保守的 4 倍
+STREAM_GAPS = {"EXACT": 4.0, "BALANCED": 3.0, "FAST": 2.0}
+
+_STREAM_MODES = {1: 'L', 2: 'LA', 3: 'RGB', 4: 'RGBA'}
+
+
+def open_oiio_strips(src_path):
+    """
+    用 OpenImageIO 按扫描线读取 (Blender 自带；PNG / TIFF / JPEG / TGA 等逐行解码，不载入整图)。
+    返回 (宽, 高, 通道数, read(y0, y1) -> ndarray[行, 宽, 通道], close) 或 None。
+    """
+    try:
+        import OpenImageIO as oiio
+    except ImportError:
+        return None
+    inp = oiio.ImageInput.open(src_path)
+    if not inp:
+        return None
+    spec = inp.spec()
+    channels = min(spec.nchannels, 4)
+    if spec.tile_width or spec.depth > 1 or channels < 1:
+        # 瓦片 / 体积图的扫描线读取会在内部缓存整行瓦片，交回普通路径
+        inp.close()
+        return None
+
+    def read(y0, y1):
+        rows = inp.read_scanlines(0, 0, spec.y + y0, spec.y + y1, 0, 0, channels, oiio.UINT8)
+        return np.asarray(rows).reshape(y1 - y0, spec.width, channels)
+
+    return spec.width, spec.height, channels, read, inp.close
+
+
+# open_raw_strips 依赖 Pillow 的私有接口 (Image._size、tile 列表的结构)，只在验证过的主版本上启用
+RAW_STRIP_PILLOW = (9, 12)
+# 条带中一行像素的字节数 (rawmode 与 mode 相同的 8 位格式)
+_RAW_BYTES = {'L': 1, 'LA': 2, 'RGB': 3, 'RGBA': 4}
+
+
+def raw_strips_supported():
+    try:
+        major = int(Image.__version__.split(".")[0])
+    except (AttributeError, ValueError):
+        return False
+    return RAW_STRIP_PILLOW[0] <= major <= RAW_STRIP_PILLOW[1]
+
+
+def open_raw_strips(src_path):
+    """
+    Pillow 回退：未压缩 TIFF 等按条带存放原始数据的格式 (tile 列表全部为 raw)。
+    原始数据逐行连续存放，读取任意行区间时只解码这些行 (文件条带可以从中间切开)。
+    返回值同 open_oiio_strips；Pillow 版本未验证或格式不支持时返回 None。
+    """
+    if not raw_strips_supported():
+        return None
+    with Image.open(src_path) as img:
+        tiles = list(img.tile)
+        mode, (width, height) = img.mode, img.size
+    if not tiles or mode not in _STREAM_MODES.values():
+        return None
+    strips = []
+    for codec, extents, offset, args in tiles:
+        # 只支持整行宽、自上而下、rawmode 与 mode 相同的条带
+        if codec != 'raw' or extents[0] != 0 or extents[2] != width:
+            return None
+        rawmode, stride = (args[0], args[1]) if isinstance(args, tuple) and len(args) > 1 else (args, 0)
+        if rawmode != mode or (isinstance(args, tuple) and len(args) > 2 and args[2] != 1):
+            return None
+        strips.append((extents[1], extents[3], offset, stride or width * _RAW_BYTES[mode]))
+    strips.sort()
+    # Pillow 11 起 tile 为 ImageFile._Tile，之前是普通元组
+    tile_type = getattr(ImageFile, "_Tile", None) or (lambda *fields: fields)
+
+    def read(y0, y1):
+        tile = []
+        for ty0, ty1, offset, stride in strips:
+            a, b = max(ty0, y0), min(ty1, y1)
+            if a >= b:
+                continue
+            # 从条带内第 a 行开始读 b - a 行
+            tile.append(tile_type('raw', (0, a - y0, width, b - y0), offset + (a - ty0) * stride, (mode, stride, 1)))
+        with Image.open(src_path) as strip:
+            # 只保留区间内的行，并把画布高度改为区间高度
+            strip._size = (width, y1 - y0)
+            strip.tile = tile
+            strip.load()
+            return np.asarray(strip).reshape(y1 - y0, width, -1)
+
+    return width, height, len(mode), read, None
+
+
+def _sum_blocks(a, k, axis):
+    """沿 axis 每 k 个元素求和 (reshape 后按 uint32 累加，不整体转换类型)；末尾不足 k 的部分单独成块"""
+    n = a.shape[axis]
+    full = n - n % k
+    lead = (slice(None),) * axis
+    head = a[lead + (slice(0, full),)].reshape(a.shape[:axis] + (full // k, k) + a.shape[axis + 1:])
+    sums = head.sum(axis=axis + 1, dtype=np.uint32)
+    if full < n:
+        tail = a[lead + (slice(full, n),)].sum(axis=axis, keepdims=True, dtype=np.uint32)
+        sums = np.concatenate([sums, tail], axis=axis)
+    return sums
+
+
+def _block_counts(n, k):
+    counts = [k] * (n // k)
+    if n % k:
+        counts.append(n % k)
+    return np.array(counts, dtype=np.float32)
+
+
+def _block_means(block, k):
+    """block[行, 宽, 通道] 按 k×k 区域平均 (末尾不足 k 的块按实际像素数平均)"""
+    rows, width = block.shape[:2]
+    sums = _sum_blocks(_sum_blocks(block, k, 1), k, 0)
+    counts = np.outer(_block_counts(rows, k), _block_counts(width, k))
+    return (sums / counts[..., None] + 0.5).astype(np.uint8)
+
+
+def stream_reduce(src_path, target_size, quality=None):
+    """
+    分条带读取源图并做 k×k 区域平均，返回 (缩小后的 PIL 图, (原图宽, 原图高))。
+    源图无法按条带读取 (无 numpy / 压缩 TIFF / 隔行 PNG 等) 或无需缩小时返回 None。
+    """
+    if np is None:
+        return None
+    reader = open_oiio_strips(src_path) or open_raw_strips(src_path)
+    if reader is None:
+        return None
+    width, height, channels, read, close = reader
+    try:
+        gap = STREAM_GAPS.get(quality, STREAM_GAPS["EXACT"])
+        k = int(max(width, height) / (target_size * gap))
+        if k < 2:
+            return None
+
+        # 条带高度取 k 的整数倍，使每个 k×k 块都完整落在一个条带内
+        strip_rows = k * max(1, STRIP_BYTES // (width * channels * k))
+        reduced = []
+        for y0 in range(0, height, strip_rows):
+            reduced.append(_block_means(read(y0, min(y0 + strip_rows, height)), k))
+        pixels = np.concatenate(reduced, axis=0)
+    except (AttributeError, TypeError, ValueError, OSError) as e:
+        # 读取接口与当前版本不兼容等：回退为普通解码
+        print(f"[LOD Worker] Strip read failed, decoding whole image: {e}", file=sys.stderr)
+        return None
+    finally:
+        if close is not None:
+            close()
+
+    if channels == 1:
+        pixels = pixels[:, :, 0]
+    return Image.fromarray(pixels, _STREAM_MODES[channels]), (width, height)
+
+
+def open_source(src_path, target_size, quality=None, stream=False):
+    """
+    打开源图，返回 (img, (原图宽, 原图高))。
+    stream=True 时先尝试分条带流式降采样 (返回已缩小、已载入的图)，不支持时回退为普通打开。
+    """
+    if stream:
+        reduced = stream_reduce(src_path, target_size, quality)
+        if reduced is not None:
+            return reduced
+    img = Image.open(src_path)
+    return img, img.size
+
+
+def build_pyramid(job, result, timings):
+    """
+    PYRAMID: 只解码一次源图，按尺寸从大到小逐级降采样，写出全部尺寸。
+    job["outputs"]: [{"size": 2048, "dst": ...}, {"size": 1024, "dst": ...}, ...]
+    """
+    src_path = job["src"]
+    outputs = sorted(job["outputs"], key=lambda o: o["size"], reverse=True)
+    written = []
+    cache, cache_info = open_cache(job)
+
+    # 先从缓存取出已有尺寸，只解码剩余部分
+    pending = []
+    for out in outputs:
+        if cache_fetch(cache, cache_info, out["size"], out["dst"]):
+            w, h = read_dimensions(out["dst"])
+            written.append({
+                "size": out["size"],
+                "dst": out["dst"],
+                "width": w,
+                "height": h,
+                "bytes": _file_size(out["dst"]),
+                "cache_hit": True,
+            })
+        else:
+            pending.append(out)
+    outputs = pending
+
+    if not outputs:
+        result["cache_hit"] = True
+    else:
+        decode_and_write_levels(src_path, outputs, written, timings, cache, cache_info,
+                                job.get("quality"), job.get("stream"))
+
+    written.sort(key=lambda o: o["size"], reverse=True)
+    result["outputs"] = written
+    if written:
+        result["width"], result["height"] = written[0]["width"], written[0]["height"]
+    result["bytes"] = sum(o["bytes"] for o in written)
+
+
+def decode_and_write_levels(src_path, outputs, written, timings, cache=None, cache_info=None, quality=None,
+                            stream=False):
+    """解码一次源图，按 outputs (从大到小) 逐级降采样并保存"""
+    t0 = time.perf_counter()
+    img, (src_w, src_h) = open_source(src_path, outputs[0]["size"], quality, stream)
+    with img:
+        # 按最大的输出尺寸降低解码分辨率 (draft 后 img.size 会变小，尺寸仍按原图计算)
+        prepare_decode(img, outputs[0]["size"], quality)
+        # PNG 输出强制 RGBA (防止 Alpha 丢失)；调色板图无法 LANCZOS，需先展开
+        if any(os.path.splitext(o["dst"])[1].lower() == '.png' for o in outputs):
+            if img.mode != 'RGBA':
+                img = img.convert('RGBA')
+        elif img.mode in ('P', '1'):
+            img = img.convert('RGBA')
+        img.load()
+        t1 = time.perf_counter()
+        timings["decode"] = t1 - t0
+
+        level = img
+        resize_time = 0.0
+        save_time = 0.0
+        for out in outputs:
+            dst_path = out["dst"]
+            if src_w <= out["size"] and src_h <= out["size"]:
+                # 原图比目标还小，直接复制
+                copy_file(src_path, dst_path)
+                w, h = src_w, src_h
+            else:
+                w, h = fit_size(src_w, src_h, out["size"])
+                if level.size != (w, h):
+                    # 从上一级 (而不是原图) 继续降采样
+                    t = time.perf_counter()
+                    level = resize_image(level, (w, h), quality)
+                    resize_time += time.perf_counter() - t
+                t = time.perf_counter()
+                save_image(level, dst_path)
+                save_time += time.perf_counter() - t
+                cache_store(cache, cache_info, out["size"], dst_path)
+
+            written.append({
+                "size": out["size"],
+                "dst": dst_path,
+                "width": w,
+                "height": h,
+                "bytes": _file_size(dst_path),
+            })
+
+    timings["resize"] = resize_time
+    timings["save"] = save_time
+
+
+def attach_shared(name):
+    """
+    打开主进程创建的共享内存。创建与释放都由主进程负责，
+    这里从本进程的 resource_tracker 中注销，避免 worker 退出时误删。
+    """
+    shm = shared_memory.SharedMemory(name=name)
+    try:
+        from multiprocessing import resource_tracker
+        resource_tracker.unregister(shm._name, "shared_memory")
+    except Exception:
+        pass
+    return shm
+
+
+def process_shared(job, result, timings):
+    """
+    SHARED: 没有本地文件的图片，输入输出都通过共享内存传递 (不落盘)。
+    - kind == "ENCODED": src_shm 为打包的文件字节，解码缩放后按 dst 扩展名编码写入 dst_shm
+    - kind == "PIXELS":  src_shm 为 float32 RGBA 像素，逐通道缩放后写入 dst_shm
+    """
+    if shared_memory is None:
+        raise RuntimeError("multiprocessing.shared_memory not available")
+    src_info, dst_info = job["src_shm"], job["dst_shm"]
+    target_size = int(job.get("size", 1024))
+    t0 = time.perf_counter()
+
+    src = attach_shared(src_info["name"])
+    dst = attach_shared(dst_info["name"])
+    try:
+        if src_info["kind"] == "ENCODED":
+            with Image.open(io.BytesIO(src.buf[:src_info["size"]])) as img:
+                width, height = img.size
+                if width > target_size or height > target_size:
+                    prepare_decode(img, target_size, job.get("quality"))
+                if img.mode in ('P', '1') or (job["dst"].lower().endswith('.png') and img.mode != 'RGBA'):
+                    img = img.convert('RGBA')
+                img.load()
+                t1 = time.perf_counter()
+                timings["decode"] = t1 - t0
+
+                if width > target_size or height > target_size:
+                    img = resize_image(img, fit_size(width, height, target_size), job.get("quality"))
+                t2 = time.perf_counter()
+                timings["resize"] = t2 - t1
+
+                out = io.BytesIO()
+                save_image(img, job["dst"], fp=out)
+                data = out.getbuffer()
+                if len(data) > dst.size:
+                    raise ValueError("Encoded result larger than shared buffer")
+                dst.buf[:len(data)] = data
+                timings["save"] = time.perf_counter() - t2
+                result["width"], result["height"] = img.size
+                result["shm_bytes"] = len(data)
+                del data
+        else:
+            if np is None:
+                raise RuntimeError(f"NumPy not found in {sys.executable}")
+            w, h, c = src_info["width"], src_info["height"], src_info["channels"]
+            tw, th = dst_info["width"], dst_info["height"]
+            pixels = np.ndarray((h, w, c), dtype=np.float32, buffer=src.buf)
+            resized = np.ndarray((th, tw, c), dtype=np.float32, buffer=dst.buf)
+            # 逐通道以 32 位浮点 ('F') 模式缩放，保留 HDR 数值
+            resize_float(pixels, (tw, th), job.get("quality"), out=resized)
+            timings["resize"] = time.perf_counter() - t0
+            result["width"], result["height"] = tw, th
+            # 释放对共享内存的引用后才能关闭
+            del pixels, resized
+    finally:
+        src.close()
+        dst.close()
+
+
+# =============================================================================
+# 浮点贴图 (EXR / HDR)：线性空间缩放
+# =============================================================================
+FLOAT_EXTS = {'.exr', '.hdr'}
+EXR_CODECS = {"ZIP": "zip", "PIZ": "piz", "DWAA": "dwaa", "NONE": "none"}
+HALF_MAX = 65504.0
+
+
+def resize_float(pixels, size, quality, out=None):
+    """
+    float32 像素 [高, 宽, 通道] 逐通道以 'F' 模式缩放到 size (宽, 高)。
+    EXR / HDR 存的是线性数值，直接滤波即为线性空间滤波，不做 gamma 转换。
+    """
+    if out is None:
+        out = np.empty((size[1], size[0], pixels.shape[2]), dtype=np.float32)
+    for ch in range(pixels.shape[2]):
+        plane = Image.fromarray(np.ascontiguousarray(pixels[:, :, ch]))
+        out[:, :, ch] = np.asarray(resize_image(plane, size, quality))
+    return out
+
+
+def read_radiance(path):
+    """NumPy 读取 Radiance HDR (RGBE，支持新式 RLE 与未压缩扫描线)，返回 float32 [高, 宽, 3]"""
+    with open(path, 'rb') as f:
+        data = f.read()
+    pos = 0
+    resolution = None
+    while resolution is None:
+        end = data.index(b'\n', pos)
+        line = data[pos:end].strip()
+        pos = end + 1
+        if line[:2] in (b'-Y', b'+Y'):
+            parts = line.split()
+            if parts[0] != b'-Y' or parts[2] != b'+X':
+                raise ValueError(f"Unsupported HDR orientation: {line.decode(errors='replace')}")
+            resolution = int(parts[1]), int(parts[3])
+    height, width = resolution
+
+    rgbe = np.empty((height, width, 4), dtype=np.uint8)
+    buf = np.frombuffer(data, dtype=np.uint8)
+    for y in range(height):
+        head = data[pos:pos + 4]
+        if 8 <= width < 32768 and head[0] == 2 and head[1] == 2 and head[2] < 128:
+            # 新式 RLE: 4 个分量各自游程编码
+            pos += 4
+            for ch in range(4):
+                row = rgbe[y, :, ch]
+                x = 0
+                while x < width:
+                    count = data[pos]
+                    if count > 128:
+                        count -= 128
+                        row[x:x + count] = data[pos + 1]
+                        pos += 2
+                    else:
+                        row[x:x + count] = buf[pos + 1:pos + 1 + count]
+                        pos += 1 + count
+                    x += count
+        else:
+            rgbe[y] = buf[pos:pos + width * 4].reshape(width, 4)
+            pos += width * 4
+
+    exponent = rgbe[:, :, 3].astype(np.int32)
+    scale = np.where(exponent > 0, np.ldexp(1.0, exponent - 136), 0.0).astype(np.float32)
+    return (rgbe[:, :, :3] + np.float32(0.5)) * scale[:, :, None] * (exponent > 0)[:, :, None]
+
+
+def write_radiance(pixels, path):
+    """NumPy 写出 Radiance HDR：新式扫描线格式，每个分量按不超过 128 字节的字面量块存放"""
+    height, width = pixels.shape[:2]
+    rgb = np.clip(np.nan_to_num(pixels[:, :, :3], nan=0.0, posinf=HALF_MAX), 0.0, None)
+    if pixels.shape[2] < 3:
+        rgb = np.repeat(rgb[:, :, :1], 3, axis=2)
+    peak = rgb.max(axis=2)
+    mantissa, exponent = np.frexp(peak)
+    valid = peak > 1e-32
+    scale = np.where(valid, mantissa * 256.0 / np.where(valid, peak, 1.0), 0.0)
+    rgbe = np.empty((height, width, 4), dtype=np.uint8)
+    rgbe[:, :, :3] = np.minimum(rgb * scale[:, :, None], 255).astype(np.uint8)
+    rgbe[:, :, 3] = np.where(valid, exponent + 128, 0)
+
+    with open(path, 'wb') as f:
+        f.write(b"#?RADIANCE\nFORMAT=32-bit_rle_rgbe\n\n")
+        f.write(f"-Y {height} +X {width}\n".encode())
+        if not 8 <= width < 32768:
+            f.write(rgbe.tobytes())
+            return
+        # 每个分量的字面量块前插入长度字节 (<=128)，整图一次完成
+        starts = np.arange(0, width, 128)
+        counts = np.minimum(width - starts, 128).astype(np.uint8)
+        scan = [np.broadcast_to(np.array([2, 2, width >> 8, width & 255], np.uint8), (height, 4))]
+        for ch in range(4):
+            scan.append(np.insert(rgbe[:, :, ch], starts, counts, axis=1))
+        f.write(np.concatenate(scan, axis=1).tobytes())
+
+
+def read_float_image(path):
+    """读取浮点贴图为 float32 [高, 宽, 通道]：优先 OpenImageIO，HDR 可用 NumPy 读取"""
+    try:
+        import OpenImageIO as oiio
+    except ImportError:
+        oiio = None
+    if oiio is not None:
+        inp = oiio.ImageInput.open(path)
+        if inp:
+            try:
+                spec = inp.spec()
+                pixels = inp.read_image(0, 0, 0, min(spec.nchannels, 4), oiio.FLOAT)
+            finally:
+                inp.close()
+            if pixels is not None:
+                return np.asarray(pixels, dtype=np.float32).reshape(spec.height, spec.width, -1)
+    if os.path.splitext(path)[1].lower() == '.hdr':
+        return read_radiance(path)
+    raise RuntimeError(f"OpenImageIO not found in {sys.executable}")
+
+
+def write_float_image(pixels, path, depth="HALF", codec="ZIP"):
+    """EXR 按 depth (HALF / FLOAT) 与 codec 写出；HDR 固定 RGBE"""
+    prepare_write(path)
+    if os.path.splitext(path)[1].lower() == '.hdr':
+        write_radiance(pixels, path)
+        return
+    try:
+        import OpenImageIO as oiio
+    except ImportError:
+        raise RuntimeError(f"OpenImageIO not found in {sys.executable}")
+    height, width, channels = pixels.shape
+    if depth == "HALF":
+        # 超出半精度范围的值会变成 inf
+        pixels = np.clip(pixels, -HALF_MAX, HALF_MAX)
+    spec = oiio.ImageSpec(width, height, channels, oiio.HALF if depth == "HALF" else oiio.FLOAT)
+    spec.attribute("compression", EXR_CODECS.get(codec, "zip"))
+    out = oiio.ImageOutput.create(path)
+    if not out or not out.open(path, spec):
+        raise RuntimeError(f"Cannot write {path}: {oiio.geterror()}")
+    try:
+        if not out.write_image(np.ascontiguousarray(pixels, dtype=np.float32)):
+            raise RuntimeError(out.geterror())
+    finally:
+        out.close()
+
+
+def process_float(job, result, timings):
+    """
+    FLOAT: EXR / HDR 在线性空间缩放并按原格式写出。
+    job["outputs"] 存在时与 PYRAMID 相同，一次解码写出全部尺寸。
+    """
+    if np is None:
+        raise RuntimeError(f"NumPy not found in {sys.executable}")
+    src_path = job["src"]
+    quality = job.get("quality")
+    depth, codec = job.get("float_depth", "HALF"), job.get("exr_codec", "ZIP")
+    outputs = job.get("outputs") or [{"size": int(job.get("size", 1024)), "dst": job["dst"]}]
+    outputs = sorted(outputs, key=lambda o: o["size"], reverse=True)
+    cache, cache_info = open_cache(job)
+
+    written = []
+    pending = []
+    for out in outputs:
+        if cache_fetch(cache, cache_info, out["size"], out["dst"]):
+            meta = image_meta.read_image_meta(out["dst"]) if image_meta else None
+            written.append({"size": out["size"], "dst": out["dst"],
+                            "width": meta["width"] if meta else 0, "height": meta["height"] if meta else 0,
+                            "bytes": _file_size(out["dst"]), "cache_hit": True})
+        else:
+            pending.append(out)
+
+    if not pending:
+        result["cache_hit"] = True
+    else:
+        t0 = time.perf_counter()
+        level = read_float_image(src_path)
+        src_h, src_w = level.shape[:2]
+        t1 = time.perf_counter()
+        timings["decode"] = t1 - t0
+        resize_time = save_time = 0.0
+        for out in pending:
+            dst_path = out["dst"]
+            if src_w <= out["size"] and src_h <= out["size"]:
+                copy_file(src_path, dst_path)
+                w, h = src_w, src_h
+            else:
+                w, h = fit_size(src_w, src_h, out["size"])
+                t = time.perf_counter()
+                if (level.shape[1], level.shape[0]) != (w, h):
+                    level = resize_float(level, (w, h), quality)
+                resize_time += time.perf_counter() - t
+                t = time.perf_counter()
+                write_float_image(level, dst_path, depth, codec)
+                save_time += time.perf_counter() - t
+                cache_store(cache, cache_info, out["size"], dst_path)
+            written.append({"size": out["size"], "dst": dst_path, "width": w, "height": h,
+                            "bytes": _file_size(dst_path)})
+        timings["resize"] = resize_time
+        timings["save"] = save_time
+
+    written.sort(key=lambda o: o["size"], reverse=True)
+    if job.get("outputs"):
+        result["outputs"] = written
+    if written:
+        result["width"], result["height"] = written[0]["width"], written[0]["height"]
+    result["bytes"] = sum(o["bytes"] for o in written)
+
+
+def process_job(job):
+    """
+    执行单个任务，返回结构化结果字典。
+    job: {"src", "dst", "size", "action"}  (PYRAMID 任务使用 "outputs" 代替 dst/size；
+         SHARED 任务使用 "src_shm" / "dst_shm" 代替文件)
+    返回: {"status", "error", "width", "height", "bytes", "timings"}
+    """
+    t_start = time.perf_counter()
+    src_path = job.get("src", "")
+    dst_path = job.get("dst", "")
+    target_size = int(job.get("size", 1024))
+    action = job.get("action", "RESIZE")
+
+    result = {
+        "id": job.get("id"),
+        "status": "SUCCESS",
+        "error": "",
+        "width": 0,
+        "height": 0,
+        "bytes": 0,
+        "timings": {},
+    }
+    timings = result["timings"]
+
+    try:
+        # --- 逻辑分支 A: 直接复制 (COPY) ---
+        # 不需要缩放的情况；插件内由进程池在 I/O 线程上完成，这里供命令行调用
+        if action == "COPY":
+            copy_file(src_path, dst_path)
+            timings["copy"] = time.perf_counter() - t_start
+            result["bytes"] = _file_size(dst_path)
+
+        # --- 逻辑分支 B: 缩放处理 (RESIZE) ---
+        elif action == "RESIZE":
+            if not HAS_PIL:
+                raise RuntimeError(f"PIL not found in {sys.executable}")
+
+            # 0. 共享缓存命中则无需解码
+            cache, cache_info = open_cache(job)
+            if cache_fetch(cache, cache_info, target_size, dst_path):
+                result["cache_hit"] = True
+                result["width"], result["height"] = read_dimensions(dst_path)
+                result["bytes"] = _file_size(dst_path)
+                timings["total"] = time.perf_counter() - t_start
+                return result
+
+            t0 = time.perf_counter()
+            # 超大贴图由调度端标记 stream，按条带流式读取并先行缩小
+            img, (width, height) = open_source(src_path, target_size, job.get("quality"), job.get("stream"))
+            with img:
+                # 1. 针对 PNG 强制转 RGBA (防止 Alpha 丢失)
+                ext = os.path.splitext(dst_path)[1].lower()
+
+                # 2. 检查尺寸，防止无效缩放 (如果原图比目标还小，直接复制)
+                if width <= target_size and height <= target_size:
+                    copy_file(src_path, dst_path)
+                    result["width"], result["height"] = width, height
+                    timings["copy"] = time.perf_counter() - t0
+                else:
+                    prepare_decode(img, target_size, job.get("quality"))
+                    if ext == '.png' and img.mode != 'RGBA':
+                        img = img.convert('RGBA')
+                    else:
+                        img.load()
+                    t1 = time.perf_counter()
+                    timings["decode"] = t1 - t0
+
+                    # 3. 计算新尺寸
+                    new_width, new_height = fit_size(width, height, target_size)
+
+                    # 4. 执行缩放 (LANCZOS，按质量档位决定是否先整数倍 reduce)
+                    resized_img = resize_image(img, (new_width, new_height), job.get("quality"))
+                    t2 = time.perf_counter()
+                    timings["resize"] = t2 - t1
+
+                    # 5. 保存
+                    save_image(resized_img, dst_path)
+                    timings["save"] = time.perf_counter() - t2
+                    result["width"], result["height"] = new_width, new_height
+                    cache_store(cache, cache_info, target_size, dst_path)
+            result["bytes"] = _file_size(dst_path)
+
+        # --- 逻辑分支 C: 一次解码输出多个尺寸 (PYRAMID) ---
+        elif action == "PYRAMID":
+            if not HAS_PIL:
+                raise RuntimeError(f"PIL not found in {sys.executable}")
+            build_pyramid(job, result, timings)
+
+        # --- 逻辑分支 D: 打包 / 生成图片，经共享内存传入传出 (SHARED) ---
+        elif action == "SHARED":
+            if not HAS_PIL:
+                raise RuntimeError(f"PIL not found in {sys.executable}")
+            process_shared(job, result, timings)
+
+        # --- 逻辑分支 E: EXR / HDR 浮点贴图线性空间缩放 (FLOAT) ---
+        elif action == "FLOAT":
+            if not HAS_PIL:
+                raise RuntimeError(f"PIL not found in {sys.executable}")
+            process_float(job, result, timings)
+        else:
+            raise ValueError(f"Unknown action: {action}")
+
+    except Exception as e:
+        result["status"] = "ERROR"
+        result["error"] = str(e)
+
+    timings["total"] = time.perf_counter() - t_start
+    return result
+
+
+# POSIX 下 worker 的 nice 增量 (Windows 由宿主以 BELOW_NORMAL 优先级启动)
+WORKER_NICE = 10
+
+
+def lower_priority():
+    """降低自身调度优先级，避免与 Blender UI 线程争抢 CPU"""
+    if hasattr(os, "nice"):
+        try:
+            os.nice(WORKER_NICE)
+        except OSError:
+            pass
+
+
+def limit_memory(max_bytes):
+    """限制进程数据段大小：超限时分配失败抛出 MemoryError，而不是触发系统 OOM"""
+    try:
+        import resource
+    except ImportError:
+        return  # Windows
+    limit_type = getattr(resource, "RLIMIT_DATA", None)
+    if limit_type is None:
+        return
+    try:
+        soft, hard = resource.getrlimit(limit_type)
+        if hard != resource.RLIM_INFINITY:
+            max_bytes = min(max_bytes, hard)
+        resource.setrlimit(limit_type, (max_bytes, hard))
+    except (ValueError, OSError):
+        pass
+
+
+def serve(max_memory=None):
+    """
+    常驻模式：从 stdin 逐行读取 JSON 任务，向 stdout 逐行写回 JSON 结果。
+    stdin 关闭 (EOF) 时退出，因此宿主 Blender 退出后进程会自动结束。
+    """
+    lower_priority()
+    if max_memory:
+        limit_memory(max_memory)
+
+    for line in sys.stdin:
+        line = line.strip()
+        if not line:
+            continue
+        try:
+            job = json.loads(line)
+        except ValueError as e:
+            result = {"id": None, "status": "ERROR", "error": f"Bad job: {e}"}
+        else:
+            if job.get("max_memory"):
+                # 按任务调整上限 (独占运行的超大任务会放宽)，只改软限制，可以反复调整
+                limit_memory(job["max_memory"])
+            result = process_job(job)
+        sys.stdout.write(json.dumps(result) + "\n")
+        sys.stdout.flush()
+
+
 def run_worker():
     # 1. 解析命令行参数
     parser = argparse.ArgumentParser(description="LODify Image Worker")
-    parser.add_argument("--src", required=True, help="Source image path")
-    parser.add_argument("--dst", required=True, help="Destination image path")
+    parser.add_argument("--serve", action="store_true", help="Run as a persistent JSON-lines worker")
+    parser.add_argument("--max-memory", type=int, default=0, help="Per-process memory limit in bytes (serve mode)")
+    parser.add_argument("--src", help="Source image path")
+    parser.add_argument("--dst", help="Destination image path")
     parser.add_argument("--size", type=int, default=1024, help="Target size in pixels")
     parser.add_argument("--action", default="RESIZE", choices=["RESIZE", "COPY"], help="Action to perform")
-    
+
     # 解析 args
     args = parser.parse_args()
-    
-    src_path = args.src
-    dst_path = args.dst
-    target_size = args.size
-    action = args.action
+
+    if args.serve:
+        serve(args.max_memory)
+        return
+
+    if not args.src or not args.dst:
+        parser.error("--src and --dst are required unless --serve is given")
 
     # 2. 检查 PIL 环境
     # 如果是 RESIZE 任务但没有 PIL，直接报错退出
-    if action == "RESIZE" and not HAS_PIL:
+    if args.action == "RESIZE" and not HAS_PIL:
         print(f"ERROR: PIL not found in {sys.executable}")
         sys.exit(2) # 退出码 2 表示缺少依赖
 
-    try:
-        # --- 逻辑分支 A: 直接复制 (COPY) ---
-        # 用于 HDR/EXR 或其他不需要缩放的情况
-        if action == "COPY":
-            if os.path.normpath(src_path) != os.path.normpath(dst_path):
-                shutil.copy2(src_path, dst_path)
-            print("SUCCESS")
-            return
-
-        # --- 逻辑分支 B: 缩放处理 (RESIZE) ---
-        with Image.open(src_path) as img:
-            # 1. 针对 PNG 强制转 RGBA (防止 Alpha 丢失)
-            ext = os.path.splitext(dst_path)[1].lower()
-            if ext == '.png':
-                if img.mode != 'RGBA':
-                    img = img.convert('RGBA')
-
-            # 2. 检查尺寸，防止无效缩放 (如果原图比目标还小，直接复制)
-            width, height = img.size
-            if width <= target_size and height <= target_size:
-                if os.path.normpath(src_path) != os.path.normpath(dst_path):
-                    shutil.copy2(src_path, dst_path)
-                print("SUCCESS")
-                return
-
-            # 3. 计算新尺寸
-            ratio = min(target_size / width, target_size / height)
-            new_width = int(width * ratio)
-            new_height = int(height * ratio)
-
-            # 4. 执行缩放 (LANCZOS 质量最好)
-            resized_img = img.resize((new_width, new_height), Image.Resampling.LANCZOS)
-
-            # 5. 保存
-            if ext in ('.jpg', '.jpeg'):
-                # JPG 不支持透明，转 RGB 并加白底 (防止透明变黑)
-                if resized_img.mode in ('RGBA', 'LA'):
-                    background = Image.new('RGB', resized_img.size, (255, 255, 255))
-                    background.paste(resized_img, mask=resized_img.split()[3])
-                    resized_img = background
-                elif resized_img.mode != 'RGB':
-                    resized_img = resized_img.convert('RGB')
-                
-                resized_img.save(dst_path, quality=95, optimize=True)
-
-            elif ext == '.png':
-                resized_img.save(dst_path, optimize=True)
-            
-            else:
-                # 其他格式 (bmp, tiff etc)
-                resized_img.save(dst_path)
+    result = process_job({
+        "src": args.src,
+        "dst": args.dst,
+        "size": args.size,
+        "action": args.action,
+    })
 
+    if result["status"] == "SUCCESS":
         print("SUCCESS")
-
-    except Exception as e:
+    else:
         # 捕获所有错误并打印
-        print(f"ERROR: {str(e)}")
+        print(f"ERROR: {result['error']}")
         sys.exit(1) # 退出码 1 表示通用错误
 
 if __name__ == "__main__":
-    run_worker()
\ No newline at end of file
+    run_worker()
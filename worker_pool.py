@@ -0,0 +1,452 @@
+# File Path: .\worker_pool.py
+
+import os
+import sys
+import json
+import time
+import queue
+import itertools
+import threading
+import subprocess
+from concurrent.futures import ThreadPoolExecutor
+
+from . import fast_copy
+
+try:
+    from multiprocessing import shared_memory
+except ImportError:
+    shared_memory = None
+
+# worker.py 与本文件位于插件根目录
+WORKER_SCRIPT = os.path.join(os.path.dirname(os.path.abspath(__file__)), "worker.py")
+
+MB = 1024 * 1024
+
+# 并发与内存配置
+WORKER_BASE_BYTES = 128 * MB     # 每个常驻进程自身开销 (解释器 + PIL)
+DEFAULT_JOB_BYTES = 256 * MB     # 无法估算解码尺寸时的默认占用
+WORKER_MEMORY_CAP = 4096 * MB    # 单个 worker 的内存上限，超过的任务独占运行
+MEMORY_FRACTION = 0.5            # 最多占用当前可用内存的比例
+FALLBACK_MAX_WORKERS = 4         # 无法获取可用内存时的进程数上限
+IO_THREADS = 2                   # 进程内处理 COPY 任务的 I/O 线程数
+
+# Windows 下以较低优先级启动子进程，保证 Blender UI 线程响应
+_CREATION_FLAGS = getattr(subprocess, "BELOW_NORMAL_PRIORITY_CLASS", 0)
+
+
+def get_available_memory():
+    """当前可用物理内存 (字节)，无法获取时返回 None"""
+    try:
+        import psutil
+        return int(psutil.virtual_memory().available)
+    except Exception:
+        pass
+
+    # Linux
+    try:
+        with open("/proc/meminfo") as f:
+            for line in f:
+                if line.startswith("MemAvailable:"):
+                    return int(line.split()[1]) * 1024
+    except (OSError, ValueError, IndexError):
+        pass
+
+    # Windows
+    if sys.platform == "win32":
+        try:
+            import ctypes
+
+            class MEMORYSTATUSEX(ctypes.Structure):
+                _fields_ = [
+                    ("dwLength", ctypes.c_ulong),
+                    ("dwMemoryLoad", ctypes.c_ulong),
+                    ("ullTotalPhys", ctypes.c_ulonglong),
+                    ("ullAvailPhys", ctypes.c_ulonglong),
+                    ("ullTotalPageFile", ctypes.c_ulonglong),
+                    ("ullAvailPageFile", ctypes.c_ulonglong),
+                    ("ullTotalVirtual", ctypes.c_ulonglong),
+                    ("ullAvailVirtual", ctypes.c_ulonglong),
+                    ("ullAvailExtendedVirtual", ctypes.c_ulonglong),
+                ]
+
+            status = MEMORYSTATUSEX()
+            status.dwLength = ctypes.sizeof(MEMORYSTATUSEX)
+            if ctypes.windll.kernel32.GlobalMemoryStatusEx(ctypes.byref(status)):
+                return int(status.ullAvailPhys)
+        except Exception:
+            pass
+    return None
+
+
+def get_memory_budget():
+    """所有在途任务可占用的内存总量 (字节)，无法获取时返回 None (不限制)"""
+    available = get_available_memory()
+    if available is None:
+        return None
+    return int(available * MEMORY_FRACTION)
+
+
+def default_max_workers():
+    """
+    按 CPU 核心数与可用内存确定进程数：
+    保留一个核心给 Blender 主线程，且每个进程至少能分到一份默认任务的内存。
+    """
+    cpus = max((os.cpu_count() or 1) - 1, 1)
+    budget = get_memory_budget()
+    if budget is None:
+        return min(cpus, FALLBACK_MAX_WORKERS)
+    by_memory = budget // (WORKER_BASE_BYTES + DEFAULT_JOB_BYTES)
+    return max(1, min(cpus, by_memory))
+
+
+# =============================================================================
+# 共享内存 (SHARED 任务的输入输出缓冲，由主进程创建并负责释放)
+# =============================================================================
+_shared = {}    # name -> SharedMemory
+
+def create_shared(size):
+    shm = shared_memory.SharedMemory(create=True, size=max(int(size), 1))
+    _shared[shm.name] = shm
+    return shm
+
+def get_shared(name):
+    return _shared.get(name)
+
+def release_shared(name):
+    shm = _shared.pop(name, None)
+    if shm is None:
+        return
+    try:
+        shm.close()
+    except BufferError:
+        # 仍有 NumPy 视图引用该缓冲区，交给垃圾回收
+        pass
+    try:
+        shm.unlink()
+    except (FileNotFoundError, OSError):
+        pass
+
+def release_task_shared(task):
+    """释放任务附带的共享内存 (src_shm / dst_shm)"""
+    for key in ("src_shm", "dst_shm"):
+        info = task.pop(key, None)
+        if info:
+            release_shared(info["name"])
+
+
+def get_job_bytes(task):
+    """任务的预估内存占用 (调用方在 task["mem_bytes"] 中给出，缺省按默认值)"""
+    mem = task.get("mem_bytes")
+    if mem is None:
+        return DEFAULT_JOB_BYTES
+    return int(mem)
+
+
+class _Worker:
+    """一个常驻的 worker.py 子进程 (stdin 发送任务, stdout 回传结果)"""
+
+    def __init__(self, pool):
+        self.pool = pool
+        self.task = None    # 当前正在处理的 (owner, task)
+        self.mem_bytes = 0  # 当前任务预留的内存
+        args = [sys.executable, WORKER_SCRIPT, "--serve"]
+        if pool.worker_memory_limit:
+            args += ["--max-memory", str(pool.worker_memory_limit)]
+        self.proc = subprocess.Popen(
+            args,
+            stdin=subprocess.PIPE,
+            stdout=subprocess.PIPE,
+            stderr=None,    # 直接输出到 Blender 控制台，方便调试
+            text=True,
+            encoding='utf-8',
+            bufsize=1,      # 行缓冲
+            creationflags=_CREATION_FLAGS,
+        )
+        # 后台线程读取 stdout，避免主线程阻塞
+        self.reader = threading.Thread(target=self._read_loop, daemon=True)
+        self.reader.start()
+
+    @property
+    def alive(self):
+        return self.proc.poll() is None
+
+    @property
+    def busy(self):
+        return self.task is not None
+
+    def send(self, owner, task, job, mem_bytes=0):
+        self.proc.stdin.write(json.dumps(job) + "\n")
+        self.proc.stdin.flush()
+        # 写入成功后再标记忙碌 (结果只会在主线程 _drain 时被消费，不存在竞争)
+        self.task = (owner, task)
+        self.mem_bytes = mem_bytes
+
+    def _read_loop(self):
+        for line in self.proc.stdout:
+            line = line.strip()
+            if not line:
+                continue
+            try:
+                result = json.loads(line)
+            except ValueError:
+                # 非 JSON 输出 (例如第三方库的 print)，忽略
+                continue
+            self.pool._results.put((self, result))
+
+        # stdout 关闭：进程已退出，若有未完成任务则回报失败
+        self.pool._results.put((self, None))
+
+    def close(self):
+        try:
+            self.proc.stdin.close()
+        except Exception:
+            pass
+        try:
+            self.proc.wait(timeout=1.0)
+        except Exception:
+            self.proc.kill()
+
+
+class _CopyJob:
+    """进程内 COPY 任务 (与 _Worker 一样通过 task / mem_bytes 交给 _drain 处理)"""
+
+    def __init__(self, owner, task):
+        self.task = (owner, task)
+        self.mem_bytes = 0
+
+
+def run_copy(job):
+    """
+    I/O 线程中执行 COPY：优先 reflink，结果格式与 worker.py 相同。
+    job["copies"] 为 [(src, dst), ...] (共享缓存命中时每个输出一项)。
+    """
+    result = {"id": job["id"], "status": "SUCCESS", "width": 0, "height": 0, "bytes": 0, "timings": {}}
+    t0 = time.perf_counter()
+    try:
+        for src, dst in job["copies"]:
+            if os.path.normpath(src) == os.path.normpath(dst):
+                continue
+            method = fast_copy.clone_file(src, dst)
+            result["copy_method"] = method
+            if not fast_copy.is_shared_copy(method):
+                result["bytes"] += os.path.getsize(dst)
+    except Exception as e:
+        result["status"] = "ERROR"
+        result["error"] = str(e)
+    result["timings"]["copy"] = time.perf_counter() - t0
+    return result
+
+
+class WorkerPool:
+    """
+    常驻 worker.py 进程池。
+    多个 Operator 共享同一个池 (通过 owner 区分结果)，在同一 Blender 会话中保持热启动。
+    按任务的预估解码内存准入：在途任务的预留总量不超过内存预算，
+    超过单 worker 上限的任务只在池空闲时独占运行。
+    """
+
+    def __init__(self, max_workers=None):
+        self.max_workers = max_workers or default_max_workers()
+        self.memory_budget = get_memory_budget()
+        # 单进程硬上限：超出时 worker 内部报 MemoryError，而不是拖垮整机
+        self.worker_memory_limit = None
+        if self.memory_budget is not None:
+            self.worker_memory_limit = min(self.memory_budget, WORKER_MEMORY_CAP) + WORKER_BASE_BYTES
+        self._workers = []
+        self._results = queue.Queue()
+        self._done = {}     # owner -> [(task, result), ...]
+        self._discarded = set()
+        self._ids = itertools.count(1)
+        self._owners = itertools.count(1)
+        self._io = None     # COPY 任务的 I/O 线程池 (懒创建)
+
+    def new_owner(self, name):
+        """为一次 Operator 调用生成唯一的 owner 标识"""
+        return f"{name}#{next(self._owners)}"
+
+    def busy_count(self):
+        return sum(1 for w in self._workers if w.busy)
+
+    def has_free_slot(self):
+        return self.busy_count() < self.max_workers
+
+    def reserved_bytes(self):
+        return sum(w.mem_bytes for w in self._workers if w.busy)
+
+    def can_admit(self, task):
+        """进程数与内存预算是否允许现在提交 task"""
+        if task["action"] == "COPY":
+            # 进程内 I/O 线程完成，不占 worker 与内存预算
+            return True
+        self._drain()
+        busy = [w for w in self._workers if w.busy]
+        if not busy:
+            # 空闲时刷新预算；即使单个任务超出预算也放行，避免永远无法处理
+            self.memory_budget = get_memory_budget()
+            return True
+        if len(busy) >= self.max_workers:
+            return False
+
+        need = get_job_bytes(task)
+        if need > WORKER_MEMORY_CAP or any(w.mem_bytes > WORKER_MEMORY_CAP for w in busy):
+            return False
+        if self.memory_budget is None:
+            return True
+        return sum(w.mem_bytes for w in busy) + need <= self.memory_budget
+
+    def job_memory_limit(self, task):
+        """
+        worker 处理 task 时的内存上限 (随任务下发)：常规任务不超过单 worker 上限；
+        超过上限的任务只在池空闲时独占运行，放宽到整个内存预算。
+        """
+        if self.memory_budget is None:
+            return None
+        if get_job_bytes(task) > WORKER_MEMORY_CAP:
+            return max(self.memory_budget, WORKER_MEMORY_CAP) + WORKER_BASE_BYTES
+        return min(self.memory_budget, WORKER_MEMORY_CAP) + WORKER_BASE_BYTES
+
+    def _get_idle_worker(self):
+        # 清理已退出且空闲的进程
+        self._workers = [w for w in self._workers if w.alive or w.busy]
+
+        for w in self._workers:
+            if w.alive and not w.busy:
+                return w
+
+        if len(self._workers) < self.max_workers:
+            w = _Worker(self)
+            self._workers.append(w)
+            return w
+        return None
+
+    def submit(self, owner, task):
+        """
+        提交任务: task 需包含 src_path / dst_path / target_size / action (PYRAMID 另需 outputs)。
+        可选 mem_bytes: 预估的解码内存占用，用于准入控制。
+        返回 False 表示池已满或内存不足，调用方应稍后重试。
+        启动或写入失败会抛出异常。
+        COPY 任务不启动子进程，直接在进程内 I/O 线程上完成。
+        """
+        if task["action"] == "COPY":
+            self._submit_copy(owner, task)
+            return True
+        if not self.can_admit(task):
+            return False
+        worker = self._get_idle_worker()
+        if worker is None:
+            return False
+
+        job = {
+            "id": next(self._ids),
+            "src": task["src_path"],
+            "dst": task["dst_path"],
+            "size": task["target_size"],
+            "action": task["action"],
+        }
+        # PYRAMID 任务: 一次解码写出多个尺寸
+        if "outputs" in task:
+            job["outputs"] = task["outputs"]
+        # 共享缓存配置 (worker 内部查询/写入)
+        if "cache" in task:
+            job["cache"] = task["cache"]
+        # 缩放质量档位 (EXACT / BALANCED / FAST)
+        if "quality" in task:
+            job["quality"] = task["quality"]
+        # FLOAT 任务: EXR 精度与压缩
+        for key in ("float_depth", "exr_codec"):
+            if key in task:
+                job[key] = task[key]
+        # 超大贴图: 分条带流式降采样
+        if task.get("stream"):
+            job["stream"] = True
+        # 本任务的内存上限
+        max_memory = self.job_memory_limit(task)
+        if max_memory:
+            job["max_memory"] = max_memory
+        # SHARED 任务: 输入输出通过共享内存传递
+        for key in ("src_shm", "dst_shm"):
+            if key in task:
+                job[key] = task[key]
+        worker.send(owner, task, job, get_job_bytes(task))
+        return True
+
+    def _submit_copy(self, owner, task):
+        if self._io is None:
+            self._io = ThreadPoolExecutor(max_workers=IO_THREADS, thread_name_prefix="lodify-io")
+        job = _CopyJob(owner, task)
+        copies = task.get("copies") or [(task["src_path"], task["dst_path"])]
+        future = self._io.submit(run_copy, {"id": next(self._ids), "copies": copies})
+        future.add_done_callback(lambda f: self._results.put((job, f.result())))
+
+    def _drain(self):
+        while True:
+            try:
+                worker, result = self._results.get_nowait()
+            except queue.Empty:
+                break
+
+            if worker.task is None:
+                continue
+            owner, task = worker.task
+            worker.task = None
+            worker.mem_bytes = 0
+
+            if owner in self._discarded:
+                # 已取消的任务不会再被取回，这里释放其共享内存
+                release_task_shared(task)
+                continue
+            if result is None:
+                result = {"status": "ERROR", "error": "Worker process exited unexpectedly"}
+            self._done.setdefault(owner, []).append((task, result))
+
+    def has_results(self, owner):
+        """
+        owner 是否有结果待取回。只检查线程安全队列是否为空，开销极小，
+        主线程定时器据此决定是否需要处理。
+        """
+        return not self._results.empty() or owner in self._done
+
+    def collect(self, owner):
+        """非阻塞地取回 owner 已完成的任务: [(task, result), ...]"""
+        self._drain()
+        return self._done.pop(owner, [])
+
+    def discard(self, owner):
+        """丢弃 owner 的结果，包括之后才返回的在途任务 (Operator 取消时调用)"""
+        self._discarded.add(owner)
+        self._drain()
+        for task, _ in self._done.pop(owner, []):
+            release_task_shared(task)
+
+    def shutdown(self):
+        for w in self._workers:
+            w.close()
+        self._workers = []
+        if self._io is not None:
+            self._io.shutdown(wait=True)
+            self._io = None
+        self._done.clear()
+        for name in list(_shared):
+            release_shared(name)
+
+
+_pool = None
+
+def get_pool(max_workers=None):
+    """
+    获取全局共享的进程池 (懒创建，跨 Operator 调用保持常驻)。
+    max_workers 为 None 时按 CPU 核心数与可用内存自动确定。
+    """
+    global _pool
+    if _pool is None:
+        _pool = WorkerPool(max_workers)
+    elif max_workers:
+        _pool.max_workers = max(_pool.max_workers, max_workers)
+    return _pool
+
+def shutdown_pool():
+    """插件卸载时关闭所有常驻进程"""
+    global _pool
+    if _pool is not None:
+        _pool.shutdown()
+        _pool = None